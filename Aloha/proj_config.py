@@ -1,2 +1,43 @@
 # ENSURE ID IS UPDATED TO MATCH BOARD NAME
 NODE_ID = None # TODO change this value once
+
+# Slotted ALOHA: frames start only on slot boundaries, with the slot clock
+# set by periodic beacons from BEACON_NODE
+SLOTTED = False
+BEACON_NODE = 0x00
+
+# Listen before talk: None to send blind, "cad" for channel activity
+# detection or "rssi" for an RSSI threshold
+CARRIER_SENSE = None
+
+# Pick the data rate per neighbour from the SNR of the frames heard from it
+ADAPTIVE_RATE = False
+
+# Multi-hop mesh: reach nodes out of radio range through AODV-style routes
+ROUTING = False
+
+# Offered load: None flips a coin between sending and listening. Otherwise
+# messages arrive from a "poisson", "periodic" or "onoff" source at
+# TRAFFIC_RATE per second, or replay TRAFFIC_TRACE ("trace", lines of
+# "seconds,destination"), and the node only sends while some are queued.
+TRAFFIC = None
+TRAFFIC_RATE = 0.2
+TRAFFIC_TRACE = "traffic.csv"
+
+# Telemetry records go out as short text ("seq,uptime_ms,r,g,b"); True packs
+# them into 10 bytes instead
+COMPACT_TELEMETRY = False
+
+# Every 10th message is a sensor dump of the last DUMP_RECORDS records (10
+# bytes each), fragmented over as many frames as it needs; 0 never dumps.
+# Dumps are capped at 409 records, the most a 4096 byte message holds.
+DUMP_RECORDS = 0
+
+# Run the node as asyncio tasks (MAC, traffic, display, stats) on a runtime
+# that polls the radio's IRQ flags, instead of one loop of blocking calls.
+# Needs the asyncio and adafruit_ticks libraries in CIRCUITPY/lib.
+ASYNC_RUNTIME = False
+
+# Add to the stats line the share of time spent in each state, a histogram of
+# how long each stay took and the first frame to SACK time of every flight
+LATENCY_STATS = False
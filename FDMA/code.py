@@ -12,16 +12,13 @@ import random
 import neopixel
 import time
 
-from proj_config import NODE_ID
 from fdma_node import FDMA_Node
+from lorasphere import telemetry
+from proj_config import COMPACT_TELEMETRY, DUMP_RECORDS, ASYNC_RUNTIME
 
 # Initialize Aloha node
 node = FDMA_Node()
 
-# Initialize list of neighboring nodes
-neighbors = [0x00, 0x01, 0x02, 0x03]
-neighbors.remove(NODE_ID)
-
 ### NEOPIXEL ###
 pixel = neopixel.NeoPixel(board.NEOPIXEL, 1)
 pixel.brightness = 0.5
@@ -35,30 +32,104 @@ color_map = {
     (0, 255, 255):  "cyan",
     (255, 0, 255):  "purple",
 }
+colors = list(color_map.items())  # Built once, not per message
+
+# Numbers our telemetry records and keeps the recent ones for sensor dumps
+recorder = telemetry.Recorder(COMPACT_TELEMETRY, DUMP_RECORDS, max_message=node.fragmenter.MAX_MESSAGE)
+
+def make_payload():
+    # A telemetry record with a random colour, only as long as it needs to
+    # be, or now and then a dump of the recent ones
+    color, color_name = random.choice(colors)
+    return recorder.next(color)
+
+def show(payload):
+    # Print a message we received and show its colour
+    record = telemetry.decode(payload)
+    print(record)
+    if record is not None:
+        pixel.fill(record[2])
 
-def main():
+async def mac(deliver):
+    # The MAC, waiting on the radio through node.rt. Received messages go to
+    # deliver: shown right away, or handed to the display task with the
+    # asyncio runtime.
     while True:
-        # Based on choice, decide to TX or RX
-        choice = random.randint(0, 100)
+        # Let the others know we are still here
+        if node.hello_due():
+            await node.send_hello()
 
-        if choice < 50:
-            # Node will transmit to a random destination
-            rx_node = random.choice(neighbors)
-            color, color_name = random.choice(list(color_map.items()))
-            payload = bytes(color) + b'\x55' * (node.MAX_PAYLOAD_LEN - len(color))
-            node.send_msg(rx_node, payload)
+        # Only send to nodes we have heard from recently
+        neighbors = node.neighbors.alive()
 
+        if node.traffic:
+            # Offered load: transmit while a queue holds a message for a
+            # destination that can take it, or frames are due, else listen
+            node.traffic.generate(neighbors, make_payload)
+            rx_node = node.traffic.next_dest(node.ready)
+            transmit = rx_node is not None or node.arq.due()
         else:
-            # Node will be ready to receive from other nodes
-            payload = node.recv_msg()
-            if payload is not None:
-                print(payload)
-                if len(payload) < 3:
-                    continue
-                color = payload[:3]
-                pixel.fill(tuple(color))
+            # Based on choice, decide to TX to a random destination or RX
+            rx_node = random.choice(neighbors) if neighbors else None
+            transmit = random.randint(0, 100) < 50 and rx_node is not None
+
+        if transmit:
+            if rx_node is None:
+                # Retransmissions only
+                await node.send_pending()
+            else:
+                payload = node.traffic.pop(rx_node)[0] if node.traffic else make_payload()
+                await node.send_msg(rx_node, payload)
+
+        else:
+            # Node will be ready to receive from other nodes, getting back
+            # the payloads the ARQ can deliver in order
+            for payload in await node.recv_msg():
+                deliver(payload)
+
+        # With the asyncio runtime the report task prints these instead
+        if not ASYNC_RUNTIME:
+            print(node.get_stats())
 
+# Seconds between stats lines with the asyncio runtime
+STATS_INTERVAL = 5
+
+async def offered_load(rt):
+    # Queue each message as the traffic source generates it
+    while True:
+        node.traffic.generate(node.neighbors.alive(), make_payload)
+        wait = node.traffic.until_next()
+        if wait is None:
+            return
+        await rt.sleep(wait)
+
+async def display(inbox):
+    # Show every message received
+    while True:
+        show(await inbox.get())
+
+async def report(rt):
+    while True:
+        await rt.sleep(STATS_INTERVAL)
         print(node.get_stats())
 
+def run_async():
+    # Only imported here: boards without the asyncio library can still run
+    # the MAC on the blocking runtime
+    from lorasphere import aio
+
+    rt = aio.Runtime(node)
+    node.attach(rt)
+    inbox = aio.Queue(rt)
+    rt.spawn(mac(inbox.put_nowait))
+    if node.traffic:
+        rt.spawn(offered_load(rt))
+    rt.spawn(display(inbox))
+    rt.spawn(report(rt))
+    rt.run()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if ASYNC_RUNTIME:
+        run_async()
+    else:
+        node.rt.run(mac(show))
\ No newline at end of file
@@ -1,9 +1,22 @@
 import time
+import random
 import board
 import digitalio
 from adafruit_rfm9x import RFM9x
 import adafruit_logging as logging
-from proj_config import NODE_ID
+from lorasphere.airtime import frame_airtime
+from lorasphere.arq import Arq, SYN_LEN
+from lorasphere import blockack
+from lorasphere import blocking
+from lorasphere.codec import FrameCodec
+from lorasphere.csma import Csma
+from lorasphere.fragment import Fragmenter, Reassembler
+from lorasphere.latency import StateTimer, timed
+from lorasphere.linktable import LinkTable
+from lorasphere.neighbors import NeighborTable
+from lorasphere.traffic import Traffic
+from proj_config import NODE_ID, CHANNELS, SF_TABLE, CARRIER_SENSE, ADAPTIVE_RATE
+from proj_config import TRAFFIC, TRAFFIC_RATE, TRAFFIC_TRACE, LATENCY_STATS
 
 class FDMA_Node(RFM9x):
     def __init__(self):
@@ -30,66 +43,360 @@ class FDMA_Node(RFM9x):
         self.spreading_factor = 7
         self.coding_rate = 8
         self.ack_retries = 0
-        self.ack_wait = 1
 
         # Packet length definitions
+        self.HEADER_LEN = 4       # RadioHead header in front of every payload
         self.MAX_PAYLOAD_LEN = 250
+        self.SACK_LEN = blockack.BLOCK_ACK_LEN
+
+        # SACKs are built in, and every frame heard is parsed through,
+        # buffers allocated once
+        self.codec = FrameCodec(self.MAX_PAYLOAD_LEN)
+
+        # Header flags: more frames of this flight follow, selective ACK,
+        # neighbour discovery and ARQ resync (see lorasphere.arq)
+        self.FLAG_MORE = 0x01
+        self.FLAG_SACK = 0x02
+        self.FLAG_HELLO = 0x08
+        self.FLAG_SYN = 0x20
+
+        # Receive deadlines, derived from time on air at the current settings
+        self.RX_GUARD = 0.05      # Peer turnaround plus timing slack, in seconds
+        self.LISTEN_FRAMES = 5    # Idle listen window, in max-size frames
+        self.RETX_FRAMES = 4      # Random extra wait before a retransmission, in max-size frames
+
+        # Selective-repeat ARQ: up to ARQ_WINDOW frames in flight per peer,
+        # with room in the queue for every fragment of a long message
+        self.ARQ_WINDOW = 4
+        self.arq = Arq(window=self.ARQ_WINDOW, retry_limit=6, queue_limit=32)
+
+        # Messages longer than a frame go out as fragments, reassembled per
+        # sender on the far end. Each leaves room for the SYN header the ARQ
+        # may put in front of it.
+        self.fragmenter = Fragmenter(self.MAX_PAYLOAD_LEN - SYN_LEN)
+        self.reassembly = Reassembler()
+
+        # Listen before talk before contending for the channel
+        self.csma = Csma(self, CARRIER_SENSE, ifs=self.RX_GUARD) if CARRIER_SENSE else None
+
+        # Per-neighbour link quality. Only the coding rate of data frames is
+        # adapted: it travels in the LoRa header, so receivers need no notice,
+        # while the SF has to match on both ends. The base CR is the most
+        # robust one, so timeouts computed with it cover every frame.
+        self.ADAPTIVE_RATE = ADAPTIVE_RATE
+        self.BASE_CR = self.coding_rate
+        self.link = LinkTable(default_rate=(self.spreading_factor, self.BASE_CR))
+
+        # Neighbours announced by HELLOs or heard sending anything else
+        self.neighbors = NeighborTable()
+        self.HELLO_LEN = 1 # The driver cannot send an empty payload
+        self.HELLO = bytes(self.HELLO_LEN)
+
+        # Offered load: a traffic source feeding per-destination transmit
+        # queues, or None for the coin-flip loop in code.py
+        self.traffic = Traffic(TRAFFIC, TRAFFIC_RATE, trace=TRAFFIC_TRACE) if TRAFFIC else None
+
+        # Time spent in each state, and first frame to SACK per flight; in
+        # the stats with LATENCY_STATS
+        self.STATES = ("send_msg", "wait_ack", "listen", "recv_msg", "send_ack")
+        self.LATENCY_STATS = LATENCY_STATS
+        self.timing = StateTimer(self.STATES)
+
+        # Runtime the MAC's coroutines wait on the radio through: blocking
+        # driver calls, unless code.py attaches an aio.Runtime with
+        # ASYNC_RUNTIME
+        self.rt = blocking.Runtime(self)
 
         # Counter variables
         self.num_send = 0
         self.num_recv = 0
         self.num_ack  = 0
         self.node_start_time = time.monotonic()
-        self.sent_bytes = 0
 
-        # setup frequency table
-        self.frequency_table = {
-            0: 910, 
-            1: 911,
-            2: 912,
-            3: 913
-        }
+        # Receive side: application bytes delivered to us. Transmit side:
+        # every byte we put on air (RadioHead headers, control frames and
+        # ACKs included). They count different traffic, so a receiver's
+        # goodput can exceed its own link throughput.
+        self.app_bytes = 0
+        self.air_bytes = 0
+
+        # Usable band: every node receives on the channel its ID hashes to,
+        # so any node we hear about can be reached without a table. With
+        # SF_TABLE receivers also divide by spreading factor (SF7 otherwise).
+        self.channels = CHANNELS
+        self.sf_table = SF_TABLE or {}
+        self.tuned = None  # Node whose channel we are on, None after a HELLO sweep
+
+    def channel_of(self, node) -> float:
+        return self.channels[node % len(self.channels)]
+
+    def tune(self, node) -> None:
+        # Move to node's receive channel: its frequency and spreading factor
+        self.frequency_mhz = self.channel_of(node)
+        self.spreading_factor = self.sf_table.get(node, 7)
+        self.tuned = node
+
+    def hello_due(self) -> bool:
+        return self.neighbors.hello_due()
+
+    async def send_hello(self) -> None:
+        # Broadcast that we are alive on every channel and SF a receiver may
+        # be listening on
+        self.logger.info(f"[TX {self.node}] Sending HELLO")
+        for frequency in self.channels:
+            for spreading_factor in sorted(set(self.sf_table.values()) | {7}):
+                self.frequency_mhz = frequency
+                self.spreading_factor = spreading_factor
+                await self.put_on_air(self.HELLO, destination=self.BROADCAST_ADDRESS, flags=self.FLAG_HELLO)
+        self.tuned = None
+        self.neighbors.hello_sent()
+
+    def airtime(self, payload_len) -> float:
+        # Time on air of a frame carrying payload_len bytes after the RadioHead header
+        return frame_airtime(self, payload_len)
+
+    def response_timeout(self, payload_len) -> float:
+        # How long to wait for a reply the peer sends as soon as our frame ends
+        return self.RX_GUARD + self.airtime(payload_len)
+
+    def listen_timeout(self) -> float:
+        # Idle listen window, scaled with the airtime of a full message
+        return self.LISTEN_FRAMES * self.airtime(self.MAX_PAYLOAD_LEN)
+
+    def listen_time(self) -> float:
+        # Idle listen window, cut short with offered load when the next
+        # message arrives or a retransmission is due, so it goes out then
+        # rather than whenever the window happens to end
+        timeout = self.listen_timeout()
+        if self.traffic:
+            for wait in (self.traffic.until_next(), self.arq.next_due()):
+                if wait is not None:
+                    timeout = min(timeout, wait)
+        return timeout
+
+    def sack_timeout(self) -> float:
+        # The receiver answers after the last frame of a flight, or one frame
+        # time later if that frame was lost
+        return self.response_timeout(self.MAX_PAYLOAD_LEN) + self.response_timeout(self.SACK_LEN)
+
+    async def recv_frame(self, timeout) -> FrameCodec:
+        # receive() with the header, less the frames heard() handles itself
+        return self.heard(await self.rt.receive(timeout))
+
+    def heard(self, packet) -> FrameCodec:
+        # Note the link quality of what we heard and that its sender is
+        # alive. HELLOs are not returned; any other frame is returned parsed,
+        # as self.codec.
+        if packet is None:
+            return None
+        frame = self.codec
+        frame.parse(packet)
+        self.link.update(frame.node(), self.last_snr, self.last_rssi)
+        self.neighbors.heard(frame.node(), self.last_rssi)
+        if frame.flags() & self.FLAG_HELLO:
+            return None
+        return frame
+
+    def ready(self, rx_node) -> bool:
+        # Whether a new payload for rx_node would go out now rather than wait
+        # behind a full ARQ window
+        return self.arq.sender(rx_node).pending() < self.ARQ_WINDOW
+
+    async def send_pending(self) -> None:
+        # Send a flight to every node with frames due
+        for rx_node in self.arq.due():
+            await self.send_flight(rx_node)
+
+    async def send_msg(self, rx_node, message) -> None:
+        # Queue message for rx_node and send whatever its ARQ window allows
+        self.queue_msg(rx_node, message)
+        await self.send_flight(rx_node)
+
+    def queue_msg(self, rx_node, message) -> None:
+        # Queue message for rx_node, in fragments if it does not fit in a frame
+        for payload in self.fragmenter.split(message):
+            if not self.arq.sender(rx_node).push(payload):
+                self.logger.warning(f"[TX {self.node}] Queue to {rx_node} full, dropping packet")
+
+    async def send_flight(self, rx_node) -> None:
+        # Send every frame due for rx_node back to back, then wait for the
+        # selective ACK that covers them
+        frames = await self.flight(rx_node)
+        if not frames:
+            return
+
+        coding_rate = self.link.rate(rx_node, self.spreading_factor)[1] if self.ADAPTIVE_RATE else self.BASE_CR
+        self.timing.begin_exchange()
+        for i, (packet_id, payload) in enumerate(frames):
+            await self.send_frame(rx_node, packet_id, payload, i < len(frames) - 1, coding_rate)
+        self.flight_sent(rx_node, frames)
+
+        # Wait for the selective ACK on the same channel
+        self.flight_acked(rx_node, await self.wait_sack())
+
+    @timed("send_msg")
+    async def send_frame(self, rx_node, packet_id, payload, more, coding_rate) -> None:
+        # Send one frame of a flight at the coding rate picked for rx_node
+        self.coding_rate = coding_rate
+        sender = self.arq.sender(rx_node)
+        flags = self.FLAG_MORE if more else 0
+        if sender.syn:
+            flags |= self.FLAG_SYN
+            payload = sender.syn_header() + payload
+        await self.put_on_air(payload, destination=rx_node, identifier=packet_id, flags=flags)
+        self.coding_rate = self.BASE_CR
+        self.num_send += 1
+
+    @timed("wait_ack")
+    async def wait_sack(self) -> FrameCodec:
+        return await self.recv_frame(self.sack_timeout())
+
+    async def flight(self, rx_node) -> list:
+        # The (packet_id, payload) frames to send to rx_node now, if any,
+        # with the radio tuned to its channel
+        frames = self.arq.sender(rx_node).due()
+        if not frames:
+            return None
 
-    def send_msg(self, rx_node, payload) -> None:
         # Debug statement
-        self.logger.info(f"[TX {self.node}] Sending packet from src={self.node} to dst={rx_node}")
+        self.logger.info(f"[TX {self.node}] Sending {len(frames)} packets from src={self.node} to dst={rx_node}")
         self.destination = rx_node
-        
-        # set transmitting freq to dest freq
-        self.frequency_mhz = self.frequency_table[self.destination]
 
-        # Send the packet and see if we get an ACK back
-        self.num_send += 1
-        if self.send_with_ack(payload):
-            self.logger.info(f"[TX {self.node}] Received ACK")
-            self.sent_bytes += len(payload)
-            self.num_ack += 1
-        else:
+        # set transmitting freq and SF to the dest's
+        self.tune(self.destination)
+
+        # Listen first on the dest's channel; the frames stay due if it stays busy
+        if self.csma and not await self.csma.wait_clear(self.rt):
+            self.logger.info(f"[TX {self.node}] Channel busy, deferring")
+            return None
+        return frames
+
+    def flight_sent(self, rx_node, frames) -> None:
+        # Anything not acknowledged by the end of the exchange is resent,
+        # after a random wait so senders that collided do not collide again
+        sender = self.arq.sender(rx_node)
+        deadline = (time.monotonic() + self.sack_timeout()
+                    + random.uniform(0, self.RETX_FRAMES) * self.airtime(self.MAX_PAYLOAD_LEN))
+        for packet_id, payload in frames:
+            sender.sent(packet_id, deadline)
+
+    def flight_acked(self, rx_node, frame) -> None:
+        # Apply the selective ACK (None if it never came) to the flight
+        sender = self.arq.sender(rx_node)
+        if frame is None or frame.node() != rx_node or not frame.flags() & self.FLAG_SACK:
             self.logger.info(f"[TX {self.node}] Failed to receive ACK")
+            self.link.miss(rx_node)
+            return
+
+        acked = sender.sack(frame.get_u8(0), frame.get_uint(1, blockack.BITMAP_LEN))
+        self.logger.info(f"[TX {self.node}] Received ACK for {len(acked)} packets")
+        self.num_ack += len(acked)
+        if acked:
+            self.timing.end_exchange()
 
-    def recv_msg(self) -> bytes:
-        # Look for a new packet - wait up to 5 seconds:
+    async def recv_msg(self) -> list:
+        # Receive a flight of packets from one node, answer with a selective
+        # ACK and return the messages the payloads now deliverable in order
+        # complete
         self.logger.info(f"[RX {self.node}] Waiting for packets from other nodes")
 
-        # set receiving freq to self freq
-        self.frequency_mhz = self.frequency_table[self.node]
+        # Set receiving freq and SF to our own. With the asyncio runtime the
+        # radio keeps listening between calls, and retuning would drop a
+        # frame halfway in, so only retune after sending on another channel;
+        # frames heard there are of no use.
+        if self.tuned != self.node:
+            self.tune(self.node)
+            self.rt.flush()
 
-        # receive
-        packet = self.receive(timeout=3, with_header=True, with_ack=True)
+        # Look for a new packet for a few max-size frame times, or with
+        # offered load until we have something to send
+        frame = await self.wait_flight()
 
         # If no packet was received during the timeout then None is returned.
-        if packet is not None:
-            (dest, node, packet_id, flag), payload = packet[:4], packet[4:]
-            if len(payload) > self.MAX_PAYLOAD_LEN:
-                self.logger.info(f"[RX {self.node}] Payload corrupted {payload}")
-                return None
-            else:
-                self.num_recv += 1
-                return payload
-        return None
-    
+        if frame is None or frame.flags() & self.FLAG_SACK:
+            return []
+
+        tx_node = frame.node()
+        payloads = []
+        while frame is not None and frame.node() == tx_node and not frame.flags() & self.FLAG_SACK:
+            payloads += self.flight_frame(frame)
+
+            # The last frame of the flight clears FLAG_MORE
+            if not frame.flags() & self.FLAG_MORE:
+                break
+            frame = await self.recv_next()
+
+        await self.send_sack(tx_node)
+        return self.flight_received(tx_node, payloads)
+
+    @timed("listen")
+    async def wait_flight(self) -> FrameCodec:
+        # Idle listening for the first frame of a flight
+        return await self.recv_frame(self.listen_time())
+
+    @timed("recv_msg")
+    async def recv_next(self) -> FrameCodec:
+        # The next frame of a flight under way
+        return await self.recv_frame(self.response_timeout(self.MAX_PAYLOAD_LEN))
+
+    @timed("send_ack")
+    async def send_sack(self, tx_node) -> None:
+        await self.put_on_air(self.sack_frame(tx_node), destination=tx_node, flags=self.FLAG_SACK)
+
+    def sack_frame(self, tx_node):
+        return self.arq.receiver(tx_node).sack_into(self.codec.begin()).frame()
+
+    def flight_frame(self, frame) -> list:
+        # Hand a frame of a flight, just heard, to its sender's ARQ receiver.
+        # Returns the payloads now deliverable in order. The payload is
+        # copied out of the codec, as the ARQ may hold it.
+        if frame.body_len() > self.MAX_PAYLOAD_LEN:
+            self.logger.info(f"[RX {self.node}] Payload corrupted {bytes(frame.payload())}")
+            return []
+        return self.arq.receiver(frame.node()).receive(frame.packet_id(), frame.payload(), frame.flags() & self.FLAG_SYN)
+
+    def flight_received(self, tx_node, payloads) -> list:
+        self.num_recv += len(payloads)
+        return self.deliver([(tx_node, payload) for payload in payloads])
+
+    def attach(self, rt) -> None:
+        # Drive the node with an aio.Runtime instead of the blocking one
+        self.rt = rt
+
+    async def put_on_air(self, data, **kwargs) -> bool:
+        # send() through the runtime, counting every frame towards the link
+        # throughput
+        self.air_bytes += self.HEADER_LEN + len(data)
+        return await self.rt.send(data, **kwargs)
+
+    def deliver(self, payloads) -> list:
+        # Reassemble the (sender, payload) pairs into messages and count the
+        # ones handed up to code.py towards goodput
+        messages = []
+        for sender, payload in payloads:
+            message = self.reassembly.receive(sender, payload)
+            if message is not None:
+                messages.append(message)
+        self.app_bytes += sum(len(message) for message in messages)
+        return messages
+
     def get_stats(self):
         time_elapsed = time.monotonic() - self.node_start_time
-        throughput = self.sent_bytes * 8 / time_elapsed # in bps
+        rx_goodput = self.app_bytes * 8 / time_elapsed # in bps
+        tx_link = self.air_bytes * 8 / time_elapsed
         success_rate = f"{self.num_ack / self.num_send * 100:.2f}%" if self.num_send else "NA"
-        return f"----- send:{self.num_send}/ack:{self.num_ack}/recv:{self.num_recv}/success:{success_rate}/throughput:{throughput:.2f}bps -----"
+        stats = f"----- send:{self.num_send}/ack:{self.num_ack}/recv:{self.num_recv}/dup:{self.arq.num_dup()}/resync:{self.arq.num_resync()}/success:{success_rate}/rx_goodput:{rx_goodput:.2f}bps/tx_link:{tx_link:.2f}bps"
+        if self.csma:
+            stats += f"/cs_busy:{self.csma.num_busy}/cs_defer:{self.csma.num_deferred}/cs_giveup:{self.csma.num_gave_up}"
+        if self.ADAPTIVE_RATE:
+            stats += f"/rates:[{self.link.summary()}]"
+        stats += f"/neighbors:{len(self.neighbors.alive())}"
+        if self.traffic:
+            stats += f"/{self.traffic.summary()}"
+        if self.rt.summary():
+            stats += f"/{self.rt.summary()}"
+        if self.fragmenter.num_fragmented or self.reassembly.num_reassembled:
+            stats += f"/frag:{self.fragmenter.num_fragmented}/{self.reassembly.summary()}"
+        if self.LATENCY_STATS:
+            stats += f"/{self.timing.summary()}"
+        return stats + " -----"
@@ -12,16 +12,13 @@ import random
 import neopixel
 import time
 
-from proj_config import NODE_ID
 from rts_cts_node import RTS_CTS_NODE, RTS_CTS_Error
+from lorasphere import telemetry
+from proj_config import COMPACT_TELEMETRY, DUMP_RECORDS, ASYNC_RUNTIME
 
 # Initialize RTS-CTS node
 node = RTS_CTS_NODE()
 
-# Initialize list of neighboring nodes
-neighbors = [0x00, 0x01, 0x02, 0x03]
-neighbors.remove(NODE_ID)
-
 ### NEOPIXEL ###
 pixel = neopixel.NeoPixel(board.NEOPIXEL, 1)
 pixel.brightness = 0.5
@@ -33,62 +30,164 @@ color_map = {
     (0, 255, 255):  "cyan",
     (255, 0, 255):  "purple",
 }
+colors = list(color_map.items())  # Built once, not per message
 color_red = (255, 0, 0)
 color_blue = (0, 0, 255)
 color_off = (0, 0, 0)
 
-### Function for a node sleeping when channel is busy
-def node_sleep():
-    print("[NODE_SLEEP] Sleeping for 500 ms...")
+### Function for a node sleeping while another exchange has reserved the channel
+async def node_sleep():
+    remaining = node.nav_remaining()
+    print(f"[NODE_SLEEP] Sleeping for {remaining * 1000:.0f} ms...")
     pixel.fill(color_off)
-    time.sleep(0.5)
+    start = time.monotonic()
+    node.flush_trace(force=True)
+    await node.rt.sleep(node.nav_remaining())
+    node.timing.done("node_sleep", start)
 
 
-if __name__ == '__main__':
+# Numbers our telemetry records and keeps the recent ones for sensor dumps
+recorder = telemetry.Recorder(COMPACT_TELEMETRY, DUMP_RECORDS, max_message=node.fragmenter.MAX_MESSAGE)
+
+def make_payload():
+    # A telemetry record with a random colour, only as long as it needs to
+    # be, or now and then a dump of the recent ones
+    color, color_name = random.choice(colors)
+    return recorder.next(color)
+
+def show(payload):
+    # Print a message we received
+    print(telemetry.decode(payload))
+
+async def mac(deliver):
+    # The MAC, waiting on the radio through node.rt. Received messages go to
+    # deliver: shown right away, or handed to the display task with the
+    # asyncio runtime.
+
+    # Destination we are contending for; its frames wait in node.arq
+    request_node = None
+
+    # Start with a random backoff so boards that boot together don't collide
+    node.start_backoff(None)
+
     while True:
-        # Based on choice, decide to TX or RX
-        choice = random.randint(0, 100)
+        # Between exchanges: print the trace before it wraps
+        node.flush_trace()
+
+        # Queue the messages the traffic source generated meanwhile
+        if node.traffic:
+            node.traffic.generate(node.destinations(), make_payload)
 
-        if choice < 50:
+        # Transmit once our backoff has expired, listen until then
+        if node.backoff_remaining() == 0:
             """ ---- Node is in TX mode ---- """
 
+            # Virtual carrier sense: wait out any reservation we overheard,
+            # then contend right away
+            if node.nav_remaining() > 0:
+                await node_sleep()
+
             # Set pixel to red for indicating TX
             pixel.fill(color_red)
 
-            # Send RTS to random dest and wait for CTS
-            request_node = random.choice(neighbors)
+            # Let the others know we are still here, and send any route requests
+            if node.hello_due():
+                await node.send_hello()
+            await node.send_broadcasts()
+
+            # Only contend for nodes we have heard from recently: frames for
+            # a node that went quiet are given up on
+            neighbors = node.neighbors.alive()
+            for peer in node.arq.pending():
+                if peer not in neighbors:
+                    print(f"[TX] Node {peer} is gone, dropping its frames")
+                    node.give_up(peer)
+            if not neighbors:
+                node.start_backoff(None)
+                continue
+
+            # Retry what is left unacknowledged in the dest's ARQ window, else
+            # serve another next hop with frames waiting (ours or forwarded),
+            # else queue a TXOP worth of payloads: from the transmit queues
+            # with offered load, for a random destination otherwise
+            sender = node.arq.sender(request_node)
+            if not sender.pending():
+                if node.traffic:
+                    dest = node.traffic.next_dest(node.ready)
+                    if dest is not None:
+                        for payload in node.traffic.pop(dest, node.TXOP_LIMIT):
+                            node.queue_msg(dest, payload)
+                elif not node.arq.pending():
+                    dest = random.choice(node.destinations())
+                    for _ in range(node.TXOP_LIMIT):
+                        node.queue_msg(dest, make_payload())
+
+                # Nothing to send until a message arrives or a route request
+                # is answered: listen
+                peers = node.arq.pending()
+                if not peers:
+                    node.start_backoff(None)
+                    continue
+                request_node = random.choice(peers)
+                sender = node.arq.sender(request_node)
+
+            pending = sender.due(node.txop_limit(request_node))
+            if not pending:
+                node.start_backoff(request_node)
+                continue
+
+            # Physical carrier sense: if the channel stays busy, draw a new
+            # backoff without counting it as our failure
+            if not await node.carrier_sense():
+                node.start_backoff(request_node)
+                continue
 
-            node.send_rts(request_node)
-            flag_cts = node.wait_cts(request_node)
+            # Below the RTS threshold a message costs less airtime than the
+            # handshake that would protect it: send it right away and wait
+            # for its ACK
+            if not node.needs_rts(request_node, pending):
+                await node.send_direct(request_node, pending[0])
+                flag_ack = await node.wait_ack(request_node)
+                if node.end_attempt(request_node, flag_ack == RTS_CTS_Error.SUCCESS) and flag_ack != RTS_CTS_Error.SUCCESS:
+                    node.give_up(request_node)
+                continue
+
+            # Send RTS to dest and wait for CTS
+            await node.send_rts(request_node, len(pending))
+            flag_cts = await node.wait_cts(request_node)
 
             # Check return val for wait_cts
             if flag_cts == RTS_CTS_Error.SUCCESS:
                 # Got a valid CTS from the dest!
 
-                # Generate random payload of colors
-                color, color_name = random.choice(list(color_map.items()))
-                payload = bytes(color) + b'\x55' * (node.MAX_PAYLOAD_LEN - len(color))
+                # Stream as many messages as the CTS granted
+                await node.send_burst(request_node, pending[:node.granted])
 
-                # Send message to the dest
-                node.send_msg(request_node, payload)
+                # Wait for ACK (class does not use send_with_ack); the ARQ
+                # keeps the frames it did not acknowledge for retransmission
+                flag_ack = await node.wait_ack(request_node)
 
-                # Wait for ACK (class does not use send_with_ack)\
-                node.wait_ack()
+                # Grow or reset the contention window for this dest
+                if node.end_attempt(request_node, flag_ack == RTS_CTS_Error.SUCCESS) and flag_ack != RTS_CTS_Error.SUCCESS:
+                    node.give_up(request_node)
 
             elif flag_cts == RTS_CTS_Error.CTS_NOT_DEST:
-                # Got a CTS from another node, so channel is busy
-                node_sleep()
-            
+                # Got a CTS from another node, so channel is busy: defer and
+                # draw a new backoff without counting it as our failure
+                await node_sleep()
+                node.start_backoff(request_node)
+
             else:
                 # No response from dest to the RTS
-                pass
+                if node.end_attempt(request_node, False):
+                    node.give_up(request_node)
 
         else:
             """ ---- Node is in RX mode ---- """
             pixel.fill(color_blue)
 
-            # Wait for an RTS or CTS packet
-            flag_rts = node.wait_rts()
+            # Wait for an RTS or CTS packet until our backoff expires
+            flag_rts = await node.wait_rts(node.backoff_remaining())
 
             # Check return val for wait_rts
             if flag_rts == RTS_CTS_Error.SUCCESS:
@@ -96,30 +195,75 @@ if __name__ == '__main__':
                 tx_node = node.last_node
 
                 # Send a CTS as a broadcast to all nodes, indicating channel busy and specify tx_node
-                node.send_cts(tx_node)
+                await node.send_cts(tx_node, node.requested)
 
-                # Wait for an actual message from tx_node
-                payload = node.recv_msg(tx_node)
+                # Wait for the burst of messages from tx_node
+                payloads = await node.recv_burst(tx_node, node.granted)
 
-                # If no payload, go back to loop init
-                if payload is None:
+                # If no frame arrived, go back to loop init
+                if not node.burst_received:
                     continue
 
                 # Get color from payload
-                print(payload)
+                for payload in payloads:
+                    deliver(payload)
 
                 # ACK back to tx_node
-                node.send_ack(tx_node)
+                await node.send_ack(tx_node)
 
-            elif flag_rts == RTS_CTS_Error.RTS_WRONG:
-                # Got a CTS from another node, so channel is busy
-                node_sleep()
+            elif flag_rts == RTS_CTS_Error.DIRECT_MSG:
+                # A short message sent without an RTS: ACK it right away
+                for payload in await node.recv_direct(node.last_node):
+                    deliver(payload)
 
             else:
-                # No CTS received
+                # No RTS for us before our backoff expired; any reservation
+                # overheard meanwhile is in the NAV
                 pass
 
+        # With the asyncio runtime the report task prints these instead
+        if not ASYNC_RUNTIME:
+            print(node.get_stats())
+
+# Seconds between stats lines with the asyncio runtime
+STATS_INTERVAL = 5
+
+async def offered_load(rt):
+    # Queue each message as the traffic source generates it
+    while True:
+        node.traffic.generate(node.destinations(), make_payload)
+        wait = node.traffic.until_next()
+        if wait is None:
+            return
+        await rt.sleep(wait)
+
+async def display(inbox):
+    # Show every message received
+    while True:
+        show(await inbox.get())
+
+async def report(rt):
+    while True:
+        await rt.sleep(STATS_INTERVAL)
         print(node.get_stats())
 
+def run_async():
+    # Only imported here: boards without the asyncio library can still run
+    # the MAC on the blocking runtime
+    from lorasphere import aio
+
+    rt = aio.Runtime(node)
+    node.attach(rt)
+    inbox = aio.Queue(rt)
+    rt.spawn(mac(inbox.put_nowait))
+    if node.traffic:
+        rt.spawn(offered_load(rt))
+    rt.spawn(display(inbox))
+    rt.spawn(report(rt))
+    rt.run()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if ASYNC_RUNTIME:
+        run_async()
+    else:
+        node.rt.run(mac(show))
@@ -1,2 +1,60 @@
 # ENSURE ID IS UPDATED TO MATCH BOARD NAME
 NODE_ID = None # TODO change this value once
+
+# Listen before talk: None to send blind, "cad" for channel activity
+# detection or "rssi" for an RSSI threshold
+CARRIER_SENSE = None
+
+# Pick the data rate per neighbour from the SNR of the frames heard from it
+ADAPTIVE_RATE = False
+
+# Multi-channel mode: RTS/CTS stay on CONTROL_FREQUENCY (MHz) and every
+# reserved exchange moves to the data channel its CTS assigns, so several can
+# run at once. None keeps the whole exchange on the control frequency.
+CONTROL_FREQUENCY = 915.0
+DATA_CHANNELS = None # e.g. [903.9, 904.1, 904.3, 904.5]
+
+# RTS threshold: messages whose body (control byte and payload) is shorter
+# than this many bytes skip the RTS/CTS handshake and go out directly with an
+# ACK. 0 reserves the channel for every message: in the simulator (5 nodes,
+# 60 s, seeds 1-6) 61-94% of messages were acknowledged that way, against
+# 16-25% at 256, where every message goes out unprotected and collides.
+# ADAPTIVE_RTS lets each neighbour's threshold follow the collision rate of
+# the attempts towards it.
+RTS_THRESHOLD = 0
+ADAPTIVE_RTS = False
+
+# Multi-hop mesh: reach nodes out of radio range through AODV-style routes
+ROUTING = False
+
+# Offered load: None flips a coin between sending and listening. Otherwise
+# messages arrive from a "poisson", "periodic" or "onoff" source at
+# TRAFFIC_RATE per second, or replay TRAFFIC_TRACE ("trace", lines of
+# "seconds,destination"), and the node only sends while some are queued.
+TRAFFIC = None
+TRAFFIC_RATE = 0.2
+TRAFFIC_TRACE = "traffic.csv"
+
+# Telemetry records go out as short text ("seq,uptime_ms,r,g,b"); True packs
+# them into 10 bytes instead
+COMPACT_TELEMETRY = False
+
+# Every 10th message is a sensor dump of the last DUMP_RECORDS records (10
+# bytes each), fragmented over as many frames as it needs; 0 never dumps.
+# Dumps are capped at 409 records, the most a 4096 byte message holds.
+DUMP_RECORDS = 0
+
+# Run the node as asyncio tasks (MAC, traffic, display, stats) on a runtime
+# that polls the radio's IRQ flags, instead of one loop of blocking calls.
+# Needs the asyncio and adafruit_ticks libraries in CIRCUITPY/lib.
+ASYNC_RUNTIME = False
+
+# Record the RTS/CTS exchange as 10-byte binary events in a ring of this many,
+# printed in bulk between exchanges, instead of formatting an INFO log line at
+# every step. Decode a capture of the console with tools/trace_decode.py.
+# 0 keeps the INFO log.
+TRACE_EVENTS = 0
+
+# Add to the stats line the share of time spent in each state, a histogram of
+# how long each stay took and the RTS to ACK time of every exchange
+LATENCY_STATS = False
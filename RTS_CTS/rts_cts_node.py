@@ -1,9 +1,29 @@
 import time
+import random
 import board
 import digitalio
 from adafruit_rfm9x import RFM9x
 import adafruit_logging as logging
-from proj_config import NODE_ID
+from lorasphere.airtime import frame_airtime
+from lorasphere.backoff import ContentionWindow
+from lorasphere import blockack
+from lorasphere.arq import Arq, SYN_LEN
+from lorasphere import blocking
+from lorasphere.codec import FrameCodec
+from lorasphere import trace
+from lorasphere.trace import Tracer
+from lorasphere.latency import StateTimer, timed
+from lorasphere.csma import Csma
+from lorasphere.fragment import Fragmenter, Reassembler
+from lorasphere.linktable import LinkTable
+from lorasphere.neighbors import NeighborTable
+from lorasphere import routing
+from lorasphere.routing import Router
+from lorasphere.threshold import RtsThreshold
+from lorasphere.traffic import Traffic
+from proj_config import NODE_ID, CARRIER_SENSE, ADAPTIVE_RATE, CONTROL_FREQUENCY, DATA_CHANNELS, ROUTING
+from proj_config import TRAFFIC, TRAFFIC_RATE, TRAFFIC_TRACE, RTS_THRESHOLD, ADAPTIVE_RTS
+from proj_config import TRACE_EVENTS, LATENCY_STATS
 
 class RTS_CTS_Error():
     SUCCESS         = 0  # Success in RTS or CTS
@@ -13,12 +33,18 @@ class RTS_CTS_Error():
     RTS_TIMEOUT     = 3  # No RTS received
 
     CTS_WRONG       = 4 # Incorrect CTS format
-    CTS_NOT_DEST    = 5  # CTS not from RTS destination
+    CTS_NOT_DEST    = 5  # No CTS, and another exchange reserved the channel
     CTS_TIMEOUT     = 6  # No CTS received
 
     ACK_WRONG       = 7  # Incorrect ACK format
     ACK_TIMEOUT     = 8  # No ACK received
 
+    CHANNEL_BUSY    = 9  # Valid RTS, but every data channel is reserved
+
+    DIRECT_MSG      = 10 # Message sent without an RTS, below the RTS threshold
+
+    MSG_TIMEOUT     = 11 # No message received
+
 
 class RTS_CTS_NODE(RFM9x):
     # A single RTS/CTS node for the mesh network
@@ -26,11 +52,17 @@ class RTS_CTS_NODE(RFM9x):
     def __init__(self):
         self.logger = logging.getLogger('RTS_CTS')
         self.logger.setLevel(logging.DEBUG)
+
+        # With TRACE_EVENTS the exchange is recorded as binary events, and
+        # INFO lines are not even formatted: every one is behind LOG_INFO
+        self.LOG_INFO = not TRACE_EVENTS
+        if TRACE_EVENTS:
+            self.logger.setLevel(logging.WARNING)
         
         # Define Chip Select and Reset pins for the radio module.
         cs = digitalio.DigitalInOut(board.RFM_CS)
         reset = digitalio.DigitalInOut(board.RFM_RST)
-        radio_freq_mhz = 915.0
+        radio_freq_mhz = CONTROL_FREQUENCY
 
         # Initialise RFM95 radio
         RFM9x.__init__(self, board.SPI(), cs, reset, radio_freq_mhz)
@@ -43,6 +75,14 @@ class RTS_CTS_NODE(RFM9x):
         # self.node is internal to the driver, but also used for our logs
         self.node = NODE_ID
         self.BROADCAST_ADDRESS = 255
+        self.tracer = Tracer(self.node, TRACE_EVENTS) if TRACE_EVENTS else None
+
+        # Time spent in each state of the exchange, and RTS to ACK per
+        # exchange; in the stats with LATENCY_STATS
+        self.STATES = ("send_rts", "wait_cts", "send_msg", "wait_ack",
+                       "wait_rts", "send_cts", "recv_msg", "send_ack", "node_sleep")
+        self.LATENCY_STATS = LATENCY_STATS
+        self.timing = StateTimer(self.STATES)
 
         # Set LoRa parameters
         self.signal_bandwidth = 125000
@@ -51,212 +91,843 @@ class RTS_CTS_NODE(RFM9x):
         self.ack_retries = 0
         self.ack_wait = 1
 
-        # control packet definition
-        self.CONTROL_MSG = b'\x00'
-        self.CONTROL_RTS = b'\x01'
-        self.CONTROL_CTS = b'\x02'
-        self.CONTROL_ACK = b'\x03'
+        # Control frames always go out at the base rate so every neighbour
+        # hears them; a burst may use a faster or more robust (SF, CR)
+        self.BASE_RATE = (self.spreading_factor, self.coding_rate)
+        self.ADAPTIVE_RATE = ADAPTIVE_RATE
+
+        # control packet definition: the first byte of every body
+        self.CONTROL_MSG = 0x00
+        self.CONTROL_RTS = 0x01
+        self.CONTROL_CTS = 0x02
+        self.CONTROL_ACK = 0x03
+        self.CONTROL_BLOCK_ACK = 0x04
+        self.CONTROL_HELLO = 0x05
+        self.CONTROL_ROUTE = 0x06
 
         # Packet length definitions
         self.HEADER_LEN  = 4
         self.CONTROL_LEN = 1
         self.MAX_PAYLOAD_LEN = 249
 
+        # RTS and CTS body: control byte, addressed node, NAV duration (ms),
+        # the number of frames queued (RTS) or granted (CTS) for this TXOP,
+        # the burst's rate (SF in the high nibble, CR in the low one) and the
+        # data channel the sender would like (RTS) or is given (CTS)
+        self.DURATION_LEN = 2
+        self.RTS_LEN = self.CONTROL_LEN + 1 + self.DURATION_LEN + 3
+        self.CTS_LEN = self.CONTROL_LEN + 1 + self.DURATION_LEN + 3
+
+        # ACK body: control byte only. Block ACK body: control byte, starting
+        # packet_id and a bitmap of the packet_ids received after it
+        self.ACK_LEN = self.CONTROL_LEN
+        self.BLOCK_ACK_LEN = self.CONTROL_LEN + blockack.BLOCK_ACK_LEN
+        self.MSG_LEN = self.CONTROL_LEN + self.MAX_PAYLOAD_LEN
+
+        # Every body is built in and parsed through one set of buffers, so
+        # the send and receive paths do not churn the heap mid-exchange
+        self.codec = FrameCodec(self.MSG_LEN)
+
+        # Transmit opportunity: most MSG frames sent per RTS/CTS reservation.
+        # A backlog longer than that, such as the fragments of a long
+        # message, gets up to a block ACK's worth in one reservation.
+        self.TXOP_LIMIT = 4
+        self.FRAGMENT_TXOP = blockack.WINDOW
+
+        # Messages with a shorter body skip the RTS/CTS handshake and go out
+        # directly with an ACK; adaptive thresholds track each neighbour's
+        # collision rate
+        self.rts_threshold = RtsThreshold(RTS_THRESHOLD, ADAPTIVE_RTS, max_threshold=self.MSG_LEN + 1)
+
+        # Header flags: on every burst frame but the last, and on frames the
+        # ARQ marks SYN to resync the receiver (see lorasphere.arq)
+        self.FLAG_MORE = 0x01
+        self.FLAG_SYN = 0x20
+
         # header definition
         self.HEADER_DEST = 0
         self.HEADER_NODE = 1
         self.HEADER_PACKET_ID = 2
         self.HEADER_FLAG = 3
 
+        # Receive deadlines, derived from time on air at the current settings
+        self.RX_GUARD = 0.05      # Peer turnaround plus timing slack, in seconds
+        self.LISTEN_FRAMES = 2    # Idle listen window, in max-size frames
+
         # Counter variables
         self.num_send = 0
         self.num_recv = 0
         self.num_ack  = 0
         self.node_start_time = time.monotonic()
-        self.sent_bytes = 0
-        self.last_sent_bytes = 0
-
-        # Last node that transmitted to us
-        self.last_node = 255
 
-    def send_raw(self, dest, control:bytes=None, payload:bytes=None) -> None:
-        # Send any data and log to the logger
-        assert control, "[CRITICAL ERROR] Tried transmitting without a control byte"
+        # Receive side: application bytes delivered to us. Transmit side:
+        # every byte we put on air (RadioHead headers, control frames and
+        # ACKs included). They count different traffic, so a receiver's
+        # goodput can exceed its own link throughput.
+        self.app_bytes = 0
+        self.air_bytes = 0
 
-        data = control + (payload if payload else b'')
+        # Selective-repeat ARQ per peer; a TXOP carries frames from its window,
+        # and the queue has room for every fragment of a long message
+        self.arq = Arq(window=self.FRAGMENT_TXOP, retry_limit=6, queue_limit=32)
 
-        # Log info and send
-        self.send(data=data, node=self.node, destination=dest)
+        # packet_ids of the burst frames awaiting an ACK
+        self.burst = []
 
-    def recv_raw(self) -> bytes:
-        # Receive any data and log to the logger
-        packet = self.receive(timeout=1, with_header=True)
+        # Payload of the last message that reached us without an RTS
+        self.direct_payload = None
 
-        if packet is None or len(packet) <= self.HEADER_LEN:
-            # No packet received or wrong packet received
-            return None, None
+        # Frames of the last burst that reached us, in order or not
+        self.burst_received = 0
 
-        # Extract RadioHead header params
-        self.last_node = packet[1]
-
-        return packet[:self.HEADER_LEN], packet[self.HEADER_LEN:]
-
-    def send_msg(self, rx_node, payload) -> None:
-        # Send a 250 byte message to rx_node
-        self.logger.info(f"[TX {self.node}] Sending message to {rx_node}")
-        self.send_raw(dest=rx_node, control=self.CONTROL_MSG, payload=payload)
+        # Last node that transmitted to us, and the rest of its header
+        self.last_node = 255
+        self.last_packet_id = 0
+        self.last_flags = 0
+
+        # Frames requested in the last RTS, granted in the last CTS, and the
+        # (packet_id, payload) frames newly acknowledged by the last ACK
+        self.requested = 0
+        self.granted = 0
+        self.acked = []
+
+        # Whether another exchange reserved the channel while we waited for a CTS
+        self.reserved = False
+
+        # Network allocation vector: channel reserved by others until this time
+        self.nav_until = 0
+
+        # Contention window for our own RTS attempts, and when we may next try
+        self.cw = ContentionWindow(cw_min=4, cw_max=64, retry_limit=6)
+        self.backoff_until = 0
+
+        # Physical carrier sense before each RTS, on top of the NAV
+        self.csma = Csma(self, CARRIER_SENSE, ifs=self.RX_GUARD) if CARRIER_SENSE else None
+
+        # SNR of every neighbour we hear, and the (SF, CR) agreed for the
+        # burst of the current exchange
+        self.link = LinkTable(default_rate=self.BASE_RATE)
+        self.data_rate = self.BASE_RATE
+
+        # Multi-channel mode: RTS/CTS on the control frequency, the burst and
+        # its ACK on a data channel. channel_until holds when each data
+        # channel's last overheard reservation ends.
+        self.CONTROL_FREQUENCY = CONTROL_FREQUENCY
+        self.DATA_CHANNELS = DATA_CHANNELS or []
+        self.NO_CHANNEL = 0xFF
+        self.channel_until = [0] * len(self.DATA_CHANNELS)
+        self.data_channel = self.NO_CHANNEL
+
+        # Neighbours announced by HELLOs or heard sending anything else
+        self.neighbors = NeighborTable()
+
+        # Multi-hop routing: payloads carry the routing extension header and
+        # route requests not yet sent wait in `broadcasts`
+        self.router = Router(self.node) if ROUTING else None
+        self.broadcasts = []
+        self.DATA_LEN = self.MAX_PAYLOAD_LEN - SYN_LEN - (routing.HEADER_LEN if ROUTING else 0)
+
+        # Messages longer than a frame go out as fragments, reassembled per
+        # origin on the far end. Each leaves room for the SYN header the ARQ
+        # may put in front of it.
+        self.fragmenter = Fragmenter(self.DATA_LEN)
+        self.reassembly = Reassembler()
+
+        # Offered load: a traffic source feeding per-destination transmit
+        # queues, or None for the coin-flip loop in code.py
+        self.traffic = Traffic(TRAFFIC, TRAFFIC_RATE, trace=TRAFFIC_TRACE) if TRAFFIC else None
+
+        # Runtime the MAC's coroutines wait on the radio through: blocking
+        # driver calls, unless code.py attaches an aio.Runtime with
+        # ASYNC_RUNTIME
+        self.rt = blocking.Runtime(self)
+
+    async def send_raw(self, dest, control=None, payload=None, packet_id=0, flags=0) -> None:
+        # Send a control byte and an optional payload
+        self.codec.begin(control)
+        if payload:
+            self.codec.put(payload)
+        await self.send_frame(dest, packet_id, flags)
+
+    async def send_frame(self, dest, packet_id=0, flags=0) -> None:
+        # Send the body built in the codec, counting every byte we put on air
+        # towards the link throughput
+        assert self.codec.tx_len, "[CRITICAL ERROR] Tried transmitting without a control byte"
+        data = self.codec.frame()
+        self.air_bytes += self.HEADER_LEN + len(data)
+        await self.rt.send(data, node=self.node, destination=dest, identifier=packet_id, flags=flags)
+
+    def airtime(self, body_len, rate=None) -> float:
+        # Time on air of a frame carrying body_len bytes after the RadioHead
+        # header, at the current settings or the given (SF, CR)
+        sf, cr = rate if rate else (None, None)
+        return frame_airtime(self, body_len, sf, cr)
+
+    def response_timeout(self, body_len) -> float:
+        # How long to wait for a reply of body_len bytes that the peer sends
+        # as soon as our own frame has left the air
+        return self.RX_GUARD + self.airtime(body_len)
+
+    def listen_timeout(self) -> float:
+        # Idle listen window, scaled with the airtime of a full message
+        return self.LISTEN_FRAMES * self.airtime(self.CONTROL_LEN + self.MAX_PAYLOAD_LEN)
+
+    def exchange_time(self, *body_lens) -> float:
+        # Airtime of a sequence of frames, each sent one turnaround after the last
+        return sum(self.RX_GUARD + self.airtime(n) for n in body_lens)
+
+    def burst_time(self, frames) -> float:
+        # Airtime of a burst of `frames` messages at the exchange's data rate
+        return frames * (self.RX_GUARD + self.airtime(self.MSG_LEN, self.data_rate))
+
+    def encode_rate(self, rate) -> int:
+        sf, cr = rate
+        return sf << 4 | cr
+
+    def decode_rate(self, value) -> tuple:
+        return (value >> 4, value & 0x0F)
+
+    def set_rate(self, rate) -> None:
+        # Retune the modem; only between frames
+        self.spreading_factor, self.coding_rate = rate
+
+    def free_channel(self, preferred=None):
+        # A data channel nobody has reserved: preferred if it is free, else a
+        # random free one. NO_CHANNEL in single-channel mode, None if all are taken.
+        if not self.DATA_CHANNELS:
+            return self.NO_CHANNEL
+        now = time.monotonic()
+        free = [ch for ch, until in enumerate(self.channel_until) if until <= now]
+        if preferred in free:
+            return preferred
+        return random.choice(free) if free else None
+
+    def set_channel(self, channel) -> None:
+        # Move to a data channel for a burst and its ACK, or back to the
+        # control frequency with NO_CHANNEL
+        if channel < len(self.DATA_CHANNELS):
+            self.frequency_mhz = self.DATA_CHANNELS[channel]
+        elif self.DATA_CHANNELS:
+            self.frequency_mhz = self.CONTROL_FREQUENCY
+
+    def encode_duration(self, seconds) -> int:
+        # NAV duration field, in whole ms rounded up
+        return min(int(seconds * 1000) + 1, 0xFFFF)
+
+    def set_nav(self, duration_ms) -> None:
+        # Defer until a reservation we overheard ends, keeping the later one
+        self.nav_until = max(self.nav_until, time.monotonic() + duration_ms / 1000)
+
+    def nav_remaining(self) -> float:
+        # Seconds left before the channel is free again (virtual carrier sense)
+        return max(0, self.nav_until - time.monotonic())
+
+    def slot_time(self) -> float:
+        # One backoff slot: the time an RTS/CTS attempt holds the channel
+        return self.exchange_time(self.RTS_LEN, self.CTS_LEN)
+
+    def start_backoff(self, dest) -> None:
+        # Draw a random number of slots from the window for dest
+        self.backoff_until = time.monotonic() + self.cw.draw(dest) * self.slot_time()
+
+    def backoff_remaining(self) -> float:
+        return max(0, self.backoff_until - time.monotonic())
+
+    async def carrier_sense(self) -> bool:
+        # Listen before sending an RTS. Returns False if the channel stayed busy.
+        if self.csma is None or await self.csma.wait_clear(self.rt):
+            return True
+        if self.LOG_INFO:
+            self.logger.info(f"[TX {self.node}] Channel busy, deferring RTS")
+        return False
+
+    def end_attempt(self, dest, success) -> bool:
+        # Update the contention window after an RTS attempt towards dest and
+        # back off before the next one. Returns True once the frame is done
+        # with (delivered, or dropped after too many retries).
+        self.rts_threshold.update(dest, not success)
+        if success:
+            self.cw.success(dest)
+            done = True
+        else:
+            done = self.cw.failure(dest)
+            if done:
+                self.logger.warning(f"[TX {self.node}] Dropping frame to {dest} after {self.cw.RETRY_LIMIT} retries")
+
+        self.start_backoff(dest)
+        return done
+
+    def trace_event(self, event, peer, packet_id=0, result=0, heard=False) -> None:
+        # Record a step of the exchange; `heard` adds the RSSI and SNR of the
+        # frame just received
+        if self.tracer:
+            if heard:
+                self.tracer.record(event, peer, packet_id, result, self.last_rssi, self.last_snr)
+            else:
+                self.tracer.record(event, peer, packet_id, result)
+
+    def traced(self, event, peer, result, packet_id=0) -> RTS_CTS_Error:
+        # Record how a wait ended and pass its result on; packet_id and the
+        # link quality only mean something if it got what it waited for.
+        # A peer of None is the sender of that frame.
+        heard = result in (RTS_CTS_Error.SUCCESS, RTS_CTS_Error.DIRECT_MSG)
+        if peer is None:
+            peer = self.last_node if heard else trace.NO_PEER
+        self.trace_event(event, peer, packet_id if heard else 0, result, heard)
+        return result
+
+    def flush_trace(self, force=False) -> None:
+        # Print the trace while nothing is timing-critical: once it is half
+        # full, or with force however little it holds
+        if self.tracer and self.tracer.count and (force or self.tracer.due()):
+            self.tracer.flush()
+
+    def overhear(self, control) -> bool:
+        # Update the NAV from an RTS or CTS that reserves the channel for
+        # another node. Returns True if the frame was such a reservation.
+        codec = self.codec
+        if control is None or codec.body_len() != self.RTS_LEN:
+            return False
+
+        target = codec.get_u8(1)
+        if control not in (self.CONTROL_RTS, self.CONTROL_CTS) or target == self.node:
+            return False
+
+        duration_ms = codec.get_uint(2, self.DURATION_LEN)
+        channel = codec.get_u8(self.RTS_LEN - 1)
+        self.trace_event(trace.NAV, self.last_node, target, heard=True)
+        if not self.DATA_CHANNELS:
+            if self.LOG_INFO:
+                self.logger.info(f"[{self.node}] Channel reserved for {duration_ms} ms by {self.last_node}")
+            self.set_nav(duration_ms)
+
+        # Multi-channel: the control frequency is only held until the CTS is
+        # out; the rest of the exchange runs on the data channel the CTS names
+        elif control == self.CONTROL_RTS:
+            self.set_nav(self.exchange_time(self.CTS_LEN) * 1000)
+        elif channel < len(self.DATA_CHANNELS):
+            if self.LOG_INFO:
+                self.logger.info(f"[{self.node}] Data channel {channel} reserved for {duration_ms} ms by {self.last_node}")
+            self.channel_until[channel] = max(self.channel_until[channel], time.monotonic() + duration_ms / 1000)
+        return True
+
+    async def recv_raw(self, timeout) -> int:
+        # Receive any data and log to the logger. HELLOs and broadcast routing
+        # messages are handled here; we keep listening for the rest of the
+        # timeout. Returns the control byte of the frame, its header and body
+        # in self.codec.
+        deadline = time.monotonic() + timeout
+        while True:
+            packet = await self.rt.receive(max(0, deadline - time.monotonic()))
+
+            # Frames for another node or failing the CRC come back as None
+            # before the timeout is up: they are not the end of the wait
+            if packet is not None and self.codec.parse(packet):
+                control = self.heard()
+                if control is not None:
+                    return control
+            if time.monotonic() >= deadline:
+                return None
+
+    def heard(self) -> int:
+        # Take in the frame just parsed: note its header, link quality and
+        # that its sender is alive, and handle HELLOs and broadcast routing
+        # messages. Returns the control byte of any other frame.
+        codec = self.codec
+        self.last_node = codec.node()
+        self.last_packet_id = codec.packet_id()
+        self.last_flags = codec.flags()
+
+        # Every frame we hear, addressed to us or not, measures its link
+        # and shows its sender is alive
+        self.link.update(self.last_node, self.last_snr, self.last_rssi)
+        self.neighbors.heard(self.last_node, self.last_rssi)
+
+        control = codec.get_u8(0)
+        if control == self.CONTROL_HELLO:
+            if self.router:
+                self.router.hello(self.last_node, codec.payload(2, 2 + codec.get_u8(1)))
+        elif control == self.CONTROL_ROUTE:
+            if self.router:
+                self.route_in(self.last_node, [codec.payload(1)])
+        else:
+            return control
+        return None
+
+    def hello_due(self) -> bool:
+        return self.neighbors.hello_due()
+
+    async def send_hello(self) -> None:
+        # Broadcast that we are alive and whom we hear
+        self.build_hello()
+        await self.send_frame(self.BROADCAST_ADDRESS)
+        self.neighbors.hello_sent()
+
+    def build_hello(self) -> None:
+        if self.LOG_INFO:
+            self.logger.info(f"[TX {self.node}] Sending HELLO")
+        neighbors = self.neighbors.alive()
+        self.trace_event(trace.HELLO, trace.NO_PEER, len(neighbors))
+        self.codec.begin(self.CONTROL_HELLO).put_u8(len(neighbors))
+        for neighbor in neighbors:
+            self.codec.put_u8(neighbor)
+
+    def destinations(self) -> list:
+        # Nodes we can send to: live neighbours, and with routing every node
+        # a cached route reaches
+        neighbors = self.neighbors.alive()
+        return self.router.destinations(neighbors) if self.router else neighbors
+
+    def ready(self, dest) -> bool:
+        # Whether payloads for dest would be the next TXOP's rather than wait
+        # behind frames already queued for its next hop. Without a route yet,
+        # the router holds them.
+        if self.router:
+            dest = self.router.lookup(dest, self.neighbors.alive())
+            if dest is None:
+                return True
+        return not self.arq.sender(dest).pending()
+
+    def queue_msg(self, dest, message) -> None:
+        # Queue message for dest, in fragments if it does not fit in a frame.
+        # With routing, dest is the final destination and the frames wait for
+        # their next hop (or for a route to it).
+        for payload in self.fragmenter.split(message):
+            if self.router:
+                self.route_out(self.router.send(dest, payload, self.neighbors.alive()))
+            elif not self.arq.sender(dest).push(payload):
+                self.logger.warning(f"[TX {self.node}] Queue to {dest} full, dropping packet")
+
+    def txop_limit(self, peer) -> int:
+        # Frames to ask for in one reservation: a long backlog for peer goes
+        # out in a single, longer TXOP rather than one handshake per few frames
+        return self.FRAGMENT_TXOP if self.arq.sender(peer).pending() > self.TXOP_LIMIT else self.TXOP_LIMIT
+
+    def route_out(self, frames) -> None:
+        # Queue the router's (next hop, frame) pairs: route requests for the
+        # next send_broadcasts(), the rest in the next hop's ARQ
+        for next_hop, frame in frames:
+            if next_hop == routing.BROADCAST:
+                self.broadcasts.append(frame)
+            elif not self.arq.sender(next_hop).push(frame):
+                self.logger.warning(f"[TX {self.node}] Queue to {next_hop} full, dropping packet")
+
+    def route_in(self, prev_hop, frames) -> list:
+        # Hand routed frames from prev_hop to the router. Returns the
+        # (origin, payload) pairs that were for us; the rest is queued to be
+        # passed on.
+        payloads = []
+        for frame in frames:
+            forward, payload = self.router.receive(prev_hop, frame, self.neighbors.alive())
+            self.route_out(forward)
+            if payload is not None:
+                payloads.append(payload)
+        return payloads
+
+    async def send_broadcasts(self) -> None:
+        # Send queued route requests, without an RTS: nobody answers them
+        if self.router:
+            self.route_out(self.router.poll(self.neighbors.alive()))
+        while self.broadcasts:
+            if self.csma and not await self.csma.wait_clear(self.rt):
+                break
+            await self.send_raw(dest=self.BROADCAST_ADDRESS, control=self.CONTROL_ROUTE, payload=self.broadcasts.pop(0))
+
+    def give_up(self, peer) -> None:
+        # Drop everything queued for peer, and any route through it
+        self.trace_event(trace.DROP, peer, self.arq.sender(peer).pending())
+        self.arq.sender(peer).clear()
+        if self.router:
+            self.router.link_failed(peer)
+
+    @timed("send_msg")
+    async def send_msg(self, rx_node, payload, packet_id=0, more=False) -> None:
+        # Send a 250 byte message to rx_node. Within a burst, `more` is set on
+        # every frame but the last.
+        if self.LOG_INFO:
+            self.logger.info(f"[TX {self.node}] Sending message {packet_id} to {rx_node}")
+        sender = self.arq.sender(rx_node)
+        flags = self.FLAG_MORE if more else 0
+        if sender.syn:
+            flags |= self.FLAG_SYN
+            payload = sender.syn_header() + payload
+        self.trace_event(trace.SEND_MSG, rx_node, packet_id)
+        await self.send_raw(dest=rx_node, control=self.CONTROL_MSG, payload=payload, packet_id=packet_id, flags=flags)
         self.num_send += 1
-        self.last_sent_bytes = len(payload)
-
-    def recv_msg(self, tx_node) -> bytes:
-        # Receive 250 byte message from tx_node
-        self.logger.info(f"[TX {self.node}] Waiting for message from {self.last_node}")
-        header, body = self.recv_raw()
-
-        # Check for a valid ret
-        if header is None or body is None:
-            self.logger.warning(f"[RX {self.node}] Message timeout")
+        self.burst.append(packet_id)
+
+    def needs_rts(self, rx_node, frames) -> bool:
+        # Whether the next of the (packet_id, payload) frames due for rx_node
+        # is long enough to be worth reserving the channel for
+        return self.rts_threshold.use_rts(rx_node, self.CONTROL_LEN + len(frames[0][1]))
+
+    async def send_direct(self, rx_node, frame) -> None:
+        # Send one (packet_id, payload) frame below the RTS threshold without
+        # a reservation, on the control frequency at the base rate. It is due
+        # again if its ACK is missed.
+        packet_id, payload = frame
+        self.burst = []
+        self.data_channel = self.NO_CHANNEL
+        self.timing.begin_exchange()
+        deadline = time.monotonic() + self.exchange_time(self.CONTROL_LEN + len(payload), self.ACK_LEN)
+        await self.send_msg(rx_node, payload, packet_id=packet_id)
+        self.arq.sender(rx_node).sent(packet_id, deadline)
+
+    async def send_burst(self, rx_node, frames) -> None:
+        # Stream the (packet_id, payload) frames of a granted TXOP back to back.
+        # Frames the ACK does not cover are due again once it is missed.
+        self.burst = []
+        sender = self.arq.sender(rx_node)
+        deadline = time.monotonic() + self.burst_time(len(frames)) + self.exchange_time(self.BLOCK_ACK_LEN)
+        self.set_channel(self.data_channel)
+        self.set_rate(self.data_rate)
+        for i, (packet_id, payload) in enumerate(frames):
+            await self.send_msg(rx_node, payload, packet_id=packet_id, more=i < len(frames) - 1)
+            sender.sent(packet_id, deadline)
+        self.set_rate(self.BASE_RATE)
+
+    @timed("recv_msg")
+    async def recv_msg(self, tx_node) -> bytes:
+        # Receive the next 250 byte message of tx_node's burst, ignoring
+        # anything else heard before it is due
+        if self.LOG_INFO:
+            self.logger.info(f"[RX {self.node}] Waiting for message from {tx_node}")
+        deadline = time.monotonic() + self.response_timeout(self.MSG_LEN)
+        while True:
+            control = await self.recv_raw(max(0, deadline - time.monotonic()))
+
+            # Check for a valid ret
+            if control is None:
+                self.logger.warning(f"[RX {self.node}] Message timeout")
+                self.trace_event(trace.RECV_MSG, tx_node, result=RTS_CTS_Error.MSG_TIMEOUT)
+                return None
+
+            payload = self.on_msg(tx_node, control)
+            if payload is not None:
+                return payload
+
+    def on_msg(self, tx_node, control) -> bytearray:
+        # A frame heard while waiting for tx_node's next message: its
+        # payload if it is that message, else None to keep waiting
+        codec = self.codec
+
+        # Someone else's frame: note any reservation it makes, keep waiting
+        if control != self.CONTROL_MSG or codec.dest() != self.node or self.last_node != tx_node:
+            self.overhear(control)
             return None
 
-        # Separate control and payload
-        control, payload = body[:1], body[1:]
-
-        if len(payload) > self.MAX_PAYLOAD_LEN:
+        if codec.body_len() - self.CONTROL_LEN > self.MAX_PAYLOAD_LEN:
             self.logger.warning(f"[RX {self.node}] Received wrong payload (wrong len)")
             return None
 
-        # Check if the control byte for the message is correct
-        if control != self.CONTROL_MSG:
-            self.logger.warning(f"[RX {self.node}] Received wrong payload (wrong control byte)")
-            return None
-
-        # Check if the wrong node tried transmitting to us
-        if tx_node != self.last_node:
-            self.logger.error(f"[RX {self.node}] Node that was not cleared to send sent message")
-            return None
-
-        # Message passed all checks, return payload except control byte
-        self.num_recv += 1
-        return payload
-
-    def send_rts(self, request_node) -> None:
-        # Send an RTS packet: control byte only
-        self.logger.info(f"[TX {self.node}] Sending RTS to {request_node}")
-        self.send_raw(dest=request_node, control=self.CONTROL_RTS)
-
-    def wait_rts(self) -> RTS_CTS_Error:
-        self.logger.info(f"[RX {self.node}] Waiting for a valid RTS")
-
-        # Receive the return value from recv_raw
-        header, body = self.recv_raw()
-
-        # Check for RTS timeout
-        if header is None or body is None:
+        # Message passed all checks, return payload except control byte,
+        # copied out of the codec as the ARQ may hold it. It is only counted
+        # once the ARQ knows it is not a retransmission.
+        self.trace_event(trace.RECV_MSG, tx_node, self.last_packet_id, heard=True)
+        return codec.payload(self.CONTROL_LEN)
+
+    async def recv_burst(self, tx_node, frames) -> list:
+        # Receive up to `frames` back-to-back messages from tx_node. Returns
+        # the messages completed by the payloads the ARQ can now deliver in
+        # order, which may include frames held from earlier bursts.
+        receiver = self.arq.receiver(tx_node)
+        payloads = []
+        self.burst_received = 0
+        self.set_channel(self.data_channel)
+        self.set_rate(self.data_rate)
+        for _ in range(frames):
+            payload = await self.recv_msg(tx_node)
+            if payload is None:
+                break
+            self.burst_received += 1
+            payloads += receiver.receive(self.last_packet_id, payload, self.last_flags & self.FLAG_SYN)
+            if not self.last_flags & self.FLAG_MORE:
+                break
+        return self.burst_done(tx_node, payloads)
+
+    def burst_done(self, tx_node, payloads) -> list:
+        self.set_rate(self.BASE_RATE)
+
+        # Nothing to ACK: straight back to the control frequency
+        if not self.burst_received:
+            self.set_channel(self.NO_CHANNEL)
+        return self.received(tx_node, payloads)
+
+    def received(self, tx_node, payloads) -> list:
+        # Count the payloads from tx_node the ARQ delivered, and return the
+        # messages they complete; with routing only those meant for us
+        self.num_recv += len(payloads)
+        if self.router:
+            return self.deliver(self.route_in(tx_node, payloads))
+        return self.deliver([(tx_node, payload) for payload in payloads])
+
+    async def recv_direct(self, tx_node) -> list:
+        # ACK the message tx_node sent without an RTS. Returns the messages
+        # completed by the payloads the ARQ can now deliver in order.
+        payloads = self.arq.receiver(tx_node).receive(self.last_packet_id, self.direct_payload, self.last_flags & self.FLAG_SYN)
+        self.granted = 1
+        await self.send_ack(tx_node)
+        return self.received(tx_node, payloads)
+
+    @timed("send_rts")
+    async def send_rts(self, request_node, frames=1) -> None:
+        # Send a broadcast RTS, naming the node we want to talk to, how many
+        # frames we have queued for it, the rate we would like to send them at
+        # and how long the rest of the exchange (CTS, MSG burst, ACK) will
+        # hold the channel
+        self.build_rts(request_node, frames)
+        await self.send_frame(self.BROADCAST_ADDRESS)
+
+    def build_rts(self, request_node, frames) -> None:
+        self.data_rate = self.link.rate(request_node) if self.ADAPTIVE_RATE else self.BASE_RATE
+        if self.LOG_INFO:
+            self.logger.info(f"[TX {self.node}] Sending RTS to {request_node} for {frames} frames at SF{self.data_rate[0]}/CR{self.data_rate[1]}")
+        frames = min(frames, self.txop_limit(request_node))
+        self.trace_event(trace.SEND_RTS, request_node, frames)
+        self.timing.begin_exchange()
+        duration = self.exchange_time(self.CTS_LEN) + self.burst_time(frames) + self.exchange_time(self.BLOCK_ACK_LEN)
+        preferred = self.free_channel()
+        (self.codec.begin(self.CONTROL_RTS).put_u8(request_node)
+         .put_uint(self.encode_duration(duration), self.DURATION_LEN)
+         .put_u8(frames).put_u8(self.encode_rate(self.data_rate))
+         .put_u8(self.NO_CHANNEL if preferred is None else preferred))
+
+    @timed("wait_rts")
+    async def wait_rts(self, timeout=None) -> RTS_CTS_Error:
+        # Listen until timeout for an RTS (or a message below the RTS
+        # threshold) addressed to us. Reservations overheard meanwhile update
+        # the NAV and data channel state; other frames are ignored.
+        if self.LOG_INFO:
+            self.logger.info(f"[RX {self.node}] Waiting for a valid RTS")
+        deadline = time.monotonic() + (self.listen_timeout() if timeout is None else timeout)
+        while True:
+            control = await self.recv_raw(max(0, deadline - time.monotonic()))
+            result = self.on_rts(control)
+            if result is not None:
+                return self.traced(trace.WAIT_RTS, None, result,
+                                   self.requested if result == RTS_CTS_Error.SUCCESS else 1)
+
+    def on_rts(self, control) -> RTS_CTS_Error:
+        # What a frame heard while waiting for an RTS (its control byte, None
+        # if the wait timed out) means, or None to keep waiting
+        if control is None:
             self.logger.warning(f"[RX {self.node}] RTS Timeout")
             return RTS_CTS_Error.RTS_TIMEOUT
 
-        # Check for RTS format
-        elif len(body) != 1:
-            self.logger.warning(f"[RX {self.node}] Wrong RTS format (wrong len)")
-            return RTS_CTS_Error.RTS_WRONG
-        
-        control, payload = body[:1], body[1:]
-
-        # Check for RTS control byte
-        if control == self.CONTROL_RTS:
-            self.logger.info(f"[RX {self.node}] Got a valid RTS from {self.last_node}")
+        # A message short enough for its sender to skip the handshake
+        codec = self.codec
+        if control == self.CONTROL_MSG and codec.dest() == self.node:
+            if self.LOG_INFO:
+                self.logger.info(f"[RX {self.node}] Got message {self.last_packet_id} from {self.last_node} without an RTS")
+            self.direct_payload = codec.payload(self.CONTROL_LEN)
+            self.trace_event(trace.RECV_MSG, self.last_node, self.last_packet_id, heard=True)
+            return RTS_CTS_Error.DIRECT_MSG
+
+        # Check for RTS control byte, format and that the RTS is meant for us
+        if control == self.CONTROL_RTS and codec.body_len() == self.RTS_LEN and codec.get_u8(1) == self.node:
+            if self.LOG_INFO:
+                self.logger.info(f"[RX {self.node}] Got a valid RTS from {self.last_node}")
+            self.requested = codec.get_u8(self.RTS_LEN - 3)
+            self.data_rate = self.decode_rate(codec.get_u8(self.RTS_LEN - 2))
+
+            # Take the sender's data channel if we also see it free
+            self.data_channel = self.free_channel(codec.get_u8(self.RTS_LEN - 1))
+            if self.data_channel is None:
+                self.logger.warning(f"[RX {self.node}] No free data channel, not answering")
+                return RTS_CTS_Error.CHANNEL_BUSY
             return RTS_CTS_Error.SUCCESS
 
-        else:
-            self.logger.warning(f"[RX {self.node}] Not an RTS")
-            return RTS_CTS_Error.RTS_WRONG
-
-    def send_cts(self, approved_node: bytes):
-        # Send a broadcast CTS, specifying which node is clear to send
-        self.logger.info(f"[RX {self.node}] Sending CTS to {approved_node}")
-        self.send_raw(dest=self.BROADCAST_ADDRESS, control=self.CONTROL_CTS+approved_node.to_bytes(1))
-
-    def wait_cts(self, request_node) -> RTS_CTS_Error:
-        # Receive a valid CTS from the node we sent an RTS to
-        self.logger.info(f"[TX {self.node}] Waiting for valid CTS from {request_node}")
-        header, body = self.recv_raw()
-
-        # Check for CTS timeout
-        if header is None or body is None:
+        # RTS or CTS for another exchange: the channel is reserved, but an
+        # RTS for us may still come before the deadline
+        if not self.overhear(control):
+            if self.LOG_INFO:
+                self.logger.info(f"[RX {self.node}] Ignoring a frame from {self.last_node}, not an RTS for us")
+        return None
+
+    @timed("send_cts")
+    async def send_cts(self, approved_node, frames=1) -> None:
+        # Send a broadcast CTS, specifying which node is clear to send, how
+        # many frames it may burst at the rate its RTS asked for, on which
+        # data channel, and how long the MSG burst and ACK that follow will
+        # hold it
+        self.build_cts(approved_node, frames)
+        await self.send_frame(self.BROADCAST_ADDRESS)
+
+    def build_cts(self, approved_node, frames) -> None:
+        self.granted = max(1, min(frames, self.FRAGMENT_TXOP))
+        self.trace_event(trace.SEND_CTS, approved_node, self.granted)
+        if self.LOG_INFO:
+            self.logger.info(f"[RX {self.node}] Sending CTS to {approved_node} for {self.granted} frames")
+        duration = self.burst_time(self.granted) + self.exchange_time(self.BLOCK_ACK_LEN)
+        (self.codec.begin(self.CONTROL_CTS).put_u8(approved_node)
+         .put_uint(self.encode_duration(duration), self.DURATION_LEN)
+         .put_u8(self.granted).put_u8(self.encode_rate(self.data_rate)).put_u8(self.data_channel))
+
+    @timed("wait_cts")
+    async def wait_cts(self, request_node) -> RTS_CTS_Error:
+        # Receive a valid CTS from the node we sent an RTS to, until it is no
+        # longer due. Other frames are ignored; reservations among them are
+        # honoured and, if no CTS comes, reported as CTS_NOT_DEST so the
+        # caller defers instead of counting a failure.
+        if self.LOG_INFO:
+            self.logger.info(f"[TX {self.node}] Waiting for valid CTS from {request_node}")
+        deadline = time.monotonic() + self.response_timeout(self.CTS_LEN)
+        self.reserved = False
+        while True:
+            control = await self.recv_raw(max(0, deadline - time.monotonic()))
+            result = self.on_cts(request_node, control)
+            if result is not None:
+                return self.traced(trace.WAIT_CTS, request_node, result, self.granted)
+
+    def on_cts(self, request_node, control) -> RTS_CTS_Error:
+        # What a frame heard while waiting for request_node's CTS (its
+        # control byte, None if the wait timed out) means, or None to keep
+        # waiting
+        if control is None:
+            if self.reserved:
+                self.logger.warning(f"[TX {self.node}] No CTS, channel reserved by another exchange")
+                return RTS_CTS_Error.CTS_NOT_DEST
             self.logger.warning(f"[TX {self.node}] CTS timeout")
             return RTS_CTS_Error.CTS_TIMEOUT
 
-        elif len(body) != 2:
-            self.logger.warning(f"[TX {self.node}] Wrong CTS format (wrong len)")
-            return RTS_CTS_Error.CTS_WRONG
-
-        control, payload = body[:2], body[2:]
-
-        # In ret, control1 is control byte, control2 is node that is clear to send
-        control1 = control[0].to_bytes(1)
-
-        # No bytes conversion, ret is an int list
-        control2 = control[1]
-
-        # Check for CTS control byte and specified node in CTS
-        if control1 == self.CONTROL_CTS and control2 == self.node:
-            # Check if the node that send the CTS is request_node
-            if self.last_node == request_node:
-                # Got a valid CTS
-                self.logger.info(f"[TX {self.node}] Got a valid CTS from {request_node}")
-                return RTS_CTS_Error.SUCCESS
-
-            else:
-                # Weird error, a node we never tried talking to cleared us to send
-                self.logger.error(f"[TX {self.node}] CTS not received from {request_node}")
-                raise Exception("CTS from a node we never sent RTS to")
+        # Check for CTS control byte, format and specified node in CTS
+        codec = self.codec
+        if control == self.CONTROL_CTS and codec.body_len() == self.CTS_LEN and codec.get_u8(1) == self.node:
+            if self.last_node != request_node:
+                # A CTS answering someone else's RTS naming us, or a stale
+                # one: not our reservation
+                self.logger.warning(f"[TX {self.node}] Ignoring a CTS from {self.last_node}, expected {request_node}")
+                return None
+
+            # Got a valid CTS, and with it a TXOP of `granted` frames
+            self.granted = max(1, codec.get_u8(self.CTS_LEN - 3))
+            self.data_rate = self.decode_rate(codec.get_u8(self.CTS_LEN - 2))
+            self.data_channel = codec.get_u8(self.CTS_LEN - 1)
+            if self.LOG_INFO:
+                self.logger.info(f"[TX {self.node}] Got a valid CTS from {request_node} for {self.granted} frames")
+            return RTS_CTS_Error.SUCCESS
 
+        # RTS or CTS for another exchange: honour its reservation
+        if self.overhear(control):
+            if self.LOG_INFO:
+                self.logger.info(f"[TX {self.node}] Reservation by another exchange while waiting for CTS")
+            self.reserved = True
+        return None
+
+    @timed("send_ack")
+    async def send_ack(self, tx_node) -> None:
+        # Send an ACK in response to a single message, or a block ACK with the
+        # ARQ receiver's selective ACK when the CTS granted a burst
+        self.build_ack(tx_node)
+        await self.send_frame(tx_node)
+        self.set_channel(self.NO_CHANNEL)
+
+    def build_ack(self, tx_node) -> None:
+        self.trace_event(trace.SEND_ACK, tx_node, self.burst_received if self.granted > 1 else 1)
+        if self.granted > 1:
+            if self.LOG_INFO:
+                self.logger.info(f"[RX {self.node}] Sending block ACK to {tx_node}")
+            self.arq.receiver(tx_node).sack_into(self.codec.begin(self.CONTROL_BLOCK_ACK))
         else:
-            # Check if the message even is a CTS message
-            if control1 != self.CONTROL_CTS:
-                self.logger.warning(f"[TX {self.node}] Not a CTS message")
-                return RTS_CTS_Error.CTS_WRONG
-
-            # Check if the CTS was meant for us
-            if control2 != self.node:
-                self.logger.warning(f"[TX {self.node}] CTS meant for a different node")
-                return RTS_CTS_Error.CTS_NOT_DEST
-
-    def send_ack(self, tx_node) -> None:
-        # Send an ACK in response to a message
-        self.logger.info(f"[RX {self.node}] Sending ACK to {tx_node}")
-        self.send_raw(dest=tx_node, control=self.CONTROL_ACK)
-
-    def wait_ack(self) -> RTS_CTS_Error:
-        # After transmitting a message, wait for an ACK
-        self.logger.info(f"[TX {self.node}] Waiting for valid ACK from {self.last_node}")
-        header, body = self.recv_raw()
-
-        # Check for ACK timeout
-        if header is None or body is None:
-            self.logger.warning(f"TX [{self.node}] ACK timeout")
+            if self.LOG_INFO:
+                self.logger.info(f"[RX {self.node}] Sending ACK to {tx_node}")
+            self.codec.begin(self.CONTROL_ACK)
+
+    @timed("wait_ack")
+    async def wait_ack(self, rx_node) -> RTS_CTS_Error:
+        # After transmitting a message or burst to rx_node, wait for its ACK
+        # or block ACK until it is no longer due, ignoring anything else
+        if self.LOG_INFO:
+            self.logger.info(f"[TX {self.node}] Waiting for valid ACK from {rx_node}")
+        self.acked = []
+        deadline = time.monotonic() + self.ack_timeout()
+        while True:
+            control = await self.recv_raw(max(0, deadline - time.monotonic()))
+            result = self.on_ack(rx_node, control)
+            if result is not None:
+                return self.traced(trace.WAIT_ACK, rx_node, result, len(self.acked))
+
+    def ack_timeout(self) -> float:
+        return self.response_timeout(self.BLOCK_ACK_LEN if len(self.burst) > 1 else self.ACK_LEN)
+
+    def on_ack(self, rx_node, control) -> RTS_CTS_Error:
+        # What a frame heard while waiting for rx_node's ACK (its control
+        # byte, None if the wait timed out) means, or None to keep waiting
+        if control is None:
+            # The burst went unanswered, which may mean its rate was too fast
+            self.set_channel(self.NO_CHANNEL)
+            self.logger.warning(f"[TX {self.node}] ACK timeout")
+            self.link.miss(rx_node)
             return RTS_CTS_Error.ACK_TIMEOUT
 
-        # Check for ACK format
-        elif len(body) != 1:
-            self.logger.warning(f"[{self.node}] Wrong ACK format (wrong len)")
-            return RTS_CTS_Error.ACK_WRONG
-        
-        control, payload = body[:1], body[1:]
+        # Someone else's frame: note any reservation it makes, keep waiting
+        codec = self.codec
+        if codec.dest() != self.node or self.last_node != rx_node:
+            self.overhear(control)
+            return None
 
-        # Check control byte for message
-        if control == self.CONTROL_ACK:
-            self.logger.info(f"[{self.node}] Got an ACK from {self.last_node}")
-            self.sent_bytes += self.last_sent_bytes
-            self.num_ack += 1
-            return RTS_CTS_Error.SUCCESS
+        # Check control byte and format of the ACK
+        sender = self.arq.sender(rx_node)
+        if control == self.CONTROL_ACK and codec.body_len() == self.ACK_LEN and len(self.burst) == 1:
+            self.acked = sender.ack(self.burst)
+
+        elif control == self.CONTROL_BLOCK_ACK and codec.body_len() == self.BLOCK_ACK_LEN:
+            # Frames before the start are in, after it only those in the bitmap
+            start = codec.get_u8(self.CONTROL_LEN)
+            self.acked = sender.sack(start, codec.get_uint(self.CONTROL_LEN + 1, blockack.BITMAP_LEN))
 
         else:
-            self.logger.warning(f"[{self.node}] Not an ACK")
-            return RTS_CTS_Error.ACK_WRONG
+            self.logger.warning(f"[TX {self.node}] Not an ACK")
+            return None
+
+        self.set_channel(self.NO_CHANNEL)
+        if self.LOG_INFO:
+            self.logger.info(f"[TX {self.node}] Got an ACK from {rx_node} for {len(self.acked)} frames")
+        self.num_ack += len(self.acked)
+        self.timing.end_exchange()
+        return RTS_CTS_Error.SUCCESS
+
+    def attach(self, rt) -> None:
+        # Drive the node with an aio.Runtime instead of the blocking one
+        self.rt = rt
+
+    def deliver(self, payloads) -> list:
+        # Reassemble the (origin, payload) pairs into messages and count the
+        # ones handed up to code.py towards goodput
+        messages = []
+        for origin, payload in payloads:
+            message = self.reassembly.receive(origin, payload)
+            if message is not None:
+                messages.append(message)
+        self.app_bytes += sum(len(message) for message in messages)
+        return messages
 
     def get_stats(self):
         time_elapsed = time.monotonic() - self.node_start_time
-        throughput = self.sent_bytes * 8 / time_elapsed # in bps
+        rx_goodput = self.app_bytes * 8 / time_elapsed # in bps
+        tx_link = self.air_bytes * 8 / time_elapsed
         success_rate = f"{self.num_ack / self.num_send * 100:.2f}%" if self.num_send else "NA"
-        return f"----- send:{self.num_send}/ack:{self.num_ack}/recv:{self.num_recv}/success:{success_rate}/throughput:{throughput:.2f}bps -----"
+        retries = " ".join(str(n) for n in self.cw.histogram)
+        stats = f"----- send:{self.num_send}/ack:{self.num_ack}/recv:{self.num_recv}/dup:{self.arq.num_dup()}/resync:{self.arq.num_resync()}/success:{success_rate}/rx_goodput:{rx_goodput:.2f}bps/tx_link:{tx_link:.2f}bps"
+        stats += f"/cw:{self.cw.current()}/retries:[{retries}]/drop:{self.cw.num_dropped}"
+        if self.csma:
+            stats += f"/cs_busy:{self.csma.num_busy}/cs_defer:{self.csma.num_deferred}/cs_giveup:{self.csma.num_gave_up}"
+        if self.ADAPTIVE_RATE:
+            stats += f"/rates:[{self.link.summary()}]"
+        stats += f"/direct:{self.rts_threshold.num_direct}"
+        if self.rts_threshold.ADAPTIVE:
+            stats += f"/rts_thr:[{self.rts_threshold.summary()}]"
+        stats += f"/neighbors:{len(self.neighbors.alive())}"
+        if self.router:
+            stats += f"/{self.router.summary()}"
+        if self.traffic:
+            stats += f"/{self.traffic.summary()}"
+        if self.rt.summary():
+            stats += f"/{self.rt.summary()}"
+        if self.tracer:
+            stats += f"/{self.tracer.summary()}"
+        if self.LATENCY_STATS:
+            stats += f"/{self.timing.summary()}"
+        if self.fragmenter.num_fragmented or self.reassembly.num_reassembled:
+            stats += f"/frag:{self.fragmenter.num_fragmented}/{self.reassembly.summary()}"
+        return stats + " -----"
@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: 2023 Kattni Rembor for Adafruit Industries
+# SPDX-License-Identifier: MIT
+
+"""
+18750 Project 2
+################
+TDMA Network
+"""
+
+import board
+import random
+import neopixel
+
+from tdma_node import TDMA_Node
+from lorasphere import telemetry
+from proj_config import COMPACT_TELEMETRY, DUMP_RECORDS
+
+# Initialize TDMA node
+node = TDMA_Node()
+
+### NEOPIXEL ###
+pixel = neopixel.NeoPixel(board.NEOPIXEL, 1)
+pixel.brightness = 0.5
+color_index = 0
+
+color_map = {
+    (255, 0, 0):    "red",
+    (0, 255, 0):    "green",
+    (0, 0, 255):    "blue",
+    (255, 255, 0):  "yellow",
+    (0, 255, 255):  "cyan",
+    (255, 0, 255):  "purple",
+}
+colors = list(color_map.items())  # Built once, not per message
+
+# Numbers our telemetry records and keeps the recent ones for sensor dumps
+recorder = telemetry.Recorder(COMPACT_TELEMETRY, DUMP_RECORDS, max_message=node.fragmenter.MAX_MESSAGE)
+
+def make_payload():
+    # A telemetry record with a random colour, only as long as it needs to
+    # be, or now and then a dump of the recent ones
+    color, color_name = random.choice(colors)
+    return recorder.next(color)
+
+def main():
+    while True:
+        # Steady telemetry: a slot's worth of readings per superframe, for a
+        # random member of the last beacon's schedule. The coordinator drops
+        # members that stop refreshing their slot, so this is our neighbour list.
+        neighbors = [owner for owner in node.owners if owner != node.node]
+        if neighbors:
+            rx_node = random.choice(neighbors)
+            for _ in range(node.SLOT_FRAMES):
+                node.queue_msg(rx_node, make_payload())
+
+        # Send in our own slot and receive in everyone else's
+        for payload in node.run_superframe():
+            record = telemetry.decode(payload)
+            print(record)
+            if record is None:
+                continue
+            pixel.fill(record[2])
+
+        print(node.get_stats())
+        
+if __name__ == '__main__':
+    main()
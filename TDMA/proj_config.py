@@ -0,0 +1,14 @@
+# ENSURE ID IS UPDATED TO MATCH BOARD NAME
+NODE_ID = None # TODO change this value once
+
+# Node that sends the superframe beacon and assigns the slots
+COORDINATOR = 0x00
+
+# Telemetry records go out as short text ("seq,uptime_ms,r,g,b"); True packs
+# them into 10 bytes instead
+COMPACT_TELEMETRY = False
+
+# Every 10th message is a sensor dump of the last DUMP_RECORDS records (10
+# bytes each), fragmented over as many frames as it needs; 0 never dumps.
+# Dumps are capped at 409 records, the most a 4096 byte message holds.
+DUMP_RECORDS = 0
@@ -0,0 +1,325 @@
+import time
+import random
+import board
+import digitalio
+from adafruit_rfm9x import RFM9x
+import adafruit_logging as logging
+from lorasphere.airtime import frame_airtime
+from lorasphere.arq import Arq, SYN_LEN
+from lorasphere import blockack
+from lorasphere.fragment import Fragmenter, Reassembler
+from proj_config import NODE_ID, COORDINATOR
+
+class TDMA_Node(RFM9x):
+    def __init__(self):
+        self.logger = logging.getLogger('TDMA')
+        self.logger.setLevel(logging.DEBUG)
+
+        # Define Chip Select and Reset pins for the radio module.
+        cs = digitalio.DigitalInOut(board.RFM_CS)
+        reset = digitalio.DigitalInOut(board.RFM_RST)
+        radio_freq_mhz = 915.0
+
+        # Initialise RFM95 radio
+        RFM9x.__init__(self, board.SPI(), cs, reset, radio_freq_mhz)
+
+        # Set node
+        if NODE_ID is None:
+            self.logger.error("Please set NODE_ID in proj_config.py")
+            time.sleep(0xFFFFFFFF)
+
+        # self.node is internal to the driver, but also used for our logs
+        self.node = NODE_ID
+        self.BROADCAST_ADDRESS = 255
+
+        # Set LoRa parameters
+        self.signal_bandwidth = 125000
+        self.spreading_factor = 7
+        self.coding_rate = 8
+        self.ack_retries = 0
+
+        # Packet length definitions
+        self.HEADER_LEN = 4       # RadioHead header in front of every payload
+        self.MAX_PAYLOAD_LEN = 250
+        self.SACK_LEN = blockack.BLOCK_ACK_LEN
+        self.JOIN_LEN = 1           # The driver cannot send an empty payload
+        self.SUPERFRAME_LEN = 2     # Beacon: superframe number, then one owner per slot
+
+        # Header flags: more frames of this flight follow, selective ACK,
+        # superframe beacon, slot request / membership refresh and ARQ resync
+        # (see lorasphere.arq)
+        self.FLAG_MORE = 0x01
+        self.FLAG_SACK = 0x02
+        self.FLAG_BEACON = 0x04
+        self.FLAG_JOIN = 0x08
+        self.FLAG_SYN = 0x20
+
+        # Peer turnaround plus timing slack, in seconds
+        self.RX_GUARD = 0.05
+
+        # Superframe: the beacon slot, a contended join slot, then one slot
+        # per member in the order the beacon lists them. A slot fits the
+        # owner's membership refresh, a flight of SLOT_FRAMES max-size frames
+        # and its selective ACK.
+        self.COORDINATOR = COORDINATOR
+        self.SLOT_FRAMES = 4
+        self.BEACON_SLOT = 0
+        self.JOIN_SLOT = 1
+        self.FIRST_OWNED_SLOT = 2
+        self.MEMBER_TIMEOUT = 3      # Superframes without a refresh before a slot is freed
+        self.BEACON_WAIT_SLOTS = 16  # How long to listen for a beacon before giving up
+
+        # Schedule from the last beacon: its number, when it started on our
+        # clock and the owner of each slot after the join slot
+        self.superframe = 0
+        self.superframe_start = None
+        self.owners = []
+
+        # Coordinator only: superframe each member was last heard in
+        self.members = {}
+
+        # Selective-repeat ARQ: a slot carries one flight from the window,
+        # and the queue has room for every fragment of a long message
+        self.arq = Arq(window=self.SLOT_FRAMES, retry_limit=6, queue_limit=32)
+        self.num_flights = 0
+
+        # Messages longer than a frame go out as fragments, reassembled per
+        # sender on the far end. Each leaves room for the SYN header the ARQ
+        # may put in front of it.
+        self.fragmenter = Fragmenter(self.MAX_PAYLOAD_LEN - SYN_LEN)
+        self.reassembly = Reassembler()
+
+        # Counter variables
+        self.num_send = 0
+        self.num_recv = 0
+        self.num_ack  = 0
+        self.num_beacons = 0
+        self.node_start_time = time.monotonic()
+
+        # Receive side: application bytes delivered to us. Transmit side:
+        # every byte we put on air (RadioHead headers, control frames and
+        # ACKs included). They count different traffic, so a receiver's
+        # goodput can exceed its own link throughput.
+        self.app_bytes = 0
+        self.air_bytes = 0
+
+    def airtime(self, payload_len) -> float:
+        # Time on air of a frame carrying payload_len bytes after the RadioHead header
+        return frame_airtime(self, payload_len)
+
+    def response_timeout(self, payload_len) -> float:
+        # How long to wait for a reply the peer sends as soon as our frame ends
+        return self.RX_GUARD + self.airtime(payload_len)
+
+    def slot_time(self) -> float:
+        # Guard, membership refresh, a full flight and its selective ACK
+        return (self.RX_GUARD + self.response_timeout(self.JOIN_LEN)
+                + self.SLOT_FRAMES * self.response_timeout(self.MAX_PAYLOAD_LEN)
+                + self.response_timeout(self.SACK_LEN))
+
+    def num_slots(self) -> int:
+        return self.FIRST_OWNED_SLOT + len(self.owners)
+
+    def slot_start(self, slot) -> float:
+        # Local time slot `slot` of the current superframe begins
+        return self.superframe_start + slot * self.slot_time()
+
+    def own_slot(self):
+        # Our slot in the current superframe, or None without one
+        if self.node not in self.owners:
+            return None
+        return self.FIRST_OWNED_SLOT + self.owners.index(self.node)
+
+    def sleep_until(self, t) -> None:
+        time.sleep(max(0, t - time.monotonic()))
+
+    def queue_msg(self, rx_node, message) -> bool:
+        # Queue message for rx_node, in fragments if it does not fit in a
+        # frame; they go out in our next slots
+        queued = True
+        for payload in self.fragmenter.split(message):
+            if not self.arq.sender(rx_node).push(payload):
+                self.logger.warning(f"[TX {self.node}] Queue to {rx_node} full, dropping packet")
+                queued = False
+        return queued
+
+    def send_beacon(self) -> None:
+        # Coordinator: free the slots of members we stopped hearing from and
+        # announce the schedule of the superframe starting now
+        self.superframe = (self.superframe + 1) & 0xFFFF
+        for member, heard in list(self.members.items()):
+            if (self.superframe - heard) & 0xFFFF > self.MEMBER_TIMEOUT:
+                self.logger.info(f"[TX {self.node}] Node {member} left, freeing its slot")
+                del self.members[member]
+        self.owners = [self.node] + sorted(self.members)
+
+        self.logger.info(f"[TX {self.node}] Sending beacon for superframe {self.superframe} with slots {self.owners}")
+        self.superframe_start = time.monotonic()
+        payload = self.superframe.to_bytes(self.SUPERFRAME_LEN, 'big') + bytes(self.owners)
+        self.send(payload, destination=self.BROADCAST_ADDRESS, flags=self.FLAG_BEACON)
+        self.num_beacons += 1
+
+    def wait_beacon(self) -> bool:
+        # Listen for the coordinator's beacon and take its schedule. The
+        # superframe started one beacon airtime before we received it.
+        deadline = time.monotonic() + self.BEACON_WAIT_SLOTS * self.slot_time()
+        while time.monotonic() < deadline:
+            packet = self.receive(timeout=deadline - time.monotonic(), with_header=True)
+            if packet is None or not packet[3] & self.FLAG_BEACON or packet[1] != self.COORDINATOR:
+                continue
+
+            payload = packet[4:]
+            self.superframe_start = time.monotonic() - self.airtime(len(payload))
+            self.superframe = int.from_bytes(payload[:self.SUPERFRAME_LEN], 'big')
+            self.owners = list(payload[self.SUPERFRAME_LEN:])
+            self.num_beacons += 1
+            return True
+        return False
+
+    def member_heard(self, node) -> None:
+        # Coordinator: a JOIN asks for a slot or keeps the one node has
+        if self.node != self.COORDINATOR:
+            return
+        if node not in self.members:
+            self.logger.info(f"[RX {self.node}] Node {node} joined, assigning a slot from the next beacon")
+        self.members[node] = self.superframe
+
+    def join_offsets(self) -> int:
+        # Non-overlapping JOIN start times in the join slot, leaving room for
+        # the coordinator to stop listening before the slot ends
+        return max(1, int(self.slot_time() / self.response_timeout(self.JOIN_LEN)) - 2)
+
+    def send_join(self) -> None:
+        self.send(b'\x00', destination=self.COORDINATOR, flags=self.FLAG_JOIN)
+
+    def send_slot(self, slot) -> None:
+        # Our slot: refresh our membership, then send one flight to the next
+        # destination (round robin) that has frames due
+        self.sleep_until(self.slot_start(slot) + self.RX_GUARD)
+        if self.node != self.COORDINATOR:
+            self.send_join()
+
+        peers = self.arq.pending()
+        frames = []
+        for i in range(len(peers)):
+            rx_node = peers[(self.num_flights + i) % len(peers)]
+            frames = self.arq.sender(rx_node).due(self.SLOT_FRAMES)
+            if frames:
+                break
+        if not frames:
+            return
+        self.num_flights += 1
+
+        self.logger.info(f"[TX {self.node}] Sending {len(frames)} packets in slot {slot} to dst={rx_node}")
+        sender = self.arq.sender(rx_node)
+        slot_end = self.slot_start(slot + 1)
+        for i, (packet_id, payload) in enumerate(frames):
+            flags = self.FLAG_MORE if i < len(frames) - 1 else 0
+            if sender.syn:
+                flags |= self.FLAG_SYN
+                payload = sender.syn_header() + payload
+            self.send(payload, destination=rx_node, identifier=packet_id, flags=flags)
+            sender.sent(packet_id, slot_end)
+            self.num_send += 1
+
+        # The selective ACK comes back before the slot ends
+        packet = self.receive(timeout=max(0, slot_end - time.monotonic()), with_header=True)
+        if packet is None or packet[1] != rx_node or not packet[3] & self.FLAG_SACK:
+            self.logger.info(f"[TX {self.node}] Failed to receive ACK")
+            return
+
+        acked = sender.sack(*blockack.decode(packet[4:]))
+        self.logger.info(f"[TX {self.node}] Received ACK for {len(acked)} packets")
+        self.num_ack += len(acked)
+
+    def recv_slot(self, slot) -> list:
+        # Someone else's slot, or the join slot: note JOINs, take in the
+        # owner's flight and answer it with a selective ACK in time for the
+        # slot to end. Returns the messages the payloads now deliverable in
+        # order complete.
+        sack_by = self.slot_start(slot + 1) - self.response_timeout(self.SACK_LEN)
+        self.sleep_until(self.slot_start(slot))
+
+        tx_node = None
+        payloads = []
+        while time.monotonic() < sack_by:
+            packet = self.receive(timeout=sack_by - time.monotonic(), with_header=True)
+            if packet is None:
+                continue
+
+            (dest, node, packet_id, flag), payload = packet[:4], packet[4:]
+            if flag & self.FLAG_JOIN:
+                self.member_heard(node)
+            elif flag & (self.FLAG_SACK | self.FLAG_BEACON):
+                continue
+            elif dest not in (self.node, self.BROADCAST_ADDRESS):
+                # The owner's flight to another node: not ours to ACK
+                continue
+            elif len(payload) > self.MAX_PAYLOAD_LEN:
+                self.logger.info(f"[RX {self.node}] Payload corrupted {payload}")
+            else:
+                tx_node = node
+                payloads += [(node, payload) for payload in self.arq.receiver(node).receive(packet_id, payload, flag & self.FLAG_SYN)]
+
+                # The last frame of the flight clears FLAG_MORE
+                if not flag & self.FLAG_MORE:
+                    break
+
+        if tx_node is not None:
+            self.send(self.arq.receiver(tx_node).sack(), destination=tx_node, flags=self.FLAG_SACK)
+        self.num_recv += len(payloads)
+        return self.deliver(payloads)
+
+    def run_superframe(self) -> list:
+        # Run one superframe: beacon, join slot, then every owned slot in turn.
+        # Returns the messages delivered to us during it.
+        if self.node == self.COORDINATOR:
+            if self.superframe_start is not None:
+                self.sleep_until(self.slot_start(self.num_slots()))
+            self.send_beacon()
+        elif not self.wait_beacon():
+            self.logger.warning(f"[RX {self.node}] No beacon, not sending")
+            return []
+
+        # The coordinator hears slot requests; nodes without a slot ask for
+        # one at a random point of the join slot, so several can get through
+        if self.node == self.COORDINATOR:
+            self.recv_slot(self.JOIN_SLOT)
+        elif self.own_slot() is None:
+            self.sleep_until(self.slot_start(self.JOIN_SLOT) + random.randrange(self.join_offsets()) * self.response_timeout(self.JOIN_LEN))
+            self.send_join()
+
+        payloads = []
+        for i, owner in enumerate(self.owners):
+            slot = self.FIRST_OWNED_SLOT + i
+            if owner == self.node:
+                self.send_slot(slot)
+            else:
+                payloads += self.recv_slot(slot)
+        return payloads
+
+    def send(self, data, **kwargs) -> bool:
+        # Count every frame we put on air towards the link throughput
+        self.air_bytes += self.HEADER_LEN + len(data)
+        return RFM9x.send(self, data, **kwargs)
+
+    def deliver(self, payloads) -> list:
+        # Reassemble the (sender, payload) pairs into messages and count the
+        # ones handed up to code.py towards goodput
+        messages = []
+        for sender, payload in payloads:
+            message = self.reassembly.receive(sender, payload)
+            if message is not None:
+                messages.append(message)
+        self.app_bytes += sum(len(message) for message in messages)
+        return messages
+
+    def get_stats(self):
+        time_elapsed = time.monotonic() - self.node_start_time
+        rx_goodput = self.app_bytes * 8 / time_elapsed # in bps
+        tx_link = self.air_bytes * 8 / time_elapsed
+        success_rate = f"{self.num_ack / self.num_send * 100:.2f}%" if self.num_send else "NA"
+        slot = self.own_slot()
+        return (f"----- send:{self.num_send}/ack:{self.num_ack}/recv:{self.num_recv}/dup:{self.arq.num_dup()}/resync:{self.arq.num_resync()}/success:{success_rate}/rx_goodput:{rx_goodput:.2f}bps/tx_link:{tx_link:.2f}bps"
+                f"/slot:{slot if slot is not None else 'NA'}/members:{len(self.owners)}/beacons:{self.num_beacons}/crc:{self.crc_error_count}"
+                f"/frag:{self.fragmenter.num_fragmented}/{self.reassembly.summary()} -----")
@@ -0,0 +1,4 @@
+"""
+LoRaSPHERE shared modules, used by every node variant.
+Copy this directory into CIRCUITPY/lib together with the Adafruit libraries.
+"""
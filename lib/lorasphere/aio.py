@@ -0,0 +1,319 @@
+"""
+Asyncio runtime
+###############
+Runs a node as asyncio tasks instead of one loop of blocking radio calls.
+Only the runtime's pump touches the radio's receive and transmit path. It
+polls the SX127x IRQ flags that DIO0 mirrors (RxDone, TxDone): each frame
+received is handed to the task waiting for one, or buffered for the next
+receive(), and a transmission only holds up the task that sent it. Meanwhile
+the other tasks (traffic, the NeoPixel, stats) keep running.
+
+Tasks only ever wait through the runtime: sleep(), receive(), send(), carrier
+sense and Queue.get(). That way the pump knows when every task is idle, and then sleeps
+in short steps up to the earliest deadline rather than spinning through the
+event loop. asyncio's own timers are never used, which also keeps the runtime
+on the simulator's virtual clock.
+
+On the board, copy the `asyncio` and `adafruit_ticks` libraries from the
+CircuitPython bundle into CIRCUITPY/lib.
+"""
+
+import asyncio
+import time
+
+from lorasphere.airtime import frame_airtime, symbol_time
+
+# SX127x registers and bits the driver keeps private
+_REG_00_FIFO = 0x00
+_REG_01_OP_MODE = 0x01
+_REG_0D_FIFO_ADDR_PTR = 0x0D
+_REG_12_IRQ_FLAGS = 0x12
+_REG_1B_RSSI_VALUE = 0x1B
+_REG_22_PAYLOAD_LENGTH = 0x22
+_CAD_DONE = 0x04
+_CAD_DETECTED = 0x01
+_RSSI_OFFSET = 157  # High frequency port
+RX_MODE = 0b101
+CAD_MODE = 0b111
+
+# RadioHead header length and broadcast address
+_HEADER_LEN = 4
+_BROADCAST = 0xFF
+
+
+class _Waiter:
+    # A task parked in the runtime until `deadline` or until woken with a value
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.event = asyncio.Event()
+        self.value = None
+
+
+class Queue:
+    # Unbounded FIFO between tasks; get() waits through the runtime
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.items = []
+        self.getters = []
+
+    def put_nowait(self, item) -> None:
+        if self.getters:
+            self.runtime.wake(self.getters.pop(0), item)
+        else:
+            self.items.append(item)
+
+    async def get(self):
+        if self.items:
+            return self.items.pop(0)
+        waiter = self.runtime.park(None)
+        self.getters.append(waiter)
+        return await self.runtime.wait(waiter)
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+
+class Runtime:
+    def __init__(self, radio, rx_buffer=8, poll=0.002, turnaround=0.002, tx_margin=0.5):
+        self.radio = radio
+        self.RX_BUFFER = rx_buffer    # Frames kept for receive() while no task waits
+        self.POLL = poll              # Seconds between looks at the IRQ flags while idle
+        self.TURNAROUND = turnaround  # Least gap between a frame on air and our next one
+        self.TX_MARGIN = tx_margin    # Give up on a TxDone this long after the frame should have ended
+
+        # Tasks sleeping until a deadline, and those waiting for a frame
+        self.timers = []
+        self.receivers = []
+
+        # Frames nobody was waiting for, oldest first
+        self.rx_frames = []
+
+        # Frame being transmitted: [waiter, expected end, give-up time], and
+        # when the last frame we sent or heard ended
+        self.tx = None
+        self.last_frame = 0.0
+
+        # Whether a channel activity detection has the radio out of receive mode
+        self.cad = False
+
+        # RadioHead header of the frame being sent, filled in place
+        self.header = bytearray(_HEADER_LEN)
+
+        # Tasks running or runnable, as opposed to parked in the runtime
+        self.busy = 0
+        self.tasks = []
+        self.started = False
+        self.error = None
+
+        self.num_rx = 0
+        self.num_rx_dropped = 0
+
+    # ---- Tasks ----
+
+    def spawn(self, coro) -> None:
+        # Run coro as a task once run() starts (or right away if it has)
+        self.busy += 1
+        self.tasks.append(self._guard(coro))
+        if self.started:
+            asyncio.create_task(self.tasks.pop())
+
+    async def _guard(self, coro):
+        # Stop the whole node if a task fails, rather than leave it half running
+        try:
+            await coro
+        except BaseException as e:
+            if self.error is None:
+                self.error = e
+        self.busy -= 1
+
+    def run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self):
+        self.started = True
+        for task in self.tasks:
+            asyncio.create_task(task)
+        self.tasks = []
+        self.radio.listen()
+        await self._pump()
+
+    # ---- Waiting ----
+
+    def park(self, deadline) -> _Waiter:
+        # A waiter the calling task is about to wait on; from here until it
+        # is woken the task no longer counts as busy
+        waiter = _Waiter(deadline)
+        if deadline is not None:
+            self.timers.append(waiter)
+        return waiter
+
+    async def wait(self, waiter):
+        self.busy -= 1
+        await waiter.event.wait()
+        return waiter.value
+
+    def wake(self, waiter, value=None) -> None:
+        # Counted busy again right away, so the pump does not block before
+        # the woken task has had its turn
+        if waiter.event.is_set():
+            return
+        if waiter in self.timers:
+            self.timers.remove(waiter)
+        waiter.value = value
+        waiter.event.set()
+        self.busy += 1
+
+    async def sleep(self, seconds) -> None:
+        await self.wait(self.park(time.monotonic() + max(0, seconds)))
+
+    async def sleep_until(self, t) -> None:
+        await self.wait(self.park(t))
+
+    # ---- Radio ----
+
+    async def receive(self, timeout):
+        # The next frame heard, header included, or None after timeout
+        if self.rx_frames:
+            return self.rx_frames.pop(0)
+        waiter = self.park(time.monotonic() + max(0, timeout))
+        self.receivers.append(waiter)
+        return await self.wait(waiter)
+
+    def flush(self) -> None:
+        # Drop the frames buffered so far, e.g. after a retune
+        self.rx_frames = []
+
+    async def send(self, data, destination=_BROADCAST, node=None, identifier=0, flags=0) -> bool:
+        # Transmit a RadioHead frame and wait for TxDone. Frames heard before
+        # it cannot be the answer to it, so they are dropped.
+        #
+        # Nothing goes out within TURNAROUND of the last frame: a peer that
+        # was sending or acknowledging needs that long to get back to
+        # listening (or to its own channel), and would miss our preamble.
+        if time.monotonic() < self.last_frame + self.TURNAROUND:
+            await self.sleep_until(self.last_frame + self.TURNAROUND)
+        radio = self.radio
+        self.flush()
+        radio.idle()
+        radio._write_u8(_REG_0D_FIFO_ADDR_PTR, 0x00)
+        header = self.header
+        header[0] = destination
+        header[1] = radio.node if node is None else node
+        header[2] = identifier
+        header[3] = flags
+        radio._write_from(_REG_00_FIFO, header)
+        radio._write_from(_REG_00_FIFO, data)
+        radio._write_u8(_REG_22_PAYLOAD_LENGTH, _HEADER_LEN + len(data))
+        radio.transmit()
+
+        # The give-up time follows the time on air at the current settings:
+        # a fixed timeout would cut short a long frame at SF12
+        end = time.monotonic() + frame_airtime(radio, len(data))
+        waiter = self.park(None)
+        self.tx = [waiter, end, end + self.TX_MARGIN]
+        return await self.wait(waiter)
+
+    async def channel_activity(self) -> bool:
+        # One CAD, as csma.Csma senses the channel with: the chip listens for
+        # about two symbols and raises CadDone. Meanwhile the pump leaves the
+        # radio alone, and other tasks run.
+        radio = self.radio
+        self.cad = True
+        radio.idle()
+        radio._write_u8(_REG_12_IRQ_FLAGS, 0xFF)
+        radio.dio0_mapping = 0b10  # CadDone
+        radio.operation_mode = CAD_MODE
+
+        t_sym = symbol_time(radio.spreading_factor, radio.signal_bandwidth)
+        deadline = time.monotonic() + 8 * t_sym
+        await self.sleep(2 * t_sym)
+        while not radio._read_u8(_REG_12_IRQ_FLAGS) & _CAD_DONE and time.monotonic() < deadline:
+            await self.sleep(t_sym / 4)
+
+        flags = radio._read_u8(_REG_12_IRQ_FLAGS)
+        radio._write_u8(_REG_12_IRQ_FLAGS, 0xFF)
+        radio.listen()
+        self.cad = False
+
+        # No CadDone: assume the worst rather than talk over someone
+        return bool(flags & _CAD_DETECTED) or not flags & _CAD_DONE
+
+    async def rssi(self) -> float:
+        # Instantaneous RSSI in dBm. The radio is already in receive mode.
+        radio = self.radio
+        await self.sleep(symbol_time(radio.spreading_factor, radio.signal_bandwidth))
+        return radio._read_u8(_REG_1B_RSSI_VALUE) - _RSSI_OFFSET
+
+    def _tx_finished(self, ok) -> None:
+        radio = self.radio
+        radio._write_u8(_REG_12_IRQ_FLAGS, 0xFF)
+        radio.listen()
+        self.last_frame = time.monotonic()
+        waiter, self.tx = self.tx[0], None
+        self.wake(waiter, ok)
+
+    def _rx_frame(self, packet) -> None:
+        self.num_rx += 1
+        self.last_frame = time.monotonic()
+        if self.receivers:
+            self.wake(self.receivers.pop(0), packet)
+            return
+        if len(self.rx_frames) >= self.RX_BUFFER:
+            self.rx_frames.pop(0)
+            self.num_rx_dropped += 1
+        self.rx_frames.append(packet)
+
+    # ---- Pump ----
+
+    def _poll(self) -> None:
+        # One look at the IRQ flags and the clock: finish a transmission,
+        # collect a frame and wake every task whose deadline has passed
+        radio = self.radio
+        now = time.monotonic()
+        if self.tx is not None:
+            if radio.tx_done():
+                self._tx_finished(True)
+            elif now >= self.tx[2]:
+                radio.idle()
+                self._tx_finished(False)
+        elif not self.cad:
+            if radio.rx_done():
+                # The flag is up, so the driver reads the FIFO without waiting
+                packet = radio.receive(timeout=0, with_header=True)
+                if packet is not None:
+                    self._rx_frame(packet)
+            elif radio._read_u8(_REG_01_OP_MODE) & 0b111 != RX_MODE:
+                # Channel activity detection or a retune left the radio idle
+                radio.listen()
+
+        for waiter in [w for w in self.timers if w.deadline <= now]:
+            if waiter in self.receivers:
+                self.receivers.remove(waiter)
+            self.wake(waiter)
+
+    def _idle(self) -> None:
+        # Every task is parked: sleep until the next deadline or the end of
+        # our transmission, and while listening look at RxDone every POLL
+        # seconds. The radio stays in receive mode throughout; going through
+        # standby, as the driver's receive() does when it times out, would
+        # drop a frame halfway in.
+        now = time.monotonic()
+        until = min([w.deadline for w in self.timers] + [now + self.POLL])
+        if self.tx is not None and self.tx[1] > now:
+            until = min(until, self.tx[1])
+        time.sleep(max(0, until - now))
+
+    async def _pump(self):
+        while True:
+            if self.error is not None:
+                raise self.error
+            self._poll()
+            if self.busy:
+                await asyncio.sleep(0)
+            else:
+                self._idle()
+
+    def summary(self) -> str:
+        return f"aio_rx:{self.num_rx}/aio_rxdrop:{self.num_rx_dropped}"
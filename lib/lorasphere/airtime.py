@@ -0,0 +1,39 @@
+"""
+LoRa time-on-air (Semtech AN1200.13)
+"""
+
+import math
+
+# Bytes of RadioHead header in front of every payload
+RH_HEADER_LEN = 4
+
+
+def symbol_time(spreading_factor, bandwidth) -> float:
+    # Duration of one LoRa symbol in seconds
+    return (1 << spreading_factor) / bandwidth
+
+
+def time_on_air(length, spreading_factor=7, bandwidth=125000, coding_rate=5,
+                preamble_length=8, crc=True, explicit_header=True) -> float:
+    # Time on air in seconds of a frame with `length` bytes after the preamble.
+    # coding_rate is the denominator of 4/CR, as exposed by RFM9x.coding_rate.
+    t_sym = symbol_time(spreading_factor, bandwidth)
+
+    # Low data rate optimisation is mandated once a symbol exceeds 16 ms
+    de = 1 if t_sym > 0.016 else 0
+    ih = 0 if explicit_header else 1
+
+    num = 8 * length - 4 * spreading_factor + 28 + 16 * crc - 20 * ih
+    den = 4 * (spreading_factor - 2 * de)
+    n_payload = 8 + max(math.ceil(num / den) * coding_rate, 0)
+
+    return (preamble_length + 4.25) * t_sym + n_payload * t_sym
+
+
+def frame_airtime(radio, payload_len, spreading_factor=None, coding_rate=None) -> float:
+    # Time on air of a RadioHead frame carrying payload_len bytes, using the
+    # radio's current modem settings unless an SF or CR is given
+    return time_on_air(RH_HEADER_LEN + payload_len,
+                       spreading_factor or radio.spreading_factor,
+                       radio.signal_bandwidth, coding_rate or radio.coding_rate,
+                       radio.preamble_length, radio.enable_crc)
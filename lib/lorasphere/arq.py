@@ -0,0 +1,318 @@
+"""
+Selective-repeat ARQ
+####################
+Sliding-window reliable transport on top of the RadioHead header. Every frame
+to a peer gets the next packet_id as its sequence number and keeps it across
+retransmissions. Up to WINDOW frames may be outstanding at once, each with its
+own retransmit deadline, so a flight of frames goes out back to back and is
+acknowledged by one selective ACK.
+
+The selective ACK reuses the block ACK body: the next packet_id the receiver
+expects in order, and a bitmap of the ones after it that it already holds.
+Everything before the starting packet_id is acknowledged cumulatively.
+
+After a reboot, or once the sender has given up on frames, the receiver's
+window no longer matches the sender's, so the sender marks its frames SYN
+until one of them is acknowledged. A SYN frame's payload starts with the
+sender's epoch, drawn at random at boot and changed whenever it gives up on
+everything, and the oldest packet_id it still has outstanding. The first SYN
+frame of a new epoch restarts the receive window there, wherever it was
+before. Within an epoch a SYN frame is like any other, so a retransmission of
+one already delivered is still a duplicate, except that one more than half
+the packet_id space behind (the sender gave up on that many frames) moves the
+window to it instead of being discarded.
+"""
+
+import random
+import time
+
+from lorasphere import blockack
+
+# packet_id is one byte; offsets further than this behind are in the past
+SEQ_SPACE = 256
+HALF_SPACE = SEQ_SPACE // 2
+
+# The bitmap of a selective ACK bounds the window
+MAX_WINDOW = blockack.WINDOW
+
+# Epoch and oldest outstanding packet_id in front of a SYN frame's payload
+SYN_LEN = 2
+
+
+class ArqSender:
+    # Outgoing half of a link to one peer
+
+    def __init__(self, window=4, retry_limit=6, queue_limit=16):
+        if not 0 < window <= MAX_WINDOW:
+            raise ValueError(f"ARQ window must be between 1 and {MAX_WINDOW}")
+
+        self.WINDOW = window
+        self.RETRY_LIMIT = retry_limit
+        self.QUEUE_LIMIT = queue_limit
+
+        # Payloads not yet given a packet_id
+        self.queue = []
+
+        # Oldest unacknowledged packet_id and the next one to hand out
+        self.base = 0
+        self.next_seq = 0
+
+        # packet_id -> [payload, retransmit deadline, transmissions so far]
+        self.outstanding = {}
+
+        # Frames carry SYN until the receiver acknowledges one: set at boot
+        # and whenever frames are given up on. The epoch tells the receiver
+        # which incarnation of this sender they come from.
+        self.syn = True
+        self.epoch = random.randint(0, 0xFF)
+
+        self.num_retx = 0
+        self.num_dropped = 0
+
+    def push(self, payload) -> bool:
+        # Queue a payload. Returns False if the queue is full.
+        if len(self.queue) >= self.QUEUE_LIMIT:
+            return False
+        self.queue.append(payload)
+        return True
+
+    def pending(self) -> int:
+        # Frames queued or waiting for an ACK
+        return len(self.queue) + len(self.outstanding)
+
+    def in_flight(self) -> int:
+        return blockack.seq_offset(self.next_seq, self.base)
+
+    def next_due(self):
+        # Seconds until due() hands out a frame (or drops one), or None if
+        # nothing is queued or outstanding
+        if self.queue and self.in_flight() < self.WINDOW:
+            return 0
+        if not self.outstanding:
+            return None
+        return max(0, min(entry[1] for entry in self.outstanding.values()) - time.monotonic())
+
+    def due(self, limit=None) -> list:
+        # (packet_id, payload) of the frames to send now, oldest first: those
+        # whose retransmit deadline has passed, then new ones while the window
+        # has room. Frames over the retry limit are dropped instead.
+        now = time.monotonic()
+        while self.queue and self.in_flight() < self.WINDOW:
+            self.outstanding[self.next_seq] = [self.queue.pop(0), 0, 0]
+            self.next_seq = (self.next_seq + 1) & 0xFF
+
+        frames = []
+        for offset in range(self.in_flight()):
+            packet_id = (self.base + offset) & 0xFF
+            entry = self.outstanding.get(packet_id)
+            if entry is None or entry[1] > now:
+                continue
+            if entry[2] > self.RETRY_LIMIT:
+                del self.outstanding[packet_id]
+                self.num_dropped += 1
+                self.syn = True
+                continue
+            if limit is not None and len(frames) >= limit:
+                break
+            frames.append((packet_id, entry[0]))
+
+        self._advance()
+        return frames
+
+    def sent(self, packet_id, deadline) -> None:
+        # packet_id went on air; retransmit it if unacknowledged by deadline
+        entry = self.outstanding.get(packet_id)
+        if entry is None:
+            return
+        if entry[2]:
+            self.num_retx += 1
+        entry[1] = deadline
+        entry[2] += 1
+
+    def ack(self, packet_ids) -> list:
+        # Acknowledge individual packet_ids. Returns the (packet_id, payload)
+        # frames this newly acknowledged.
+        acked = []
+        for packet_id in packet_ids:
+            entry = self.outstanding.pop(packet_id, None)
+            if entry is not None:
+                acked.append((packet_id, entry[0]))
+        if acked:
+            # The receiver follows our packet_ids again
+            self.syn = False
+        self._advance()
+        return acked
+
+    def sack(self, start, bitmap) -> list:
+        # Apply a selective ACK. Frames it leaves out that were already sent
+        # are due again straight away rather than at their deadline.
+        behind = blockack.seq_offset(start, self.base)
+        if behind > self.in_flight():
+            # Stale start from before our window: only the bitmap counts
+            behind = 0
+
+        packet_ids = []
+        for offset in range(self.in_flight()):
+            packet_id = (self.base + offset) & 0xFF
+            if packet_id not in self.outstanding:
+                continue
+            if offset < behind:
+                packet_ids.append(packet_id)
+                continue
+            bit = blockack.seq_offset(packet_id, start)
+            if bit < MAX_WINDOW and (bitmap >> bit) & 1:
+                packet_ids.append(packet_id)
+            elif self.outstanding[packet_id][2]:
+                self.outstanding[packet_id][1] = 0
+        return self.ack(packet_ids)
+
+    def syn_header(self) -> bytes:
+        # What the payload of a SYN frame starts with
+        return bytes((self.epoch, self.base))
+
+    def clear(self) -> None:
+        # Give up on everything queued and outstanding, and start a new epoch
+        self.num_dropped += self.pending()
+        self.queue = []
+        self.outstanding = {}
+        self.base = self.next_seq
+        self.syn = True
+        self.epoch = (self.epoch + 1) & 0xFF
+
+    def _advance(self) -> None:
+        # Slide the window past every acknowledged or dropped packet_id
+        while self.base != self.next_seq and self.base not in self.outstanding:
+            self.base = (self.base + 1) & 0xFF
+
+
+class ArqReceiver:
+    # Incoming half of a link from one peer
+
+    def __init__(self, window=4):
+        self.WINDOW = window
+
+        # Next packet_id to deliver, and frames held until the gap before
+        # them is filled
+        self.expected = 0
+        self.buffer = {}
+
+        # Epoch of the last SYN frame from the sender, None until one arrives
+        self.epoch = None
+
+        self.num_dup = 0
+        self.num_resync = 0
+
+    def receive(self, packet_id, payload, syn=False) -> list:
+        # Accept a frame, syn if the sender marked it SYN (its payload then
+        # starts with the SYN header). Returns the payloads now deliverable in
+        # order.
+        delivered = []
+        if syn:
+            epoch, base, payload = payload[0], payload[1], payload[SYN_LEN:]
+            if epoch != self.epoch:
+                # The sender rebooted or gave up on everything since we last
+                # heard it: its window starts at base, however close behind
+                # or far from ours
+                self.epoch = epoch
+                if base != self.expected:
+                    self.num_resync += 1
+                delivered = self._restart(base)
+
+        offset = blockack.seq_offset(packet_id, self.expected)
+        if syn and HALF_SPACE <= offset < SEQ_SPACE - self.WINDOW:
+            # The sender gave up on more than half the packet_id space: start
+            # over from this frame. A SYN frame just behind us is a
+            # retransmission of one already delivered.
+            self.num_resync += 1
+            delivered += self._skip(offset)
+        elif offset >= HALF_SPACE or packet_id in self.buffer:
+            # Already delivered or already held: only the ACK was lost
+            self.num_dup += 1
+            return delivered
+        elif offset >= self.WINDOW:
+            # The sender moved past frames it gave up on: drop the gap so the
+            # window ends at this frame
+            delivered += self._skip(offset - self.WINDOW + 1)
+
+        self.buffer[packet_id] = payload
+        return delivered + self._deliver()
+
+    def sack(self) -> bytes:
+        # Block ACK body: the next packet_id expected, and the ones held after it
+        return blockack.encode(self.expected, self._bitmap())
+
+    def sack_into(self, codec):
+        # sack(), written into the body a FrameCodec is building
+        return codec.put_u8(self.expected).put_uint(self._bitmap(), blockack.BITMAP_LEN)
+
+    def _bitmap(self) -> int:
+        bitmap = 0
+        for packet_id in self.buffer:
+            bitmap |= 1 << blockack.seq_offset(packet_id, self.expected)
+        return bitmap
+
+    def _deliver(self) -> list:
+        payloads = []
+        while self.expected in self.buffer:
+            payloads.append(self.buffer.pop(self.expected))
+            self.expected = (self.expected + 1) & 0xFF
+        return payloads
+
+    def _restart(self, packet_id) -> list:
+        # Hand over what was held, in order, and start the window at packet_id
+        held = sorted(self.buffer, key=lambda held_id: blockack.seq_offset(held_id, self.expected))
+        payloads = [self.buffer.pop(held_id) for held_id in held]
+        self.expected = packet_id
+        return payloads
+
+    def _skip(self, count) -> list:
+        # Move the window forward count packet_ids, handing over what was held
+        payloads = []
+        for _ in range(count):
+            payload = self.buffer.pop(self.expected, None)
+            if payload is not None:
+                payloads.append(payload)
+            self.expected = (self.expected + 1) & 0xFF
+        return payloads
+
+
+class Arq:
+    # The sender and receiver state a node keeps for each of its peers
+
+    def __init__(self, window=4, retry_limit=6, queue_limit=16):
+        self.window = window
+        self.retry_limit = retry_limit
+        self.queue_limit = queue_limit
+        self.senders = {}
+        self.receivers = {}
+
+    def sender(self, peer) -> ArqSender:
+        if peer not in self.senders:
+            self.senders[peer] = ArqSender(self.window, self.retry_limit, self.queue_limit)
+        return self.senders[peer]
+
+    def receiver(self, peer) -> ArqReceiver:
+        if peer not in self.receivers:
+            self.receivers[peer] = ArqReceiver(self.window)
+        return self.receivers[peer]
+
+    def pending(self) -> list:
+        # Peers with frames queued or waiting for an ACK
+        return [peer for peer, sender in self.senders.items() if sender.pending()]
+
+    def due(self) -> list:
+        # Peers with new frames or retransmissions to send now
+        return [peer for peer, sender in self.senders.items() if sender.next_due() == 0]
+
+    def next_due(self):
+        # Seconds until any peer has a frame to send, or None
+        waits = [wait for wait in (sender.next_due() for sender in self.senders.values()) if wait is not None]
+        return min(waits) if waits else None
+
+    def num_dup(self) -> int:
+        # Frames received again after their ACK was lost, over all peers
+        return sum(receiver.num_dup for receiver in self.receivers.values())
+
+    def num_resync(self) -> int:
+        # Times a peer's SYN frame moved our receive window, over all peers
+        return sum(receiver.num_resync for receiver in self.receivers.values())
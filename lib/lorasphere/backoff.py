@@ -0,0 +1,51 @@
+"""
+Binary exponential backoff with a contention window per destination
+"""
+
+import random
+
+
+class ContentionWindow:
+    def __init__(self, cw_min=4, cw_max=64, retry_limit=6):
+        self.CW_MIN = cw_min
+        self.CW_MAX = cw_max
+        self.RETRY_LIMIT = retry_limit
+
+        # Consecutive failed attempts towards each destination
+        self.retries = {}
+
+        # histogram[n]: frames delivered after n retries
+        self.histogram = [0] * (retry_limit + 1)
+        self.num_dropped = 0
+
+        # Destination of the last attempt, for reporting
+        self.last_dest = None
+
+    def window(self, dest) -> int:
+        # CWmin doubled once per consecutive failure, capped at CWmax
+        return min(self.CW_MIN << self.retries.get(dest, 0), self.CW_MAX)
+
+    def draw(self, dest) -> int:
+        # Number of backoff slots before the next attempt towards dest
+        self.last_dest = dest
+        return random.randint(0, self.window(dest) - 1)
+
+    def success(self, dest) -> None:
+        # Frame delivered: record how many retries it took and reset to CWmin
+        self.histogram[self.retries.get(dest, 0)] += 1
+        self.retries.pop(dest, None)
+
+    def failure(self, dest) -> bool:
+        # Attempt failed: double the window. Returns True once the retry limit
+        # is exceeded, in which case the frame should be dropped.
+        retries = self.retries.get(dest, 0) + 1
+        if retries > self.RETRY_LIMIT:
+            self.num_dropped += 1
+            self.retries.pop(dest, None)
+            return True
+        self.retries[dest] = retries
+        return False
+
+    def current(self) -> int:
+        # Window that applies to the destination we last contended for
+        return self.window(self.last_dest) if self.last_dest is not None else self.CW_MIN
@@ -0,0 +1,25 @@
+"""
+Block acknowledgement: one frame acknowledging a run of packet_ids
+##################################################################
+Body after the control byte: the starting packet_id and a bitmap in which
+bit n (LSB first) acknowledges packet_id start + n (mod 256).
+"""
+
+BITMAP_LEN = 2
+WINDOW = 8 * BITMAP_LEN
+BLOCK_ACK_LEN = 1 + BITMAP_LEN
+
+
+def seq_offset(seq, start) -> int:
+    # Distance from start to seq in the 8-bit packet_id space
+    return (seq - start) & 0xFF
+
+
+def encode(start, bitmap) -> bytes:
+    return bytes([start]) + bitmap.to_bytes(BITMAP_LEN, 'big')
+
+
+def decode(body) -> tuple:
+    # (start, bitmap) from a block ACK body
+    return body[0], int.from_bytes(body[1:1 + BITMAP_LEN], 'big')
+
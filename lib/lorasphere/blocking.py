@@ -0,0 +1,95 @@
+"""
+Blocking runtime
+################
+The same awaitables as aio.Runtime (sleep(), receive(), send(), carrier
+sense), each a plain blocking call on the driver. A node's MAC is written
+once, as coroutines against whichever runtime drives it. Under this one no
+await ever suspends: run() steps the MAC coroutine once and it runs until it
+returns, like the loop of blocking calls it replaces. No asyncio is needed,
+so boards without the library run it as is.
+"""
+
+import time
+
+from lorasphere.airtime import symbol_time
+
+# SX127x registers and bits the driver keeps private
+_REG_12_IRQ_FLAGS = 0x12
+_REG_1B_RSSI_VALUE = 0x1B
+_CAD_DONE = 0x04
+_CAD_DETECTED = 0x01
+_RSSI_OFFSET = 157  # High frequency port
+CAD_MODE = 0b111
+
+
+class Runtime:
+    def __init__(self, radio):
+        self.radio = radio
+
+    def run(self, coro):
+        # Drive coro to the end and return what it returns
+        try:
+            coro.send(None)
+        except StopIteration as e:
+            return e.value
+        raise RuntimeError("A blocking coroutine awaited something other than the runtime")
+
+    # ---- Waiting ----
+
+    async def sleep(self, seconds) -> None:
+        time.sleep(max(0, seconds))
+
+    async def sleep_until(self, t) -> None:
+        time.sleep(max(0, t - time.monotonic()))
+
+    # ---- Radio ----
+
+    async def receive(self, timeout):
+        # The next frame for us, header included, or None. The driver also
+        # returns None early for a frame it filters out (another node's, or
+        # one failing the CRC).
+        return self.radio.receive(timeout=timeout, with_header=True)
+
+    def flush(self) -> None:
+        # Nothing is buffered between receive() calls
+        pass
+
+    async def send(self, data, **kwargs) -> bool:
+        return self.radio.send(data, **kwargs)
+
+    async def channel_activity(self) -> bool:
+        # One CAD: the chip listens for about two symbols, raises CadDone
+        # and falls back to standby
+        radio = self.radio
+        radio.idle()
+        radio._write_u8(_REG_12_IRQ_FLAGS, 0xFF)
+        radio.dio0_mapping = 0b10  # CadDone
+        radio.operation_mode = CAD_MODE
+
+        t_sym = symbol_time(radio.spreading_factor, radio.signal_bandwidth)
+        deadline = time.monotonic() + 8 * t_sym
+        time.sleep(2 * t_sym)
+        while not radio._read_u8(_REG_12_IRQ_FLAGS) & _CAD_DONE:
+            if time.monotonic() >= deadline:
+                # No CadDone: assume the worst rather than talk over someone
+                radio.idle()
+                return True
+            time.sleep(t_sym / 4)
+
+        flags = radio._read_u8(_REG_12_IRQ_FLAGS)
+        radio._write_u8(_REG_12_IRQ_FLAGS, 0xFF)
+        radio.idle()
+        return bool(flags & _CAD_DETECTED)
+
+    async def rssi(self) -> float:
+        # Instantaneous RSSI in dBm; only meaningful in receive mode
+        radio = self.radio
+        radio.listen()
+        time.sleep(symbol_time(radio.spreading_factor, radio.signal_bandwidth))
+        power = radio._read_u8(_REG_1B_RSSI_VALUE) - _RSSI_OFFSET
+        radio.idle()
+        return power
+
+    def summary(self) -> str:
+        # Nothing worth reporting; aio.Runtime counts its receive buffer
+        return ""
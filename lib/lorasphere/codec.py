@@ -0,0 +1,120 @@
+"""
+Frame codec
+###########
+Builds and parses RadioHead frames in buffers allocated once. Each node
+keeps one FrameCodec. An outgoing body is written field by field into a
+bytearray and handed to the driver as a memoryview of the bytes in use, the
+one object frame() creates per frame. A received frame is copied into a
+second bytearray, and its header fields and body bytes are read from there
+by offset as plain ints. Only a payload the node keeps past the next frame,
+such as one the ARQ holds, is copied out.
+
+The driver's own send() and receive() still allocate once per frame, to
+prepend the header and to return the FIFO's contents, and so does the
+asyncio runtime's receive. The asyncio runtime writes the header into the
+FIFO itself, so its send() does not.
+"""
+
+# RadioHead header: destination, sender, packet_id and flags
+HEADER_LEN = 4
+DEST = 0
+NODE = 1
+PACKET_ID = 2
+FLAGS = 3
+
+# Longest body the driver sends: its FIFO holds 256 bytes, header included
+MAX_BODY = 252
+
+
+def read_uint(buf, offset, length) -> int:
+    # Big-endian unsigned integer of length bytes at buf[offset]
+    value = 0
+    for i in range(offset, offset + length):
+        value = value << 8 | buf[i]
+    return value
+
+
+class FrameCodec:
+    def __init__(self, max_body=MAX_BODY):
+        # Body of the frame being built, and how much of it is in use
+        self.tx = bytearray(max_body)
+        self.tx_view = memoryview(self.tx)
+        self.tx_len = 0
+
+        # Frame parsed last, header included, and how much of the buffer
+        # it fills. It holds any frame the driver returns, however long the
+        # bodies we build.
+        self.rx = bytearray(HEADER_LEN + MAX_BODY)
+        self.rx_len = 0
+
+    # ---- Building ----
+
+    def begin(self, control=None):
+        # Start a new body, with its control byte if the protocol has one
+        self.tx_len = 0
+        if control is not None:
+            self.put_u8(control)
+        return self
+
+    def put_u8(self, value):
+        self.tx[self.tx_len] = value & 0xFF
+        self.tx_len += 1
+        return self
+
+    def put_uint(self, value, length):
+        # Big-endian, like int.to_bytes(length, 'big')
+        for i in range(length - 1, -1, -1):
+            self.tx[self.tx_len] = (value >> (8 * i)) & 0xFF
+            self.tx_len += 1
+        return self
+
+    def put(self, data):
+        end = self.tx_len + len(data)
+        self.tx[self.tx_len:end] = data
+        self.tx_len = end
+        return self
+
+    def frame(self) -> memoryview:
+        # The body built so far, for send()
+        return self.tx_view[:self.tx_len]
+
+    # ---- Parsing ----
+
+    def parse(self, packet) -> bool:
+        # Take in a received packet, header included. Returns False if it
+        # carries no body or is too long for the buffer.
+        length = len(packet)
+        if length > len(self.rx):
+            self.rx_len = 0
+            return False
+        self.rx[:length] = packet
+        self.rx_len = length
+        return length > HEADER_LEN
+
+    def dest(self) -> int:
+        return self.rx[DEST]
+
+    def node(self) -> int:
+        return self.rx[NODE]
+
+    def packet_id(self) -> int:
+        return self.rx[PACKET_ID]
+
+    def flags(self) -> int:
+        return self.rx[FLAGS]
+
+    def body_len(self) -> int:
+        return self.rx_len - HEADER_LEN
+
+    def get_u8(self, offset) -> int:
+        # Byte at offset into the body
+        return self.rx[HEADER_LEN + offset]
+
+    def get_uint(self, offset, length) -> int:
+        # Big-endian unsigned integer of length bytes at offset into the body
+        return read_uint(self.rx, HEADER_LEN + offset, length)
+
+    def payload(self, start=0, end=None) -> bytearray:
+        # Copy of the body from start (to end), to keep past the next parse()
+        end = self.rx_len if end is None else min(HEADER_LEN + end, self.rx_len)
+        return self.rx[HEADER_LEN + start:end]
@@ -0,0 +1,80 @@
+"""
+Listen before talk
+##################
+p-persistent CSMA for the RFM95. The channel is sensed either with the
+SX127x's Channel Activity Detection, which picks up LoRa preambles at our own
+SF and bandwidth, or by comparing the instantaneous RSSI with a threshold,
+which sees any signal on the frequency.
+
+The runtime driving the node (blocking.Runtime or aio.Runtime) senses the
+channel and sleeps between senses, so with the asyncio runtime the other
+tasks keep running while we defer.
+"""
+
+import random
+
+from lorasphere.airtime import symbol_time
+
+# Carrier sense methods
+CAD = "cad"
+RSSI = "rssi"
+
+
+class Csma:
+    def __init__(self, radio, method=CAD, ifs=0.05, persistence=0.5, max_attempts=8,
+                 max_window=64, rssi_threshold=-100):
+        if method not in (CAD, RSSI):
+            raise ValueError(f"Unknown carrier sense method {method}")
+
+        self.radio = radio
+        self.METHOD = method
+        self.IFS = ifs                        # Idle time that proves no reply is about to start
+        self.PERSISTENCE = persistence        # Chance of sending in an idle slot
+        self.MAX_ATTEMPTS = max_attempts      # Busy senses before giving up
+        self.MAX_WINDOW = max_window          # Largest backoff, in slots
+        self.RSSI_THRESHOLD = rssi_threshold  # dBm above which the channel is busy
+
+        self.num_checks = 0
+        self.num_busy = 0
+        self.num_deferred = 0
+        self.num_gave_up = 0
+
+    def slot_time(self) -> float:
+        # Time a transmission that has just started takes to become
+        # detectable: its preamble
+        radio = self.radio
+        return (radio.preamble_length + 4.25) * symbol_time(radio.spreading_factor, radio.signal_bandwidth)
+
+    async def sense(self, rt) -> bool:
+        self.num_checks += 1
+        if self.METHOD == CAD:
+            return await rt.channel_activity()
+        return await rt.rssi() > self.RSSI_THRESHOLD
+
+    async def busy(self, rt) -> bool:
+        # The channel only counts as idle if it still is IFS later: between a
+        # frame and its reply (CTS, ACK) the air is briefly silent
+        if await self.sense(rt):
+            return True
+        await rt.sleep(self.IFS)
+        return await self.sense(rt)
+
+    async def wait_clear(self, rt) -> bool:
+        # Sense until we may send. An idle slot is used with probability
+        # PERSISTENCE and otherwise deferred by one slot; a busy sense backs
+        # off a random number of slots from a window that doubles each time.
+        # Returns False after MAX_ATTEMPTS busy senses.
+        attempts = 0
+        while True:
+            if await self.busy(rt):
+                self.num_busy += 1
+                attempts += 1
+                if attempts >= self.MAX_ATTEMPTS:
+                    self.num_gave_up += 1
+                    return False
+                await rt.sleep(random.randint(1, min(2 << attempts, self.MAX_WINDOW)) * self.slot_time())
+            elif random.random() < self.PERSISTENCE:
+                return True
+            else:
+                self.num_deferred += 1
+                await rt.sleep(self.slot_time())
@@ -0,0 +1,137 @@
+"""
+Fragmentation and reassembly
+############################
+Application messages longer than one frame are split into numbered fragments
+that travel as ordinary ARQ payloads, so they are retransmitted individually
+and may share a channel reservation. Every payload starts with one byte:
+
+    0x00                      a whole message follows
+    0x80 | message id (7 b)   a fragment: index, count, total length (2 B),
+                              then its chunk of the message
+
+All fragments but the last carry ceil(total / count) bytes, so the receiver
+knows where each one goes from the header alone. It reassembles into a buffer
+allocated once, at the message's full length, when the first fragment
+arrives. Partial messages are dropped after TIMEOUT without progress, and
+the oldest one is evicted when they would take more than MEMORY_LIMIT bytes.
+"""
+
+import time
+from collections import OrderedDict
+
+WHOLE = 0x00
+FRAGMENT = 0x80
+WHOLE_HEADER_LEN = 1
+FRAGMENT_HEADER_LEN = 5
+
+
+class Fragmenter:
+    def __init__(self, max_payload, max_message=4096):
+        self.MAX_PAYLOAD = max_payload  # Longest payload one frame carries
+        self.MAX_MESSAGE = max_message  # Longest message we split
+        self.CHUNK = max_payload - FRAGMENT_HEADER_LEN
+        self.msg_id = 0
+
+        self.num_fragmented = 0
+
+    def split(self, message) -> list:
+        # The payloads that carry message: itself behind a one-byte header if
+        # it fits in a frame, else its fragments in order
+        if WHOLE_HEADER_LEN + len(message) <= self.MAX_PAYLOAD:
+            return [bytes([WHOLE]) + message]
+        if len(message) > self.MAX_MESSAGE or len(message) > 0xFFFF:
+            raise ValueError(f"Message of {len(message)} bytes is over the {self.MAX_MESSAGE} byte limit")
+
+        count = (len(message) + self.CHUNK - 1) // self.CHUNK
+        if count > 0xFF:
+            raise ValueError(f"Message of {len(message)} bytes needs more than 255 fragments")
+        chunk = (len(message) + count - 1) // count
+        self.msg_id = (self.msg_id + 1) & 0x7F
+        self.num_fragmented += 1
+
+        header = bytes([FRAGMENT | self.msg_id])
+        total = len(message).to_bytes(2, 'big')
+        return [header + bytes([index, count]) + total + message[index * chunk:(index + 1) * chunk]
+                for index in range(count)]
+
+
+class Reassembler:
+    def __init__(self, max_message=4096, memory_limit=8192, timeout=30.0):
+        self.MAX_MESSAGE = max_message    # Longer messages are refused
+        self.MEMORY_LIMIT = memory_limit  # Bytes held by partial messages at most
+        self.TIMEOUT = timeout            # Seconds without a new fragment before giving up
+
+        # (sender, message id) -> [buffer, bitmap of fragments held, count,
+        # deadline], oldest first
+        self.partial = OrderedDict()
+        self.memory = 0
+
+        self.num_reassembled = 0
+        self.num_timed_out = 0
+        self.num_evicted = 0
+        self.num_bad = 0
+
+    def receive(self, sender, payload):
+        # Take in a payload from sender. Returns the message it completes,
+        # if any.
+        self.expire()
+        if not payload:
+            self.num_bad += 1
+            return None
+        if not payload[0] & FRAGMENT:
+            return bytes(payload[WHOLE_HEADER_LEN:])
+        if len(payload) < FRAGMENT_HEADER_LEN:
+            self.num_bad += 1
+            return None
+
+        msg_id, index, count = payload[0] & 0x7F, payload[1], payload[2]
+        total = int.from_bytes(payload[3:5], 'big')
+        if not index < count or total > self.MAX_MESSAGE or total > self.MEMORY_LIMIT:
+            self.num_bad += 1
+            return None
+
+        chunk = (total + count - 1) // count
+        offset = index * chunk
+        body = payload[FRAGMENT_HEADER_LEN:]
+        if len(body) != min(chunk, total - offset):
+            self.num_bad += 1
+            return None
+
+        key = (sender, msg_id)
+        entry = self.partial.pop(key, None)
+        if entry is not None and (len(entry[0]) != total or entry[2] != count):
+            # The id came round again for a new message: the old one is lost
+            self.drop(entry)
+            self.num_timed_out += 1
+            entry = None
+        if entry is None:
+            while self.partial and self.memory + total > self.MEMORY_LIMIT:
+                self.drop(self.partial.pop(next(iter(self.partial))))
+                self.num_evicted += 1
+            entry = [bytearray(total), 0, count, 0]
+            self.memory += total
+
+        entry[0][offset:offset + len(body)] = body
+        entry[1] |= 1 << index
+        entry[3] = time.monotonic() + self.TIMEOUT
+        if entry[1] != (1 << count) - 1:
+            self.partial[key] = entry
+            return None
+
+        self.drop(entry)
+        self.num_reassembled += 1
+        return bytes(entry[0])
+
+    def expire(self) -> None:
+        # Give up on partial messages that stopped making progress
+        now = time.monotonic()
+        for key, entry in list(self.partial.items()):
+            if entry[3] <= now:
+                self.drop(self.partial.pop(key))
+                self.num_timed_out += 1
+
+    def drop(self, entry) -> None:
+        self.memory -= len(entry[0])
+
+    def summary(self) -> str:
+        return f"reasm:{self.num_reassembled}/reasm_timeout:{self.num_timed_out}/reasm_evict:{self.num_evicted}"
@@ -0,0 +1,101 @@
+"""
+State timing
+############
+How long a node spends in each state of its MAC, and how long a whole
+exchange takes from its first frame to the ACK that completes it. Every time
+a state is left, its duration goes into a histogram of fixed buckets:
+
+    <=2 ms, <=5, <=10, <=20, <=50, <=100, <=200, <=500, <=1000, <=2000,
+    <=5000, longer
+
+so recording costs a clock read and a few additions, and nothing is
+allocated. The sum per state over the node's uptime gives the share of time
+it spent there; what no state covers (HELLOs, carrier sense, processing) is
+reported as "other".
+
+Node methods that are a state are wrapped with @timed("state") and record
+into the node's `timing`.
+"""
+
+import time
+
+# Upper bounds of the histogram buckets, in ms; the last bucket holds the rest
+BUCKETS_MS = (2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS_MS):
+        self.BOUNDS = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.num = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds) -> None:
+        ms = seconds * 1000
+        i = 0
+        while i < len(self.BOUNDS) and ms > self.BOUNDS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.num += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self) -> str:
+        # count x mean/max in ms, then the buckets
+        mean = self.total / self.num * 1000 if self.num else 0
+        counts = " ".join(str(n) for n in self.counts)
+        return f"{self.num}x{mean:.0f}/{self.max * 1000:.0f}[{counts}]"
+
+
+class StateTimer:
+    def __init__(self, states, bounds=BUCKETS_MS):
+        self.STATES = states
+        self.states = {state: Histogram(bounds) for state in states}
+
+        # First frame to completing ACK of the exchange under way, if any
+        self.exchange = Histogram(bounds)
+        self.exchange_start = None
+
+        self.start_time = time.monotonic()
+
+    def done(self, state, start) -> None:
+        # Leave state, entered at time.monotonic() == start
+        self.states[state].add(time.monotonic() - start)
+
+    def begin_exchange(self) -> None:
+        # The first frame of an attempt (RTS, or the message itself) goes out
+        self.exchange_start = time.monotonic()
+
+    def end_exchange(self) -> None:
+        # The ACK completing the attempt came in
+        if self.exchange_start is not None:
+            self.exchange.add(time.monotonic() - self.exchange_start)
+            self.exchange_start = None
+
+    def occupancy(self) -> dict:
+        # Share of the uptime spent in each state, and in none of them
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        shares = {state: self.states[state].total / elapsed for state in self.STATES}
+        shares["other"] = max(0, 1 - sum(shares.values()))
+        return shares
+
+    def summary(self) -> str:
+        occupancy = self.occupancy()
+        shares = " ".join(f"{state}:{occupancy[state] * 100:.1f}%" for state in self.STATES + ("other",))
+        latency = " ".join(f"{state}:{self.states[state].summary()}" for state in self.STATES)
+        return f"occ:[{shares}]/lat_ms:[{latency}]/exchange_ms:{self.exchange.summary()}"
+
+
+def timed(state):
+    # Decorator: time every call of a node's coroutine method as a stay in state
+    def decorate(method):
+        async def wrapper(self, *args, **kwargs):
+            start = time.monotonic()
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                self.timing.done(state, start)
+        return wrapper
+    return decorate
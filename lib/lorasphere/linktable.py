@@ -0,0 +1,78 @@
+"""
+Per-neighbour link quality and rate selection
+#############################################
+Keeps an EWMA of the SNR and RSSI of every frame heard from each neighbour.
+Links are assumed symmetric, so the SNR we measure on a neighbour's frames
+tells us which spreading factor and coding rate our frames to it can use.
+"""
+
+# SNR (dB) the SX127x needs to demodulate each spreading factor
+DEMOD_FLOOR_DB = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+
+# Extra robustness of each coding rate 4/CR over 4/5
+CODING_GAIN_DB = {5: 0.0, 6: 0.5, 7: 1.0, 8: 1.5}
+
+
+def bitrate(spreading_factor, coding_rate, bandwidth=125000) -> float:
+    # LoRa raw bit rate in bits per second
+    return spreading_factor * bandwidth / (1 << spreading_factor) * 4 / coding_rate
+
+
+class LinkTable:
+    def __init__(self, alpha=0.25, margin_db=6.0, miss_penalty_db=2.0,
+                 sf_range=(7, 12), default_rate=(7, 8)):
+        self.ALPHA = alpha                      # Weight of the newest frame
+        self.MARGIN_DB = margin_db              # SNR margin for the target packet error rate
+        self.MISS_PENALTY_DB = miss_penalty_db  # Taken off a link's SNR per lost frame
+        self.DEFAULT_RATE = default_rate        # (SF, CR) for links we have not heard yet
+
+        # Candidate (SF, CR) pairs, fastest first
+        self.rates = sorted(((sf, cr) for sf in range(sf_range[0], sf_range[1] + 1)
+                             for cr in CODING_GAIN_DB),
+                            key=lambda rate: -bitrate(*rate))
+
+        # node -> [smoothed SNR, smoothed RSSI, frames heard]
+        self.links = {}
+
+    def update(self, node, snr, rssi) -> None:
+        # Fold in the SNR and RSSI of a frame just received from node
+        link = self.links.get(node)
+        if link is None:
+            self.links[node] = [snr, rssi, 1]
+            return
+        link[0] += self.ALPHA * (snr - link[0])
+        link[1] += self.ALPHA * (rssi - link[1])
+        link[2] += 1
+
+    def miss(self, node) -> None:
+        # A frame to node went unanswered: assume the link got worse
+        link = self.links.get(node)
+        if link is not None:
+            link[0] -= self.MISS_PENALTY_DB
+
+    def snr(self, node):
+        link = self.links.get(node)
+        return link[0] if link is not None else None
+
+    def rssi(self, node):
+        link = self.links.get(node)
+        return link[1] if link is not None else None
+
+    def rate(self, node, spreading_factor=None) -> tuple:
+        # Fastest (SF, CR) whose demodulation floor the link clears by the
+        # margin, or the most robust one if none does. Passing a spreading
+        # factor only adapts the coding rate, which receivers pick up from
+        # the LoRa header without being told.
+        rates = [rate for rate in self.rates if spreading_factor in (None, rate[0])]
+        snr = self.snr(node)
+        if snr is None:
+            return (spreading_factor or self.DEFAULT_RATE[0], self.DEFAULT_RATE[1])
+        for sf, cr in rates:
+            if snr - DEMOD_FLOOR_DB[sf] + CODING_GAIN_DB[cr] >= self.MARGIN_DB:
+                return (sf, cr)
+        return rates[-1]
+
+    def summary(self) -> str:
+        # "node:SF/CR" for every known link
+        return " ".join(f"{node}:{sf}/{cr}" for node, (sf, cr)
+                        in ((node, self.rate(node)) for node in sorted(self.links)))
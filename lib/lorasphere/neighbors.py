@@ -0,0 +1,57 @@
+"""
+Neighbour discovery
+###################
+Every node broadcasts a HELLO now and then, and every frame heard from a node,
+HELLO or not, marks it alive. A neighbour not heard for EXPIRY seconds is
+dropped, so traffic is only addressed to nodes that are still around.
+"""
+
+import random
+import time
+
+
+class NeighborTable:
+    def __init__(self, hello_interval=30.0, expiry_intervals=4):
+        self.HELLO_INTERVAL = hello_interval                # Mean seconds between our HELLOs
+        self.EXPIRY = hello_interval * expiry_intervals     # Silence after which a neighbour is gone
+
+        # node -> [last heard (time.monotonic()), RSSI of that frame]
+        self.neighbors = {}
+
+        # First HELLO soon after boot, jittered so boards that boot together
+        # do not announce themselves at the same moment
+        self.next_hello = time.monotonic() + random.uniform(0, hello_interval / 4)
+
+        self.num_hellos = 0
+        self.num_expired = 0
+
+    def heard(self, node, rssi) -> None:
+        # Any frame from node proves it is alive
+        if node not in self.neighbors:
+            self.neighbors[node] = [0, 0]
+        self.neighbors[node][0] = time.monotonic()
+        self.neighbors[node][1] = rssi
+
+    def alive(self) -> list:
+        # IDs of the neighbours heard within EXPIRY, forgetting the others
+        now = time.monotonic()
+        for node, (last_seen, rssi) in list(self.neighbors.items()):
+            if now - last_seen > self.EXPIRY:
+                del self.neighbors[node]
+                self.num_expired += 1
+        return sorted(self.neighbors)
+
+    def is_alive(self, node) -> bool:
+        return node in self.alive()
+
+    def rssi(self, node):
+        neighbor = self.neighbors.get(node)
+        return neighbor[1] if neighbor is not None else None
+
+    def hello_due(self) -> bool:
+        return time.monotonic() >= self.next_hello
+
+    def hello_sent(self) -> None:
+        # Schedule the next HELLO, jittered to keep nodes from falling in step
+        self.next_hello = time.monotonic() + self.HELLO_INTERVAL * random.uniform(0.75, 1.25)
+        self.num_hellos += 1
@@ -0,0 +1,211 @@
+"""
+Multi-hop routing
+#################
+On-demand, AODV-style routes on top of a one-hop MAC. Every routed frame
+starts with an extension header: message type, origin, final destination,
+hops travelled so far and a sequence number. Data travels hop by hop through
+each node's ARQ. A node without a route floods a route request (RREQ) over
+the broadcast address and holds the data until the route reply (RREP) comes
+back along the reverse path the request left behind.
+
+Routes live in a size-bounded LRU cache and only hold while their next hop is
+still a live neighbour. HELLOs that list their sender's neighbours give
+two-hop routes for free.
+"""
+
+import time
+from collections import OrderedDict
+
+BROADCAST = 255
+
+# Extension header: type, origin, final destination, hops, sequence number
+HEADER_LEN = 5
+
+# Message types
+DATA = 0
+RREQ = 1
+RREP = 2
+
+
+def encode(kind, origin, dest, hops, seq) -> bytes:
+    return bytes([kind, origin, dest, hops, seq])
+
+
+def decode(frame) -> tuple:
+    # (type, origin, final destination, hops, sequence number)
+    return frame[0], frame[1], frame[2], frame[3], frame[4]
+
+
+class Router:
+    def __init__(self, node, cache_size=16, route_lifetime=300.0, max_hops=8,
+                 discovery_timeout=10.0, discovery_retries=3, queue_limit=8, seen_limit=32):
+        self.node = node
+        self.CACHE_SIZE = cache_size                # Routes kept, least recently used evicted first
+        self.ROUTE_LIFETIME = route_lifetime        # Seconds a route is trusted after it was learnt
+        self.MAX_HOPS = max_hops                    # Frames that travelled this far are dropped
+        self.DISCOVERY_TIMEOUT = discovery_timeout  # Wait for an RREP before asking again
+        self.DISCOVERY_RETRIES = discovery_retries  # RREQs per destination before giving up
+        self.QUEUE_LIMIT = queue_limit              # Payloads held per destination during discovery
+        self.SEEN_LIMIT = seen_limit                # RREQs remembered to stop re-flooding them
+
+        # dest -> [next hop, hops, expiry], least recently used first
+        self.routes = OrderedDict()
+
+        # Every node we have heard of, routed or not; dropped once a route
+        # discovery for it fails
+        self.known = set()
+
+        # (origin, sequence number) of the RREQs already handled, oldest first
+        self.seen = OrderedDict()
+
+        # Route discovery: payloads waiting for each destination, and when
+        # its current RREQ times out and how many were sent
+        self.waiting = {}
+        self.discovery = {}
+        self.rreq_seq = 0
+
+        self.num_forwarded = 0
+        self.num_rreq = 0
+        self.num_no_route = 0
+        self.num_evicted = 0
+
+    def learn(self, dest, next_hop, hops) -> None:
+        # Cache a route, unless a live one at least as short is already there
+        if dest in (self.node, BROADCAST):
+            return
+        self.known.add(dest)
+        now = time.monotonic()
+        route = self.routes.pop(dest, None)
+        if route is None or route[2] <= now or hops <= route[1] or next_hop == route[0]:
+            route = [next_hop, hops, now + self.ROUTE_LIFETIME]
+        self.routes[dest] = route
+
+        while len(self.routes) > self.CACHE_SIZE:
+            self.routes.pop(next(iter(self.routes)))
+            self.num_evicted += 1
+
+    def lookup(self, dest, neighbors):
+        # Next hop towards dest, or None. Neighbours are reached directly;
+        # other routes only count while fresh and through a live neighbour.
+        if dest in neighbors:
+            return dest
+        route = self.routes.pop(dest, None)
+        if route is None or route[2] <= time.monotonic() or route[0] not in neighbors:
+            return None
+        self.routes[dest] = route  # Now the most recently used
+        return route[0]
+
+    def link_failed(self, next_hop) -> None:
+        # The MAC gave up on next_hop: forget every route through it
+        for dest, route in list(self.routes.items()):
+            if route[0] == next_hop:
+                del self.routes[dest]
+
+    def hello(self, prev_hop, nodes) -> None:
+        # A HELLO listing prev_hop's neighbours: each is two hops away at most
+        for node in nodes:
+            self.learn(node, prev_hop, 2)
+
+    def destinations(self, neighbors) -> list:
+        # Every node we can send to: neighbours, and the nodes we know of
+        # that a cached route or a route request reaches
+        return sorted(self.known | set(neighbors))
+
+    def send(self, dest, payload, neighbors) -> list:
+        # Route a payload of ours. Returns the (next hop, frame) pairs to
+        # transmit; next hop BROADCAST is a route request.
+        next_hop = self.lookup(dest, neighbors)
+        if next_hop is not None:
+            return [(next_hop, encode(DATA, self.node, dest, 0, 0) + payload)]
+
+        queue = self.waiting.setdefault(dest, [])
+        if len(queue) >= self.QUEUE_LIMIT:
+            queue.pop(0)
+            self.num_no_route += 1
+        queue.append(payload)
+        return self.discover(dest)
+
+    def poll(self, neighbors) -> list:
+        # Send what a route has turned up for, and ask again for routes whose
+        # request timed out
+        frames = []
+        for dest in list(self.waiting):
+            if self.lookup(dest, neighbors) is not None:
+                frames += self.flush(dest, neighbors)
+            else:
+                frames += self.discover(dest)
+        return frames
+
+    def discover(self, dest) -> list:
+        # An RREQ for dest, unless one is still pending. After the last retry
+        # the payloads waiting for dest are dropped.
+        now = time.monotonic()
+        deadline, attempts = self.discovery.get(dest, (0, 0))
+        if deadline > now:
+            return []
+        if attempts >= self.DISCOVERY_RETRIES:
+            self.num_no_route += len(self.waiting.pop(dest, []))
+            del self.discovery[dest]
+            self.known.discard(dest)
+            return []
+
+        self.discovery[dest] = (now + self.DISCOVERY_TIMEOUT, attempts + 1)
+        self.rreq_seq = (self.rreq_seq + 1) & 0xFF
+        self.remember(self.node, self.rreq_seq)
+        self.num_rreq += 1
+        return [(BROADCAST, encode(RREQ, self.node, dest, 0, self.rreq_seq))]
+
+    def flush(self, dest, neighbors) -> list:
+        # The payloads held for dest, now that it has a route
+        self.discovery.pop(dest, None)
+        next_hop = self.lookup(dest, neighbors)
+        payloads = self.waiting.pop(dest, [])
+        if next_hop is None:
+            self.num_no_route += len(payloads)
+            return []
+        return [(next_hop, encode(DATA, self.node, dest, 0, 0) + payload) for payload in payloads]
+
+    def remember(self, origin, seq) -> None:
+        self.seen[(origin, seq)] = True
+        while len(self.seen) > self.SEEN_LIMIT:
+            self.seen.pop(next(iter(self.seen)))
+
+    def receive(self, prev_hop, frame, neighbors) -> tuple:
+        # Handle a routed frame from neighbour prev_hop. Returns the (next
+        # hop, frame) pairs to transmit and the (origin, payload) for us, if
+        # any.
+        if len(frame) < HEADER_LEN:
+            return [], None
+        kind, origin, dest, hops, seq = decode(frame)
+        body = frame[HEADER_LEN:]
+        hops += 1
+
+        # Whatever it carries, the frame shows a way back to its origin
+        self.learn(prev_hop, prev_hop, 1)
+        self.learn(origin, prev_hop, hops)
+
+        if kind == RREQ:
+            if origin == self.node or (origin, seq) in self.seen:
+                return [], None
+            self.remember(origin, seq)
+            if dest == self.node:
+                return [(prev_hop, encode(RREP, self.node, origin, 0, seq))], None
+            if hops >= self.MAX_HOPS:
+                return [], None
+            return [(BROADCAST, encode(RREQ, origin, dest, hops, seq))], None
+
+        if dest == self.node:
+            if kind == RREP:
+                return self.flush(origin, neighbors), None
+            return [], (origin, body)
+
+        # Data or a reply for someone else: pass it on
+        next_hop = self.lookup(dest, neighbors)
+        if next_hop is None or hops >= self.MAX_HOPS:
+            self.num_no_route += 1
+            return [], None
+        self.num_forwarded += 1
+        return [(next_hop, encode(kind, origin, dest, hops, seq) + body)], None
+
+    def summary(self) -> str:
+        return f"routes:{len(self.routes)}/fwd:{self.num_forwarded}/rreq:{self.num_rreq}/noroute:{self.num_no_route}"
@@ -0,0 +1,89 @@
+"""
+Telemetry records
+#################
+What the demo application sends: a sequence number, the sender's uptime and
+the colour it shows. A record only takes the bytes it needs. By default it
+is readable text, "seq,uptime_ms,r,g,b". The compact encoding packs the same
+fields into 10 bytes behind a marker byte that no text record starts with.
+
+Now and then a node sends a sensor dump instead: its recent records, compact,
+behind a marker byte of their own. Dumps run to kilobytes and rely on the
+fragmentation layer to cross the network.
+"""
+
+import struct
+import time
+
+# First byte of a compact record, then sequence number, uptime in ms and RGB
+COMPACT_MARKER = 0xC1
+COMPACT_FORMAT = ">BHI3B"
+COMPACT_LEN = struct.calcsize(COMPACT_FORMAT)
+
+# First byte of a dump, then compact records, oldest first
+DUMP_MARKER = 0xD1
+
+
+def encode(seq, uptime, color, compact=False) -> bytes:
+    # Record for sequence number seq, sent uptime seconds after boot
+    seq &= 0xFFFF
+    uptime_ms = int(uptime * 1000) & 0xFFFFFFFF
+    if compact:
+        return struct.pack(COMPACT_FORMAT, COMPACT_MARKER, seq, uptime_ms, *color)
+    return f"{seq},{uptime_ms},{color[0]},{color[1]},{color[2]}".encode()
+
+
+def encode_dump(records) -> bytes:
+    # Dump of (seq, uptime, color) records
+    return bytes([DUMP_MARKER]) + b"".join(encode(seq, uptime, color, True) for seq, uptime, color in records)
+
+
+def decode_dump(payload) -> list:
+    # Every record of a dump, or None if the payload is not one
+    if not payload or payload[0] != DUMP_MARKER or (len(payload) - 1) % COMPACT_LEN:
+        return None
+    return [decode(payload[i:i + COMPACT_LEN]) for i in range(1, len(payload), COMPACT_LEN)]
+
+
+def decode(payload):
+    # (sequence number, uptime in ms, (r, g, b)) of a record in either
+    # encoding, or of the newest record of a dump; None if the payload is
+    # neither
+    if payload and payload[0] == DUMP_MARKER:
+        records = decode_dump(payload)
+        return records[-1] if records else None
+    if len(payload) == COMPACT_LEN and payload[0] == COMPACT_MARKER:
+        marker, seq, uptime_ms, r, g, b = struct.unpack(COMPACT_FORMAT, payload)
+        return seq, uptime_ms, (r, g, b)
+    try:
+        fields = [int(field) for field in bytes(payload).decode().split(",")]
+    except (UnicodeError, ValueError):
+        return None
+    if len(fields) != 5:
+        return None
+    return fields[0], fields[1], tuple(fields[2:])
+
+
+class Recorder:
+    # Numbers the records a node generates and keeps the recent ones for dumps
+
+    def __init__(self, compact=False, dump_records=0, dump_every=10, max_message=4096):
+        self.COMPACT = compact
+        # Records per dump, 0 never dumps. A dump must stay within the longest
+        # message the fragmenter splits (max_message), so it holds at most
+        # 409 records by default.
+        self.DUMP_RECORDS = max(0, min(dump_records, (max_message - 1) // COMPACT_LEN))
+        self.DUMP_EVERY = dump_every      # Every this many messages is a dump
+
+        self.seq = 0
+        self.history = []
+
+    def next(self, color) -> bytes:
+        # The next message: a record of color, or every DUMP_EVERY messages
+        # a dump of the last DUMP_RECORDS records
+        self.seq = (self.seq + 1) & 0xFFFF
+        record = (self.seq, time.monotonic(), color)
+        if self.DUMP_RECORDS:
+            self.history = self.history[-(self.DUMP_RECORDS - 1):] + [record] if self.DUMP_RECORDS > 1 else [record]
+            if self.seq % self.DUMP_EVERY == 0:
+                return encode_dump(self.history)
+        return encode(*record, compact=self.COMPACT)
@@ -0,0 +1,58 @@
+"""
+RTS threshold
+#############
+802.11-style: a frame shorter than the threshold costs less airtime than the
+RTS/CTS handshake that would protect it, so it goes out directly and is only
+acknowledged. Longer frames reserve the channel first.
+
+With adaptation, each neighbour gets its own threshold, driven by a smoothed
+collision rate of the attempts towards it: many lost attempts halve the
+threshold so more frames are protected, a quiet link raises it step by step
+so fewer frames pay for a handshake.
+"""
+
+
+class RtsThreshold:
+    def __init__(self, threshold=0, adaptive=False, min_threshold=0, max_threshold=256,
+                 alpha=0.25, high=0.3, low=0.1, step=16):
+        self.THRESHOLD = threshold          # Body length, in bytes, from which frames need an RTS
+        self.ADAPTIVE = adaptive
+        self.MIN_THRESHOLD = min_threshold  # 0: every frame is reserved
+        self.MAX_THRESHOLD = max_threshold  # Above the longest frame: none is
+        self.ALPHA = alpha                  # Weight of the newest attempt
+        self.HIGH = high                    # Collision rate above which the threshold halves
+        self.LOW = low                      # Collision rate below which it grows by STEP
+        self.STEP = step
+
+        # node -> [threshold, smoothed collision rate]
+        self.links = {}
+
+        self.num_direct = 0
+
+    def threshold(self, node) -> int:
+        link = self.links.get(node)
+        return link[0] if link is not None else self.THRESHOLD
+
+    def use_rts(self, node, length) -> bool:
+        # Whether a frame of length body bytes to node should reserve the channel
+        if length >= self.threshold(node):
+            return True
+        self.num_direct += 1
+        return False
+
+    def update(self, node, collided) -> None:
+        # Fold in the outcome of an attempt towards node, reserved or not
+        if not self.ADAPTIVE:
+            return
+        link = self.links.get(node)
+        if link is None:
+            link = self.links[node] = [self.THRESHOLD, 0.0]
+        link[1] += self.ALPHA * ((1.0 if collided else 0.0) - link[1])
+        if link[1] > self.HIGH:
+            link[0] = max(self.MIN_THRESHOLD, link[0] // 2)
+        elif link[1] < self.LOW:
+            link[0] = min(self.MAX_THRESHOLD, link[0] + self.STEP)
+
+    def summary(self) -> str:
+        # "node:threshold" for every neighbour adapted so far
+        return " ".join(f"{node}:{self.links[node][0]}" for node in sorted(self.links))
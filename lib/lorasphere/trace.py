@@ -0,0 +1,138 @@
+"""
+Event trace
+###########
+Records what the MAC does as fixed-size binary events in a ring allocated
+once, instead of formatting a log line at every step. Recording an event
+packs 10 bytes in place: no string is built and nothing is written to USB
+serial, so it is cheap enough for the gap between an RTS and its CTS.
+
+The node prints the ring in bulk while it is idle, as lines of
+
+    TRACE <node> <events lost> <hex of events, oldest first>
+
+and tools/trace_decode.py turns a capture of the serial console (or of
+`python -m sim -v`) back into a table of events per node.
+
+Each event is, little-endian: uptime in ms (4 B), event type, peer, packet_id
+(or frame count), RSSI in dBm (signed), SNR in quarter dB (signed) and the
+result code of the step.
+"""
+
+import struct
+import time
+from binascii import hexlify, unhexlify
+
+EVENT_FORMAT = "<IBBBbbB"
+EVENT_LEN = struct.calcsize(EVENT_FORMAT)
+
+# Event types: the steps of the RTS/CTS state machine, then what it overhears
+# and gives up on
+SEND_RTS = 1
+WAIT_CTS = 2
+SEND_MSG = 3
+WAIT_ACK = 4
+WAIT_RTS = 5
+SEND_CTS = 6
+RECV_MSG = 7
+SEND_ACK = 8
+NAV = 9
+HELLO = 10
+DROP = 11
+
+EVENT_NAMES = {
+    SEND_RTS: "send_rts",
+    WAIT_CTS: "wait_cts",
+    SEND_MSG: "send_msg",
+    WAIT_ACK: "wait_ack",
+    WAIT_RTS: "wait_rts",
+    SEND_CTS: "send_cts",
+    RECV_MSG: "recv_msg",
+    SEND_ACK: "send_ack",
+    NAV: "nav",
+    HELLO: "hello",
+    DROP: "drop",
+}
+
+# Events per printed line, so a line stays a few hundred characters
+LINE_EVENTS = 32
+
+NO_PEER = 0xFF
+
+
+def _clamp(value, low, high) -> int:
+    return low if value < low else high if value > high else int(value)
+
+
+class Tracer:
+    def __init__(self, node, capacity=256):
+        self.node = node
+        self.CAPACITY = capacity  # Events held before the oldest is overwritten
+
+        self.events = bytearray(capacity * EVENT_LEN)
+        self.view = memoryview(self.events)
+
+        # Next slot to write, and events held since the last flush
+        self.head = 0
+        self.count = 0
+
+        self.num_recorded = 0
+        self.num_lost = 0
+        self.lost = 0  # Lost since the last flush
+
+    def record(self, event, peer=NO_PEER, packet_id=0, result=0, rssi=0, snr=0) -> None:
+        struct.pack_into(EVENT_FORMAT, self.events, self.head * EVENT_LEN,
+                         int(time.monotonic() * 1000) & 0xFFFFFFFF, event, peer & 0xFF, packet_id & 0xFF,
+                         _clamp(rssi, -128, 127), _clamp(snr * 4, -128, 127), result & 0xFF)
+        self.head = (self.head + 1) % self.CAPACITY
+        self.num_recorded += 1
+        if self.count < self.CAPACITY:
+            self.count += 1
+        else:
+            # The ring was full: we just overwrote the oldest event
+            self.num_lost += 1
+            self.lost += 1
+
+    def due(self) -> bool:
+        # Whether the ring is half full, so a flush now keeps it from wrapping
+        return self.count * 2 >= self.CAPACITY
+
+    def flush(self) -> None:
+        # Print the events held, oldest first, and empty the ring
+        start = (self.head - self.count) % self.CAPACITY
+        lost = self.lost
+        while self.count:
+            n = min(self.count, LINE_EVENTS, self.CAPACITY - start)
+            chunk = self.view[start * EVENT_LEN:(start + n) * EVENT_LEN]
+            print(f"TRACE {self.node} {lost} {hexlify(chunk).decode()}")
+            lost = 0
+            start = (start + n) % self.CAPACITY
+            self.count -= n
+        self.lost = 0
+
+    def summary(self) -> str:
+        return f"trace:{self.num_recorded}/trace_lost:{self.num_lost}"
+
+
+def decode(data) -> list:
+    # The events in the bytes of a TRACE line, as tuples of (uptime in ms,
+    # event type, peer, packet_id, RSSI, SNR in dB, result)
+    events = []
+    for offset in range(0, len(data) - EVENT_LEN + 1, EVENT_LEN):
+        t, event, peer, packet_id, rssi, snr, result = struct.unpack_from(EVENT_FORMAT, data, offset)
+        events.append((t, event, peer, packet_id, rssi, snr / 4, result))
+    return events
+
+
+def decode_line(line):
+    # (node, events lost, events) of a TRACE line, or None if it is not one.
+    # Anything before TRACE, such as a timestamp, is skipped.
+    fields = line.split()
+    if "TRACE" not in fields:
+        return None
+    fields = fields[fields.index("TRACE") + 1:]
+    if len(fields) != 3:
+        return None
+    try:
+        return int(fields[0]), int(fields[1]), decode(unhexlify(fields[2]))
+    except ValueError:
+        return None
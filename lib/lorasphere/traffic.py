@@ -0,0 +1,250 @@
+"""
+Offered load
+############
+Traffic sources that decide when the application has a message to send, and
+the per-destination transmit queues they feed. A node transmits only while a
+queue holds something and listens otherwise, so the load on the channel is set
+by the source rather than by a coin flip.
+
+Sources:
+    poisson   exponential gaps at RATE messages per second
+    periodic  one message every 1 / RATE seconds, from a random phase
+    onoff     Poisson at RATE during exponential ON periods, silent in between
+    trace     replays a file of "seconds,destination" lines from boot
+
+Every destination has its own bounded FIFO. The MAC is offered the oldest
+message of the next queue, round robin, whose destination can take a frame
+right now, so one peer that is out of range or has a full ARQ window does not
+hold up the messages behind it for everyone else.
+"""
+
+import math
+import random
+import time
+
+# Source kinds
+POISSON = "poisson"
+PERIODIC = "periodic"
+ONOFF = "onoff"
+TRACE = "trace"
+
+
+def exponential(rate) -> float:
+    # CircuitPython's random has no expovariate
+    return -math.log(1.0 - random.random()) / rate
+
+
+class PoissonSource:
+    def __init__(self, rate):
+        self.RATE = rate
+        self.next_time = time.monotonic() + exponential(rate)
+
+    def arrivals(self) -> list:
+        # Destinations of the messages generated since the last call; None
+        # lets the caller pick one
+        now = time.monotonic()
+        arrivals = []
+        while self.next_time <= now:
+            arrivals.append(None)
+            self.next_time += self.gap()
+        return arrivals
+
+    def gap(self) -> float:
+        return exponential(self.RATE)
+
+    def until_next(self) -> float:
+        # Seconds until the next message, or None if no more will come
+        return max(0, self.next_time - time.monotonic())
+
+
+class PeriodicSource(PoissonSource):
+    def __init__(self, rate):
+        # Random phase, so boards that boot together do not send together
+        self.RATE = rate
+        self.next_time = time.monotonic() + random.uniform(0, 1 / rate)
+
+    def gap(self) -> float:
+        return 1 / self.RATE
+
+
+class OnOffSource(PoissonSource):
+    def __init__(self, rate, mean_on=10.0, mean_off=30.0):
+        self.RATE = rate
+        self.MEAN_ON = mean_on    # Mean length of a burst, in seconds
+        self.MEAN_OFF = mean_off  # Mean silence between bursts, in seconds
+
+        # Start silent, so boards that boot together do not burst together
+        now = time.monotonic()
+        self.on_until = now
+        self.next_time = now
+        self.next_time += self.gap()
+
+    def gap(self) -> float:
+        # Time from the last arrival to the next one: Poisson within the
+        # current burst, skipping any silences it runs past
+        arrival = self.next_time + exponential(self.RATE)
+        while arrival > self.on_until:
+            on_start = self.on_until + exponential(1 / self.MEAN_OFF)
+            self.on_until = on_start + exponential(1 / self.MEAN_ON)
+            arrival = on_start + exponential(self.RATE)
+        return arrival - self.next_time
+
+
+class TraceSource:
+    def __init__(self, path):
+        # (seconds after boot, destination) for every line of the trace;
+        # a destination of "*" or nothing lets the caller pick one
+        self.events = []
+        with open(path) as trace:
+            for line in trace:
+                fields = line.split("#")[0].split(",")
+                if not fields[0].strip():
+                    continue
+                dest = fields[1].strip() if len(fields) > 1 else ""
+                self.events.append((float(fields[0]), int(dest) if dest not in ("", "*") else None))
+        self.events.sort(key=lambda event: event[0])
+        self.start = time.monotonic()
+        self.index = 0
+
+    def arrivals(self) -> list:
+        now = time.monotonic() - self.start
+        arrivals = []
+        while self.index < len(self.events) and self.events[self.index][0] <= now:
+            arrivals.append(self.events[self.index][1])
+            self.index += 1
+        return arrivals
+
+    def until_next(self) -> float:
+        if self.index >= len(self.events):
+            return None
+        return max(0, self.start + self.events[self.index][0] - time.monotonic())
+
+
+def make_source(kind, rate, trace=None, mean_on=10.0, mean_off=30.0):
+    if kind == POISSON:
+        return PoissonSource(rate)
+    if kind == PERIODIC:
+        return PeriodicSource(rate)
+    if kind == ONOFF:
+        return OnOffSource(rate, mean_on, mean_off)
+    if kind == TRACE:
+        return TraceSource(trace)
+    raise ValueError(f"Unknown traffic source {kind}")
+
+
+class TxQueues:
+    # Bounded FIFO of messages waiting for each destination
+
+    def __init__(self, queue_limit=16):
+        self.QUEUE_LIMIT = queue_limit
+
+        # dest -> [[enqueue time, payload], ...], oldest first
+        self.queues = {}
+
+        # dest -> [messages served, total sojourn, longest sojourn]
+        self.sojourn = {}
+
+        # Round-robin position among the destinations
+        self.turn = 0
+
+        self.num_offered = 0
+        self.num_dropped = 0
+
+    def push(self, dest, payload) -> bool:
+        # Queue a message. Returns False, dropping it, if dest's queue is full.
+        self.num_offered += 1
+        queue = self.queues.setdefault(dest, [])
+        if len(queue) >= self.QUEUE_LIMIT:
+            self.num_dropped += 1
+            return False
+        queue.append([time.monotonic(), payload])
+        return True
+
+    def depth(self, dest=None) -> int:
+        # Messages waiting for dest, or for everyone
+        if dest is not None:
+            return len(self.queues.get(dest, []))
+        return sum(len(queue) for queue in self.queues.values())
+
+    def next_dest(self, ready=None):
+        # The next destination, round robin, with messages waiting and for
+        # which ready(dest) holds, or None. Skipping the ones that are not
+        # ready keeps a blocked head of line from stalling the others.
+        dests = sorted(dest for dest, queue in self.queues.items() if queue)
+        for i in range(len(dests)):
+            dest = dests[(self.turn + i) % len(dests)]
+            if ready is None or ready(dest):
+                self.turn = (self.turn + i + 1) % len(dests)
+                return dest
+        return None
+
+    def pop(self, dest, count=1) -> list:
+        # Hand the oldest count messages for dest to the MAC, recording how
+        # long each of them waited
+        queue = self.queues.get(dest, [])
+        now = time.monotonic()
+        stats = self.sojourn.setdefault(dest, [0, 0, 0])
+        payloads = []
+        while queue and len(payloads) < count:
+            enqueued, payload = queue.pop(0)
+            stats[0] += 1
+            stats[1] += now - enqueued
+            stats[2] = max(stats[2], now - enqueued)
+            payloads.append(payload)
+        return payloads
+
+    def drop(self, dest) -> None:
+        # Give up on everything waiting for dest
+        self.num_dropped += len(self.queues.pop(dest, []))
+
+    def summary(self) -> str:
+        # "dest:depth@mean/max sojourn" for every destination, then drops
+        queues = " ".join(f"{dest}:{self.depth(dest)}@{stats[1] / stats[0]:.2f}/{stats[2]:.2f}s"
+                          if stats[0] else f"{dest}:{self.depth(dest)}@NA"
+                          for dest, stats in ((dest, self.sojourn.get(dest, [0, 0, 0]))
+                                              for dest in sorted(set(self.queues) | set(self.sojourn))))
+        return f"queues:[{queues}]/offered:{self.num_offered}/qdrop:{self.num_dropped}"
+
+
+class Traffic:
+    # A source and the transmit queues it feeds
+
+    def __init__(self, kind, rate, queue_limit=16, trace=None, mean_on=10.0, mean_off=30.0):
+        self.source = make_source(kind, rate, trace, mean_on, mean_off)
+        self.queues = TxQueues(queue_limit)
+
+    def generate(self, destinations, payload) -> int:
+        # Queue the messages generated since the last call, each for the
+        # destination the source chose or a random one of destinations, with
+        # payload() as its body. Messages for nodes no longer among the
+        # destinations are dropped. Returns how many were generated.
+        for dest in list(self.queues.queues):
+            if dest not in destinations:
+                self.queues.drop(dest)
+
+        arrivals = self.source.arrivals()
+        for dest in arrivals:
+            if dest is None and destinations:
+                dest = random.choice(destinations)
+            if dest not in destinations:
+                self.queues.num_offered += 1
+                self.queues.num_dropped += 1
+                continue
+            self.queues.push(dest, payload())
+        return len(arrivals)
+
+    def until_next(self) -> float:
+        # Seconds until the source generates its next message, or None
+        return self.source.until_next()
+
+    def next_dest(self, ready=None):
+        return self.queues.next_dest(ready)
+
+    def pop(self, dest, count=1) -> list:
+        return self.queues.pop(dest, count)
+
+    def pending(self) -> int:
+        return self.queues.depth()
+
+    def summary(self) -> str:
+        return self.queues.summary()
@@ -0,0 +1,16 @@
+"""
+Host-side discrete-event simulator for the LoRaSPHERE node variants.
+
+Runs the unmodified CircuitPython node classes and code.py main loops under
+CPython against a simulated RFM9x, a shared LoRa channel and a virtual clock.
+"""
+
+import os
+import sys
+
+# The simulator shares lib/lorasphere (e.g. the time-on-air model) with the nodes
+_LIB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+if _LIB_DIR not in sys.path:
+    sys.path.append(_LIB_DIR)
+
+from .simulator import Simulator
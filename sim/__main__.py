@@ -0,0 +1,47 @@
+"""
+Command line entry point:
+
+    python -m sim RTS_CTS --nodes 50 --duration 300 --seed 1
+"""
+
+import argparse
+import ast
+
+from .simulator import Simulator
+
+
+def parse_setting(text):
+    # NAME=VALUE, VALUE parsed as a Python literal when possible
+    name, _, value = text.partition("=")
+    try:
+        return name, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return name, value
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m sim", description=__doc__.split("\n\n")[0])
+    parser.add_argument("variant", help="directory holding code.py, e.g. RTS_CTS, Aloha or FDMA")
+    parser.add_argument("-n", "--nodes", type=int, default=4, help="number of simulated boards")
+    parser.add_argument("-d", "--duration", type=float, default=60.0, help="simulated seconds")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("--area", type=float, default=100.0,
+                        help="side of the square the boards are placed in, metres")
+    parser.add_argument("--path-loss-exponent", type=float, default=2.7)
+    parser.add_argument("--shadowing", type=float, default=0.0, help="per-frame shadowing sigma, dB")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a proj_config value on every board")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show print() output of every board")
+    parser.add_argument("--log-level", type=int, default=100,
+                        help="show adafruit_logging records at or above this level (10=DEBUG)")
+    args = parser.parse_args()
+
+    sim = Simulator(args.variant, num_nodes=args.nodes, duration=args.duration, seed=args.seed,
+                    area=args.area, config=dict(parse_setting(s) for s in args.set),
+                    verbose=args.verbose, log_level=args.log_level,
+                    path_loss_exponent=args.path_loss_exponent, shadowing_db=args.shadowing)
+    sim.run().report()
+
+
+if __name__ == "__main__":
+    main()
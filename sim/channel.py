@@ -0,0 +1,171 @@
+"""
+Shared LoRa channel
+###################
+Tracks every transmission in flight, decides which radios lock onto it and
+whether overlapping transmissions on the same frequency destroy it.
+"""
+
+import math
+
+from lorasphere.airtime import time_on_air
+
+# Receiver sensitivity at 125 kHz (RFM95 datasheet), dBm per spreading factor
+SENSITIVITY_DBM = {6: -118.0, 7: -123.0, 8: -126.0, 9: -129.0, 10: -132.0, 11: -134.5, 12: -137.0}
+
+# Co-SF frames survive interference only if they are this much stronger
+CAPTURE_THRESHOLD_DB = 6.0
+
+# Frames on a different SF survive unless the interferer is this much stronger
+CROSS_SF_REJECTION_DB = 16.0
+
+NOISE_FIGURE_DB = 6.0
+
+
+class Transmission:
+    def __init__(self, radio, frame, start, end):
+        self.radio = radio
+        self.frame = bytes(frame)
+        self.start = start
+        self.end = end
+        self.frequency = radio.frequency_mhz
+        self.spreading_factor = radio.spreading_factor
+        self.bandwidth = radio.signal_bandwidth
+        self.tx_power = radio.tx_power
+        self.aborted = False
+
+
+class Channel:
+    def __init__(self, clock, rng, path_loss_exponent=2.7, ref_loss_db=40.0, shadowing_db=0.0):
+        self.clock = clock
+        self.rng = rng
+        self.path_loss_exponent = path_loss_exponent
+        self.ref_loss_db = ref_loss_db
+        self.shadowing_db = shadowing_db
+
+        self.radios = []
+        self._recent = []
+        self._max_airtime = 0.0
+
+        # Channel-wide counters
+        self.num_tx = 0
+        self.num_rx_ok = 0
+        self.num_collided = 0
+        self.num_missed = 0
+        self.airtime = {}
+
+    def attach(self, radio) -> None:
+        self.radios.append(radio)
+
+    # ---- Propagation ----
+
+    def rx_power(self, tx, radio) -> float:
+        sx, sy = tx.radio.position
+        rx, ry = radio.position
+        d = max(math.hypot(sx - rx, sy - ry), 1.0)
+        loss = self.ref_loss_db + 10 * self.path_loss_exponent * math.log10(d)
+        if self.shadowing_db:
+            loss += self.rng.gauss(0, self.shadowing_db)
+        return tx.tx_power - loss
+
+    @staticmethod
+    def noise_floor(bandwidth) -> float:
+        return -174.0 + 10 * math.log10(bandwidth) + NOISE_FIGURE_DB
+
+    @staticmethod
+    def sensitivity(spreading_factor, bandwidth) -> float:
+        return SENSITIVITY_DBM[spreading_factor] + 10 * math.log10(bandwidth / 125000)
+
+    # ---- Transmissions ----
+
+    def start_tx(self, radio, frame) -> Transmission:
+        now = self.clock.now
+        airtime = time_on_air(len(frame), radio.spreading_factor, radio.signal_bandwidth,
+                              radio.coding_rate, radio.preamble_length, radio.enable_crc)
+        tx = Transmission(radio, frame, now, now + airtime)
+
+        self.num_tx += 1
+        self.airtime[tx.frequency] = self.airtime.get(tx.frequency, 0.0) + airtime
+        self._max_airtime = max(self._max_airtime, airtime)
+        self._recent = [t for t in self._recent if t.end > now - self._max_airtime]
+        self._recent.append(tx)
+
+        # Radios listening on the same channel and SF lock onto the preamble
+        for other in self.radios:
+            if other is radio or not other.receiving:
+                continue
+            if (other.frequency_mhz != tx.frequency
+                    or other.spreading_factor != tx.spreading_factor
+                    or other.signal_bandwidth != tx.bandwidth):
+                continue
+
+            power = self.rx_power(tx, other)
+            if power < self.sensitivity(tx.spreading_factor, tx.bandwidth):
+                continue
+
+            if other.rx_lock is None:
+                other.rx_lock = (tx, power)
+            else:
+                self.num_missed += 1
+
+        self.clock.call_at(tx.end, self._end_tx, tx)
+        return tx
+
+    def activity(self, radio, start, end) -> bool:
+        # Channel activity detection: a LoRa signal at the radio's frequency,
+        # SF and bandwidth, above sensitivity, on air at some point in
+        # [start, end]
+        for tx in self._recent:
+            if tx.radio is radio or tx.aborted or tx.end <= start or tx.start >= end:
+                continue
+            if (tx.frequency != radio.frequency_mhz
+                    or tx.spreading_factor != radio.spreading_factor
+                    or tx.bandwidth != radio.signal_bandwidth):
+                continue
+            if self.rx_power(tx, radio) >= self.sensitivity(tx.spreading_factor, tx.bandwidth):
+                return True
+        return False
+
+    def abort_tx(self, tx) -> None:
+        # Transmitter left TX mode early: nobody receives the truncated frame
+        tx.aborted = True
+        tx.end = self.clock.now
+        for other in self.radios:
+            if other.rx_lock is not None and other.rx_lock[0] is tx:
+                other.rx_lock = None
+
+    def _end_tx(self, tx) -> None:
+        if tx.aborted:
+            return
+        tx.radio._tx_finished(tx)
+
+        for other in self.radios:
+            if other.rx_lock is None or other.rx_lock[0] is not tx:
+                continue
+            power = other.rx_lock[1]
+            other.rx_lock = None
+
+            if self._corrupted(tx, other, power):
+                self.num_collided += 1
+                other._rx_finished(tx, power, ok=False)
+            else:
+                self.num_rx_ok += 1
+                snr = power - self.noise_floor(tx.bandwidth)
+                other._rx_finished(tx, power, ok=True, snr=snr)
+
+    def _corrupted(self, tx, radio, power) -> bool:
+        # Check every transmission that overlapped this one in time
+        for other in self._recent:
+            if other is tx or other.frequency != tx.frequency:
+                continue
+            if other.start >= tx.end or other.end <= tx.start:
+                continue
+            if other.radio is radio:
+                return True
+
+            interference = self.rx_power(other, radio)
+            if other.spreading_factor == tx.spreading_factor:
+                if power - interference < CAPTURE_THRESHOLD_DB:
+                    return True
+            elif interference - power > CROSS_SF_REJECTION_DB:
+                return True
+        return False
@@ -0,0 +1,175 @@
+"""
+Virtual clock for the LoRa channel simulator
+############################################
+Every simulated board runs its unmodified CircuitPython code in its own
+thread, but only one thread ever runs at a time. A board gives control back
+to the scheduler whenever it sleeps or waits on the radio, and the scheduler
+jumps the clock straight to the next pending event.
+"""
+
+import heapq
+import threading
+import types
+
+
+def _signal():
+    # Binary semaphore starting at zero. A bare lock is several times faster
+    # than threading.Semaphore, and every context switch goes through one.
+    lock = threading.Lock()
+    lock.acquire()
+    return lock
+
+
+class SimulationEnd(BaseException):
+    # Raised inside a board thread to unwind it when the run is over.
+    # BaseException so the `except Exception` blocks in node code let it pass.
+    pass
+
+
+class Process:
+    # One simulated board (or any other blocking actor) driven by the clock
+
+    def __init__(self, clock, name, target):
+        self.clock = clock
+        self.name = name
+        self.target = target
+
+        self.done = False
+        self.killed = False
+        self.waiting = False
+        self.wakeable = False
+        self.error = None
+
+        # Incremented on every reschedule so stale wake-ups are ignored
+        self._token = 0
+        self._resume = _signal()
+        self.thread = threading.Thread(target=self._main, name=name, daemon=True)
+
+    def _main(self):
+        self._resume.acquire()
+        try:
+            if not self.killed:
+                self.target()
+        except SimulationEnd:
+            pass
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done = True
+            self.clock._back.release()
+
+
+class VirtualClock:
+    # Discrete-event scheduler: a heap of (time, seq, callback, args)
+
+    def __init__(self):
+        self.now = 0.0
+        self.current = None
+        self.processes = []
+
+        self._queue = []
+        self._seq = 0
+        self._back = _signal()
+
+    def call_at(self, when, fn, *args) -> None:
+        # Schedule fn(*args) to run on the scheduler thread at `when`
+        self._seq += 1
+        heapq.heappush(self._queue, (max(when, self.now), self._seq, fn, args))
+
+    def call_later(self, delay, fn, *args) -> None:
+        self.call_at(self.now + delay, fn, *args)
+
+    def spawn(self, name, target, at=0.0) -> Process:
+        # Create a process that starts running target() at time `at`
+        proc = Process(self, name, target)
+        self.processes.append(proc)
+        proc.thread.start()
+        self._schedule(proc, at)
+        return proc
+
+    def _schedule(self, proc, when) -> None:
+        proc._token += 1
+        self.call_at(when, self._resume, proc, proc._token)
+
+    def _resume(self, proc, token) -> None:
+        if proc.done or token != proc._token:
+            return
+
+        # Hand the baton to the process and block until it yields back
+        self.current = proc
+        proc._resume.release()
+        self._back.acquire()
+        self.current = None
+
+    def run(self, until) -> None:
+        # Process events in time order until the clock reaches `until`
+        while self._queue and self._queue[0][0] <= until:
+            when, _, fn, args = heapq.heappop(self._queue)
+            self.now = when
+            fn(*args)
+        self.now = until
+
+        # Unwind every board thread that is still alive
+        for proc in self.processes:
+            if proc.done:
+                continue
+            proc.killed = True
+            proc._resume.release()
+            self._back.acquire()
+
+    # ---- Called from inside a process thread ----
+
+    def wait(self, deadline, wakeable=False) -> None:
+        # Block the current process until `deadline`, or an earlier wake()
+        # when `wakeable` (radio waits are, plain sleeps are not)
+        proc = self.current
+        if proc is None:
+            raise RuntimeError("Blocking call made outside of a simulated board")
+
+        self._schedule(proc, deadline)
+        proc.waiting = True
+        proc.wakeable = wakeable
+        self._back.release()
+        proc._resume.acquire()
+        proc.waiting = False
+        proc.wakeable = False
+
+        if proc.killed:
+            raise SimulationEnd()
+
+    def sleep(self, seconds) -> None:
+        self.wait(self.now + max(seconds, 0))
+
+    def wake(self, proc) -> None:
+        # Bring a waiting process forward to the current time
+        if proc is not None and proc.waiting and proc.wakeable and not proc.done:
+            self._schedule(proc, self.now)
+
+
+class VirtualTime(types.ModuleType):
+    # Stand-in for the `time` module seen by code running on a simulated board
+
+    EPOCH = 1745340000.0  # Arbitrary wall-clock origin for time.time()
+
+    def __init__(self, clock, real_time):
+        super().__init__('time')
+        self._clock = clock
+        self._real = real_time
+
+    def monotonic(self):
+        return self._clock.now
+
+    def monotonic_ns(self):
+        return int(self._clock.now * 1e9)
+
+    def sleep(self, seconds):
+        self._clock.sleep(seconds)
+
+    def time(self):
+        return self.EPOCH + self._clock.now
+
+    def localtime(self, secs=None):
+        return self._real.localtime(self.time() if secs is None else secs)
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
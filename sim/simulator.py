@@ -0,0 +1,222 @@
+"""
+LoRa network simulator
+######################
+Boots one simulated board per node. Each board gets its own `proj_config`
+(with NODE_ID set), its own fresh import of the variant's node module and
+runs the variant's code.py unmodified against the simulated radio, clock and
+board stubs.
+"""
+
+import os
+import random
+import sys
+import time as real_time
+import traceback
+import types
+
+from .channel import Channel
+from .clock import VirtualClock, VirtualTime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs")
+LIB_DIR = os.path.join(REPO_ROOT, "lib")
+
+# RadioHead addresses are one byte and 255 is the broadcast address
+MAX_NODE_IDS = 255
+
+# 125 kHz uplink channels of the US915 band, used to spread FDMA receivers
+US915_CHANNELS = [902.3 + 0.2 * i for i in range(64)]
+US915_SUBBAND = 8
+
+_active = None
+
+
+def current_board():
+    # The board whose code is running right now
+    return _active.clock.current.board
+
+
+def emit_log(level, name, msg):
+    _active.log(level, name, msg)
+
+
+class Board:
+    # Everything the simulator knows about one simulated Feather
+
+    def __init__(self, sim, index, node_id, position):
+        self.sim = sim
+        self.index = index
+        self.node_id = node_id
+        self.position = position
+        self.clock = sim.clock
+        self.channel = sim.channel
+
+        self.process = None
+        self.radio = None
+        self.color = (0, 0, 0)
+        self.namespace = None
+
+    def print(self, *args, sep=" ", end="\n", **kwargs):
+        # Replacement for print() inside this board's code.py
+        if self.sim.verbose:
+            self.sim.out.write(f"[{self.clock.now:10.3f}] [node {self.node_id}] "
+                               + sep.join(str(a) for a in args) + end)
+
+    @property
+    def node(self):
+        return self.namespace.get("node") if self.namespace else None
+
+
+class Simulator:
+    def __init__(self, variant, num_nodes=4, duration=60.0, seed=0, area=100.0,
+                 config=None, start_jitter=1.0, verbose=False, log_level=100,
+                 path_loss_exponent=2.7, shadowing_db=0.0, out=None):
+        self.variant = variant
+        self.variant_dir = os.path.join(REPO_ROOT, variant)
+        if not os.path.isfile(os.path.join(self.variant_dir, "code.py")):
+            raise ValueError(f"{variant} has no code.py")
+
+        self.num_nodes = num_nodes
+        self.duration = duration
+        self.seed = seed
+        self.area = area
+        self.config = config or {}
+        self.start_jitter = start_jitter
+        self.verbose = verbose
+        self.log_level = log_level
+        self.out = out or sys.stdout
+
+        # Separate generators: the boards share the global `random` like the
+        # firmware does, the channel and placement get their own streams
+        self.rng = random.Random(seed)
+        self.clock = VirtualClock()
+        self.channel = Channel(self.clock, random.Random(seed + 1),
+                               path_loss_exponent=path_loss_exponent,
+                               shadowing_db=shadowing_db)
+
+        self.boards = []
+        self.wall_time = 0.0
+
+        with open(os.path.join(self.variant_dir, "code.py")) as f:
+            self._code = compile(f.read(), os.path.join(self.variant_dir, "code.py"), "exec")
+        with open(os.path.join(self.variant_dir, "proj_config.py")) as f:
+            self._config_src = f.read()
+
+        # Modules that must be imported afresh for every board
+        self._board_modules = ["proj_config"] + [
+            name[:-3] for name in os.listdir(self.variant_dir)
+            if name.endswith(".py") and name not in ("code.py", "proj_config.py")
+        ]
+
+    # ---- Setup ----
+
+    def _node_ids(self):
+        return [i % MAX_NODE_IDS for i in range(self.num_nodes)]
+
+    def _make_config(self, node_id):
+        cfg = types.ModuleType("proj_config")
+        exec(self._config_src, cfg.__dict__)
+        cfg.NODE_ID = node_id
+
+        # FDMA: one receive channel per board, up to a US915 sub-band's worth
+        if hasattr(cfg, "CHANNELS"):
+            cfg.CHANNELS = US915_CHANNELS[:min(self.num_nodes, US915_SUBBAND)]
+
+        for key, value in self.config.items():
+            setattr(cfg, key, value)
+        return cfg
+
+    def _boot(self, board):
+        # Runs on the board's own thread; no other board runs until this one
+        # blocks, so swapping sys.modules here cannot race
+        sys.modules["proj_config"] = self._make_config(board.node_id)
+        for name in self._board_modules[1:]:
+            sys.modules.pop(name, None)
+
+        board.namespace = {
+            "__name__": "__main__",
+            "__file__": os.path.join(self.variant_dir, "code.py"),
+            "print": board.print,
+        }
+        exec(self._code, board.namespace)
+
+    # ---- Running ----
+
+    def log(self, level, name, msg):
+        if level >= self.log_level:
+            board = self.clock.current.board if self.clock.current else None
+            who = board.node_id if board else "-"
+            self.out.write(f"[{self.clock.now:10.3f}] [node {who}] {name}: {msg}\n")
+
+    def run(self):
+        global _active
+
+        if self.num_nodes > MAX_NODE_IDS:
+            self.out.write(f"warning: {self.num_nodes} nodes share {MAX_NODE_IDS} RadioHead "
+                           "addresses; IDs are reused modulo 255\n")
+
+        # Shared lorasphere modules bind `time` when imported, so they are
+        # imported afresh against this run's virtual clock too
+        lib_modules = [name for name in sys.modules
+                       if name == "lorasphere" or name.startswith("lorasphere.")]
+
+        saved_path = list(sys.path)
+        saved_modules = {name: sys.modules.get(name)
+                         for name in ["time"] + self._board_modules + lib_modules}
+        for name in lib_modules:
+            del sys.modules[name]
+        sys.path[:0] = [STUBS_DIR, self.variant_dir, LIB_DIR]
+        sys.modules["time"] = VirtualTime(self.clock, real_time)
+        random.seed(self.seed)
+
+        _active = self
+        start = real_time.perf_counter()
+        try:
+            for index, node_id in enumerate(self._node_ids()):
+                position = (self.rng.uniform(0, self.area), self.rng.uniform(0, self.area))
+                board = Board(self, index, node_id, position)
+                board.process = self.clock.spawn(
+                    f"node-{index}", lambda b=board: self._boot(b),
+                    at=self.rng.uniform(0, self.start_jitter))
+                board.process.board = board
+                self.boards.append(board)
+
+            self.clock.run(self.duration)
+        finally:
+            self.wall_time = real_time.perf_counter() - start
+            _active = None
+            sys.path[:] = saved_path
+            for name in [name for name in sys.modules if name.startswith("lorasphere.")]:
+                sys.modules.pop(name)
+            for name, module in saved_modules.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+        return self
+
+    # ---- Reporting ----
+
+    def report(self):
+        out = self.out
+        out.write(f"=== {self.variant}: {self.num_nodes} nodes, {self.duration:.0f} s simulated "
+                  f"in {self.wall_time:.1f} s wall ({self.duration / max(self.wall_time, 1e-9):.0f}x) ===\n")
+
+        # get_stats() still reads the virtual clock the board modules imported
+        for board in self.boards:
+            node = board.node
+            stats = "-"
+            if node is not None and hasattr(node, "get_stats"):
+                stats = node.get_stats()
+            out.write(f"node {board.node_id:3d}: {stats}\n")
+            if board.process.error is not None:
+                err = board.process.error
+                frame = traceback.extract_tb(err.__traceback__)[-1]
+                out.write(f"          crashed: {type(err).__name__}: {err} "
+                          f"({os.path.basename(frame.filename)}:{frame.lineno})\n")
+
+        ch = self.channel
+        out.write(f"channel: tx:{ch.num_tx}/rx_ok:{ch.num_rx_ok}/collided:{ch.num_collided}"
+                  f"/missed:{ch.num_missed}\n")
+        for freq in sorted(ch.airtime):
+            out.write(f"  {freq:.1f} MHz: utilisation {ch.airtime[freq] / self.duration * 100:.1f}%\n")
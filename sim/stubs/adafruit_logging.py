@@ -0,0 +1,79 @@
+"""
+Simulated `adafruit_logging` module
+###################################
+Loggers are shared by name across boards, exactly as on the device, so every
+record is attributed to the board whose thread emitted it.
+"""
+
+from sim.simulator import emit_log
+
+NOTSET = 0
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+CRITICAL = 50
+
+LEVELS = [(NOTSET, "NOTSET"), (DEBUG, "DEBUG"), (INFO, "INFO"),
+          (WARNING, "WARNING"), (ERROR, "ERROR"), (CRITICAL, "CRITICAL")]
+
+_loggers = {}
+
+
+class Handler:
+    def __init__(self, level=NOTSET):
+        self.level = level
+
+    def emit(self, record):
+        pass
+
+
+class StreamHandler(Handler):
+    pass
+
+
+class Logger:
+    def __init__(self, name, level=WARNING):
+        self.name = name
+        self._level = level
+        self._handlers = []
+
+    def setLevel(self, log_level):
+        self._level = log_level
+
+    def getEffectiveLevel(self):
+        return self._level
+
+    def addHandler(self, hdlr):
+        self._handlers.append(hdlr)
+
+    def hasHandlers(self):
+        return bool(self._handlers)
+
+    def log(self, level, msg, *args):
+        if level >= self._level:
+            emit_log(level, self.name, msg % args if args else msg)
+
+    def debug(self, msg, *args):
+        self.log(DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(WARNING, msg, *args)
+
+    def error(self, msg, *args):
+        self.log(ERROR, msg, *args)
+
+    def critical(self, msg, *args):
+        self.log(CRITICAL, msg, *args)
+
+    def exception(self, err):
+        self.log(ERROR, str(err))
+
+
+def getLogger(name=None):
+    if name not in _loggers:
+        _loggers[name] = Logger(name)
+    return _loggers[name]
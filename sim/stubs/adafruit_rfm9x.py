@@ -0,0 +1,434 @@
+"""
+Simulated adafruit_rfm9x
+########################
+Mirrors the public API of the Adafruit RFM9x driver (send, send_with_ack,
+receive, listen/idle/transmit, rx_done/tx_done and the LoRa modem properties)
+on top of a small SX127x register model. Frames go out over the shared
+simulated channel instead of SPI.
+"""
+
+import random
+
+from lorasphere.airtime import symbol_time
+from sim.simulator import current_board
+
+# Operating modes
+SLEEP_MODE = 0b000
+STANDBY_MODE = 0b001
+FS_TX_MODE = 0b010
+TX_MODE = 0b011
+FS_RX_MODE = 0b100
+RX_MODE = 0b101
+CAD_MODE = 0b111
+
+# Registers used by the driver
+_RH_RF95_REG_00_FIFO = 0x00
+_RH_RF95_REG_01_OP_MODE = 0x01
+_RH_RF95_REG_0D_FIFO_ADDR_PTR = 0x0D
+_RH_RF95_REG_0E_FIFO_TX_BASE_ADDR = 0x0E
+_RH_RF95_REG_0F_FIFO_RX_BASE_ADDR = 0x0F
+_RH_RF95_REG_10_FIFO_RX_CURRENT_ADDR = 0x10
+_RH_RF95_REG_12_IRQ_FLAGS = 0x12
+_RH_RF95_REG_13_RX_NB_BYTES = 0x13
+_RH_RF95_REG_19_PKT_SNR_VALUE = 0x19
+_RH_RF95_REG_1A_PKT_RSSI_VALUE = 0x1A
+_RH_RF95_REG_1B_RSSI_VALUE = 0x1B
+_RH_RF95_REG_22_PAYLOAD_LENGTH = 0x22
+_RH_RF95_REG_40_DIO_MAPPING1 = 0x40
+
+# IRQ flag bits
+_RH_RF95_RX_DONE = 0x40
+_RH_RF95_PAYLOAD_CRC_ERROR = 0x20
+_RH_RF95_VALID_HEADER = 0x10
+_RH_RF95_TX_DONE = 0x08
+_RH_RF95_CAD_DONE = 0x04
+_RH_RF95_CAD_DETECTED = 0x01
+
+# RadioHead header
+_RH_BROADCAST_ADDRESS = 0xFF
+_RH_FLAGS_ACK = 0x80
+_RH_FLAGS_RETRY = 0x40
+
+# Packet RSSI register offset for the high frequency port
+_RSSI_OFFSET = 157
+
+# Time spent on SPI transfers and Python overhead before each transmission
+PROCESSING_DELAY = 0.002
+
+# Symbols a channel activity detection listens for before raising CadDone
+CAD_SYMBOLS = 2
+
+
+class RFM9x:
+    def __init__(self, spi, cs, reset, frequency, *, preamble_length=8,
+                 high_power=True, baudrate=5000000, agc=False, crc=True):
+        self._board = current_board()
+        self._clock = self._board.clock
+        self._channel = self._board.channel
+        self.position = self._board.position
+
+        # Register file and FIFO
+        self._regs = bytearray(0x80)
+        self._fifo = bytearray(256)
+        self._mode = STANDBY_MODE
+        self._tx = None
+        self._cad_start = None
+        self.rx_lock = None
+
+        # Modem configuration
+        self._frequency_mhz = frequency
+        self._spreading_factor = 7
+        self._signal_bandwidth = 125000
+        self._coding_rate = 5
+        self.preamble_length = preamble_length
+        self.high_power = high_power
+        self.tx_power = 13
+        self.enable_crc = crc
+        self.low_datarate_optimize = False
+        self.auto_agc = agc
+
+        # Last packet signal quality
+        self._pkt_rssi = -157.0
+        self._pkt_snr = 0.0
+
+        # RadioHead state
+        self.ack_wait = 0.5
+        self.receive_timeout = 0.5
+        self.xmit_timeout = 2.0
+        self.ack_retries = 5
+        self.ack_delay = None
+        self.sequence_number = 0
+        self.seen_ids = bytearray(256)
+        self.node = _RH_BROADCAST_ADDRESS
+        self.destination = _RH_BROADCAST_ADDRESS
+        self.identifier = 0
+        self.flags = 0
+        self.last_rssi = 0.0
+        self.last_snr = 0.0
+        self.crc_error_count = 0
+
+        self._channel.attach(self)
+        self._board.radio = self
+
+    # ---- Register access ----
+
+    def _read_u8(self, address):
+        address &= 0x7F
+        if address == _RH_RF95_REG_00_FIFO:
+            ptr = self._regs[_RH_RF95_REG_0D_FIFO_ADDR_PTR]
+            self._regs[_RH_RF95_REG_0D_FIFO_ADDR_PTR] = (ptr + 1) & 0xFF
+            return self._fifo[ptr]
+        if address == _RH_RF95_REG_01_OP_MODE:
+            return 0x80 | self._mode
+        if address == _RH_RF95_REG_1B_RSSI_VALUE:
+            return self._current_rssi_raw()
+        return self._regs[address]
+
+    def _write_u8(self, address, val):
+        address &= 0x7F
+        val &= 0xFF
+        if address == _RH_RF95_REG_00_FIFO:
+            ptr = self._regs[_RH_RF95_REG_0D_FIFO_ADDR_PTR]
+            self._fifo[ptr] = val
+            self._regs[_RH_RF95_REG_0D_FIFO_ADDR_PTR] = (ptr + 1) & 0xFF
+        elif address == _RH_RF95_REG_01_OP_MODE:
+            self.operation_mode = val & 0b111
+        elif address == _RH_RF95_REG_12_IRQ_FLAGS:
+            # Write one to clear
+            self._regs[address] &= ~val & 0xFF
+        else:
+            self._regs[address] = val
+
+    def _read_into(self, address, buf, length=None):
+        if length is None:
+            length = len(buf)
+        for i in range(length):
+            buf[i] = self._read_u8(address)
+
+    def _write_from(self, address, buf, length=None):
+        if length is None:
+            length = len(buf)
+        for i in range(length):
+            self._write_u8(address, buf[i])
+
+    def _current_rssi_raw(self):
+        # Instantaneous RSSI: strongest signal currently on our channel
+        power = self._channel.noise_floor(self._signal_bandwidth)
+        now = self._clock.now
+        for tx in self._channel._recent:
+            if tx.radio is self or tx.frequency != self._frequency_mhz:
+                continue
+            if tx.start <= now < tx.end:
+                power = max(power, self._channel.rx_power(tx, self))
+        return max(0, min(255, int(power + _RSSI_OFFSET)))
+
+    # ---- Modem configuration ----
+
+    @property
+    def operation_mode(self):
+        return self._mode
+
+    @operation_mode.setter
+    def operation_mode(self, val):
+        old, self._mode = self._mode, val
+        if old == TX_MODE and val != TX_MODE and self._tx is not None:
+            self._channel.abort_tx(self._tx)
+            self._tx = None
+        if val != RX_MODE:
+            self.rx_lock = None
+        if val == TX_MODE and old != TX_MODE:
+            base = self._regs[_RH_RF95_REG_0E_FIFO_TX_BASE_ADDR]
+            length = self._regs[_RH_RF95_REG_22_PAYLOAD_LENGTH]
+            self._tx = self._channel.start_tx(self, self._fifo[base:base + length])
+        if val == CAD_MODE and old != CAD_MODE:
+            self._cad_start = self._clock.now
+            self._clock.call_later(CAD_SYMBOLS * symbol_time(self._spreading_factor, self._signal_bandwidth),
+                                   self._cad_finished, self._cad_start)
+        elif val != CAD_MODE:
+            self._cad_start = None
+
+    @property
+    def dio0_mapping(self):
+        return self._regs[_RH_RF95_REG_40_DIO_MAPPING1] >> 6
+
+    @dio0_mapping.setter
+    def dio0_mapping(self, val):
+        self._regs[_RH_RF95_REG_40_DIO_MAPPING1] = (val & 0b11) << 6
+
+    @property
+    def frequency_mhz(self):
+        return self._frequency_mhz
+
+    @frequency_mhz.setter
+    def frequency_mhz(self, val):
+        if not 240 <= val <= 960:
+            raise RuntimeError("frequency_mhz must be between 240 and 960")
+        self._frequency_mhz = val
+        self.rx_lock = None
+
+    @property
+    def spreading_factor(self):
+        return self._spreading_factor
+
+    @spreading_factor.setter
+    def spreading_factor(self, val):
+        val = min(max(val, 6), 12)
+        self._spreading_factor = val
+        self.low_datarate_optimize = (1 << val) / self._signal_bandwidth > 0.016
+        self.rx_lock = None
+
+    @property
+    def signal_bandwidth(self):
+        return self._signal_bandwidth
+
+    @signal_bandwidth.setter
+    def signal_bandwidth(self, val):
+        self._signal_bandwidth = val
+        self.low_datarate_optimize = (1 << self._spreading_factor) / val > 0.016
+        self.rx_lock = None
+
+    @property
+    def coding_rate(self):
+        return self._coding_rate
+
+    @coding_rate.setter
+    def coding_rate(self, val):
+        self._coding_rate = min(max(val, 5), 8)
+
+    @property
+    def rssi(self):
+        return self._pkt_rssi
+
+    @property
+    def snr(self):
+        return self._pkt_snr
+
+    @property
+    def receiving(self):
+        return self._mode == RX_MODE
+
+    # ---- Mode helpers ----
+
+    def idle(self):
+        self.operation_mode = STANDBY_MODE
+
+    def sleep(self):
+        self.operation_mode = SLEEP_MODE
+
+    def listen(self):
+        self.operation_mode = RX_MODE
+        self.dio0_mapping = 0b00
+
+    def transmit(self):
+        self.operation_mode = TX_MODE
+        self.dio0_mapping = 0b01
+
+    def reset(self):
+        self.idle()
+
+    def tx_done(self):
+        return (self._regs[_RH_RF95_REG_12_IRQ_FLAGS] & _RH_RF95_TX_DONE) >> 3
+
+    def rx_done(self):
+        return (self._regs[_RH_RF95_REG_12_IRQ_FLAGS] & _RH_RF95_RX_DONE) >> 6
+
+    def crc_error(self):
+        return (self._regs[_RH_RF95_REG_12_IRQ_FLAGS] & _RH_RF95_PAYLOAD_CRC_ERROR) >> 5
+
+    # ---- Channel callbacks (scheduler thread) ----
+
+    def _raise_irq(self, flags):
+        self._regs[_RH_RF95_REG_12_IRQ_FLAGS] |= flags
+        self._clock.wake(self._board.process)
+
+    def _tx_finished(self, tx):
+        if tx is not self._tx:
+            return
+        self._tx = None
+        self._mode = STANDBY_MODE
+        self._raise_irq(_RH_RF95_TX_DONE)
+
+    def _cad_finished(self, start):
+        # The chip drops back to standby on its own once CAD is done
+        if self._cad_start != start:
+            return
+        detected = self._channel.activity(self, start, self._clock.now)
+        self._cad_start = None
+        self._mode = STANDBY_MODE
+        self._raise_irq(_RH_RF95_CAD_DONE | (_RH_RF95_CAD_DETECTED if detected else 0))
+
+    def _rx_finished(self, tx, power, ok, snr=0.0):
+        self._pkt_rssi = power
+        if not ok:
+            if self.enable_crc:
+                self._raise_irq(_RH_RF95_RX_DONE | _RH_RF95_PAYLOAD_CRC_ERROR)
+            return
+
+        self._pkt_snr = snr
+        base = self._regs[_RH_RF95_REG_0F_FIFO_RX_BASE_ADDR]
+        for i, b in enumerate(tx.frame):
+            self._fifo[(base + i) & 0xFF] = b
+        self._regs[_RH_RF95_REG_10_FIFO_RX_CURRENT_ADDR] = base
+        self._regs[_RH_RF95_REG_13_RX_NB_BYTES] = len(tx.frame)
+        self._regs[_RH_RF95_REG_19_PKT_SNR_VALUE] = int(snr * 4) & 0xFF
+        self._regs[_RH_RF95_REG_1A_PKT_RSSI_VALUE] = max(0, min(255, int(power + _RSSI_OFFSET)))
+        self._raise_irq(_RH_RF95_RX_DONE | _RH_RF95_VALID_HEADER)
+
+    # ---- Blocking helpers ----
+
+    def _wait_for(self, predicate, timeout):
+        # Equivalent of the driver's busy-wait on an IRQ flag, in virtual time
+        deadline = self._clock.now + timeout
+        while not predicate():
+            if self._clock.now >= deadline:
+                return False
+            self._clock.wait(deadline, wakeable=True)
+        return True
+
+    # ---- RadioHead packet API ----
+
+    def send(self, data, *, keep_listening=False, destination=None, node=None,
+             identifier=None, flags=None):
+        assert 0 < len(data) <= 252
+        self._clock.sleep(PROCESSING_DELAY)
+
+        self.idle()
+        self._write_u8(_RH_RF95_REG_0D_FIFO_ADDR_PTR, 0x00)
+
+        payload = bytearray(4)
+        payload[0] = self.destination if destination is None else destination
+        payload[1] = self.node if node is None else node
+        payload[2] = self.identifier if identifier is None else identifier
+        payload[3] = self.flags if flags is None else flags
+        payload = payload + data
+
+        self._write_from(_RH_RF95_REG_00_FIFO, payload)
+        self._write_u8(_RH_RF95_REG_22_PAYLOAD_LENGTH, len(payload))
+
+        self.transmit()
+        timed_out = not self._wait_for(self.tx_done, self.xmit_timeout)
+
+        if keep_listening:
+            self.listen()
+        else:
+            self.idle()
+        self._write_u8(_RH_RF95_REG_12_IRQ_FLAGS, 0xFF)
+        return not timed_out
+
+    def send_with_ack(self, data):
+        retries_remaining = self.ack_retries if self.ack_retries else 1
+        got_ack = False
+        self.sequence_number = (self.sequence_number + 1) & 0xFF
+
+        while not got_ack and retries_remaining:
+            self.identifier = self.sequence_number
+            self.send(data, keep_listening=True)
+
+            if self.destination == _RH_BROADCAST_ADDRESS:
+                got_ack = True
+            else:
+                ack_packet = self.receive(timeout=self.ack_wait, with_header=True)
+                if ack_packet is not None:
+                    if ack_packet[3] & _RH_FLAGS_ACK:
+                        if ack_packet[2] == self.identifier:
+                            got_ack = True
+                            break
+
+            if not got_ack:
+                self._clock.sleep(self.ack_wait + self.ack_wait * random.random())
+            retries_remaining = retries_remaining - 1
+            self.flags |= _RH_FLAGS_RETRY
+
+        self.flags = 0
+        return got_ack
+
+    def receive(self, *, keep_listening=True, with_header=False, with_ack=False, timeout=None):
+        timed_out = False
+        if timeout is None:
+            timeout = self.receive_timeout
+        if timeout is not None:
+            self.listen()
+            timed_out = not self._wait_for(self.rx_done, timeout)
+
+        packet = None
+        self.last_rssi = self.rssi
+        self.last_snr = self.snr
+        self.idle()
+
+        if not timed_out:
+            if self.enable_crc and self.crc_error():
+                self.crc_error_count += 1
+            else:
+                fifo_length = self._read_u8(_RH_RF95_REG_13_RX_NB_BYTES)
+                if fifo_length > 0:
+                    current_addr = self._read_u8(_RH_RF95_REG_10_FIFO_RX_CURRENT_ADDR)
+                    self._write_u8(_RH_RF95_REG_0D_FIFO_ADDR_PTR, current_addr)
+                    packet = bytearray(fifo_length)
+                    self._read_into(_RH_RF95_REG_00_FIFO, packet)
+
+                if fifo_length < 5:
+                    packet = None
+                elif (self.node != _RH_BROADCAST_ADDRESS
+                        and packet[0] != self.node
+                        and packet[0] != _RH_BROADCAST_ADDRESS):
+                    packet = None
+                elif (with_ack and (packet[3] & _RH_FLAGS_ACK) == 0
+                        and packet[0] != _RH_BROADCAST_ADDRESS):
+                    if self.ack_delay is not None:
+                        self._clock.sleep(self.ack_delay)
+                    self.send(b"!", destination=packet[1], node=packet[0],
+                              identifier=packet[2], flags=(packet[3] | _RH_FLAGS_ACK))
+                    if self.seen_ids[packet[1]] == packet[2] and packet[3] & _RH_FLAGS_RETRY:
+                        packet = None
+                    else:
+                        self.seen_ids[packet[1]] = packet[2]
+
+                if not with_header and packet is not None:
+                    packet = packet[4:]
+            self._write_u8(_RH_RF95_REG_12_IRQ_FLAGS, 0xFF)
+
+        if keep_listening:
+            self.listen()
+        else:
+            self.idle()
+        return packet
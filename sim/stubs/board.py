@@ -0,0 +1,23 @@
+"""
+Simulated `board` module for the Adafruit Feather RP2040 RFM
+"""
+
+RFM_CS = "RFM_CS"
+RFM_RST = "RFM_RST"
+NEOPIXEL = "NEOPIXEL"
+LED = "LED"
+
+
+class _SPI:
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def configure(self, **kwargs):
+        pass
+
+
+def SPI():
+    return _SPI()
@@ -0,0 +1,35 @@
+"""
+Simulated `neopixel` module: remembers the colour each board shows
+"""
+
+from sim.simulator import current_board
+
+
+class NeoPixel:
+    def __init__(self, pin, n, *, bpp=3, brightness=1.0, auto_write=True, pixel_order=None):
+        self.pin = pin
+        self.n = n
+        self.brightness = brightness
+        self.auto_write = auto_write
+        self._pixels = [(0, 0, 0)] * n
+        self._board = current_board()
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, index):
+        return self._pixels[index]
+
+    def __setitem__(self, index, color):
+        self._pixels[index] = tuple(color)
+        self._board.color = self._pixels[0]
+
+    def fill(self, color):
+        self._pixels = [tuple(color)] * self.n
+        self._board.color = self._pixels[0]
+
+    def show(self):
+        pass
+
+    def deinit(self):
+        pass
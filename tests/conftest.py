@@ -0,0 +1,16 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The lorasphere package lives in lib/, as it does on CIRCUITPY
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A time.monotonic() the test moves by hand: clock[0] is the time now
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
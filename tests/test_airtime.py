@@ -0,0 +1,40 @@
+import pytest
+
+from lorasphere.airtime import RH_HEADER_LEN, frame_airtime, symbol_time, time_on_air
+
+
+class Radio:
+    # The modem settings frame_airtime() reads
+    spreading_factor = 7
+    signal_bandwidth = 125000
+    coding_rate = 5
+    preamble_length = 8
+    enable_crc = True
+
+
+def test_symbol_time():
+    assert symbol_time(7, 125000) == pytest.approx(0.001024)
+    assert symbol_time(12, 125000) == pytest.approx(0.032768)
+
+
+def test_sf7_known_value():
+    # Semtech LoRa calculator: 20 bytes at SF7/125 kHz/4:5, 8 symbol
+    # preamble, explicit header and CRC
+    assert time_on_air(20) == pytest.approx(0.056576)
+
+
+def test_grows_with_length_and_spreading_factor():
+    lengths = [time_on_air(n) for n in range(0, 256, 16)]
+    assert lengths == sorted(lengths)
+    factors = [time_on_air(20, spreading_factor=sf) for sf in range(7, 13)]
+    assert factors == sorted(factors) and len(set(factors)) == len(factors)
+
+
+def test_frame_airtime_adds_the_header():
+    assert frame_airtime(Radio(), 16) == time_on_air(16 + RH_HEADER_LEN)
+
+
+def test_frame_airtime_overrides_radio_settings():
+    radio = Radio()
+    assert frame_airtime(radio, 16, spreading_factor=9) == time_on_air(16 + RH_HEADER_LEN, 9)
+    assert frame_airtime(radio, 16, coding_rate=8) == time_on_air(16 + RH_HEADER_LEN, 7, coding_rate=8)
@@ -0,0 +1,222 @@
+import pytest
+
+from lorasphere import blockack
+from lorasphere.arq import Arq, ArqReceiver, ArqSender
+
+
+def send_all(sender, deadline=0):
+    # Hand out every frame due and mark it sent
+    frames = sender.due()
+    for packet_id, payload in frames:
+        sender.sent(packet_id, deadline)
+    return frames
+
+
+def test_window_limits_frames_in_flight():
+    sender = ArqSender(window=4)
+    for i in range(6):
+        assert sender.push(bytes([i]))
+
+    frames = send_all(sender, deadline=1e9)
+    assert [packet_id for packet_id, _ in frames] == [0, 1, 2, 3]
+    assert sender.in_flight() == 4
+    assert send_all(sender) == []
+
+    # Acknowledging the oldest frame lets one more in
+    assert sender.ack([0]) == [(0, b'\x00')]
+    assert [packet_id for packet_id, _ in send_all(sender)] == [4]
+
+
+def test_queue_limit():
+    sender = ArqSender(queue_limit=2)
+    assert sender.push(b'a') and sender.push(b'b')
+    assert not sender.push(b'c')
+
+
+def test_window_bounded_by_sack_bitmap():
+    with pytest.raises(ValueError):
+        ArqSender(window=blockack.WINDOW + 1)
+
+
+def test_retry_limit_drops_frame():
+    sender = ArqSender(retry_limit=1)
+    sender.push(b'a')
+    for _ in range(2):
+        assert send_all(sender) == [(0, b'a')]
+    assert send_all(sender) == []
+    assert sender.num_dropped == 1 and sender.num_retx == 1
+    assert sender.pending() == 0
+
+
+def test_receiver_reorders_and_counts_duplicates():
+    receiver = ArqReceiver(window=4)
+    assert receiver.receive(1, b'b') == []
+    assert receiver.receive(0, b'a') == [b'a', b'b']
+    assert receiver.receive(0, b'a') == []
+    assert receiver.num_dup == 1
+
+
+def test_receiver_skips_frames_the_sender_gave_up_on():
+    # Frame 5 lands a full window past 0..3: the window moves to end there
+    receiver = ArqReceiver(window=4)
+    receiver.receive(1, b'b')
+    assert receiver.receive(5, b'f') == [b'b']
+    assert receiver.expected == 2
+
+
+def test_sack_wraps_past_255():
+    # Start both ends just below the wrap so the flight spans 254..1
+    sender, receiver = ArqSender(window=4), ArqReceiver(window=4)
+    sender.base = sender.next_seq = 254
+    receiver.expected = 254
+    for i in range(4):
+        sender.push(bytes([i]))
+    frames = send_all(sender, deadline=1e9)
+    assert [packet_id for packet_id, _ in frames] == [254, 255, 0, 1]
+
+    # 255 is lost: the SACK covers 254 cumulatively and holds 0 and 1
+    for packet_id, payload in frames:
+        if packet_id != 255:
+            receiver.receive(packet_id, payload)
+    start, bitmap = blockack.decode(receiver.sack())
+    assert (start, bitmap) == (255, 0b110)
+
+    acked = sender.sack(start, bitmap)
+    assert sorted(packet_id for packet_id, _ in acked) == [0, 1, 254]
+    assert sender.base == 255
+
+    # Only the lost frame is due again, straight away
+    assert send_all(sender) == [(255, b'\x01')]
+    assert receiver.receive(255, b'\x01') == [b'\x01', b'\x02', b'\x03']
+    assert sender.ack([255]) and sender.pending() == 0
+
+
+def test_stale_sack_only_counts_its_bitmap():
+    sender = ArqSender(window=4)
+    sender.base = sender.next_seq = 10
+    sender.push(b'a')
+    send_all(sender, deadline=1e9)
+    assert sender.sack(200, 0) == []
+    assert sender.pending() == 1
+
+
+def test_arq_keeps_state_per_peer():
+    arq = Arq()
+    arq.sender(2).push(b'a')
+    assert arq.pending() == [2]
+    assert arq.sender(2) is arq.sender(2)
+    assert arq.sender(3).pending() == 0
+
+
+def test_arq_counts_duplicates_over_peers():
+    arq = Arq()
+    for peer in (2, 3):
+        arq.receiver(peer).receive(0, b'a')
+        arq.receiver(peer).receive(0, b'a')
+    assert arq.num_dup() == 2
+
+
+def test_rebooted_sender_is_not_counted_as_duplicates():
+    # Same packet_ids from a new epoch are new frames; a retransmission
+    # within the epoch is a duplicate
+    arq = Arq()
+    for epoch in (1, 2):
+        for packet_id in range(3):
+            assert arq.receiver(5).receive(packet_id, bytes([epoch, 0, packet_id]), syn=True) == [bytes([packet_id])]
+    assert arq.num_dup() == 0
+    arq.receiver(5).receive(2, bytes([2, 0, 2]), syn=True)
+    assert arq.num_dup() == 1
+
+
+def test_due_follows_retransmit_deadlines(clock):
+    arq = Arq()
+    sender = arq.sender(2)
+    assert sender.next_due() is None
+    sender.push(b'a')
+    assert arq.due() == [2]
+    packet_id, payload = sender.due()[0]
+    sender.sent(packet_id, clock[0] + 5)
+    assert arq.due() == [] and arq.next_due() == 5
+    clock[0] += 5
+    assert arq.due() == [2]
+
+
+def test_sack_into_matches_sack():
+    from lorasphere.codec import FrameCodec
+
+    receiver = ArqReceiver(window=4)
+    receiver.receive(1, b'b')
+    assert bytes(receiver.sack_into(FrameCodec().begin()).frame()) == receiver.sack()
+
+
+def test_sender_marks_syn_until_acknowledged():
+    sender = ArqSender()
+    assert sender.syn
+    sender.push(b'a')
+    send_all(sender)
+    sender.ack([0])
+    assert not sender.syn
+    sender.clear()
+    assert sender.syn
+
+
+def test_syn_frame_from_the_past_resyncs_receiver():
+    # A sender that rebooted starts again at packet_id 0
+    receiver = ArqReceiver(window=4)
+    receiver.expected = 50
+
+    assert receiver.receive(0, b'x') == []
+    assert receiver.num_dup == 1
+
+    assert receiver.receive(0, bytes([7, 0]) + b'x', syn=True) == [b'x']
+    assert receiver.num_resync == 1
+    assert receiver.expected == 1
+
+
+def test_rebooted_sender_resyncs_a_window_just_ahead():
+    # The sender delivered 0 and 1, then rebooted and starts again at 0
+    before, after = ArqSender(), ArqSender()
+    after.epoch = (before.epoch + 1) & 0xFF
+    receiver = ArqReceiver(window=4)
+    for sender in (before, after):
+        sender.push(b'a')
+        sender.push(b'b')
+
+    frames = send_all(before)
+    for packet_id, payload in frames:
+        receiver.receive(packet_id, before.syn_header() + payload, syn=True)
+    assert receiver.expected == 2
+
+    # Out of order: the window restarts at the sender's base, not at 1
+    frames = send_all(after)
+    assert receiver.receive(1, after.syn_header() + b'b', syn=True) == []
+    assert receiver.receive(0, after.syn_header() + b'a', syn=True) == [b'a', b'b']
+    assert receiver.num_resync == 1 and receiver.num_dup == 0
+
+
+def test_syn_retransmission_is_still_a_duplicate():
+    sender, receiver = ArqSender(), ArqReceiver(window=4)
+    sender.push(b'a')
+    (packet_id, payload), = send_all(sender)
+    frame = sender.syn_header() + payload
+    assert receiver.receive(packet_id, frame, syn=True) == [b'a']
+    assert receiver.receive(packet_id, frame, syn=True) == []
+    assert receiver.num_dup == 1 and receiver.num_resync == 0
+
+
+def test_clear_starts_a_new_epoch():
+    sender, receiver = ArqSender(), ArqReceiver(window=4)
+    sender.push(b'a')
+    send_all(sender)
+    receiver.receive(0, sender.syn_header() + b'a', syn=True)
+    sender.ack([0])
+
+    # Everything after 0 is given up on: the next frame restarts the window
+    sender.push(b'b')
+    send_all(sender)
+    sender.clear()
+    sender.push(b'c')
+    (packet_id, payload), = send_all(sender)
+    assert packet_id == 2
+    assert receiver.receive(packet_id, sender.syn_header() + payload, syn=True) == [b'c']
+    assert receiver.num_resync == 1
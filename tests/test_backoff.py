@@ -0,0 +1,44 @@
+import random
+
+from lorasphere.backoff import ContentionWindow
+
+
+def test_window_doubles_per_failure_up_to_cw_max():
+    cw = ContentionWindow(cw_min=4, cw_max=32)
+    windows = []
+    for _ in range(5):
+        windows.append(cw.window(1))
+        cw.failure(1)
+    assert windows == [4, 8, 16, 32, 32]
+
+
+def test_windows_are_per_destination():
+    cw = ContentionWindow()
+    cw.failure(1)
+    assert cw.window(1) == 2 * cw.CW_MIN
+    assert cw.window(2) == cw.CW_MIN
+
+
+def test_success_resets_and_records_retries():
+    cw = ContentionWindow()
+    cw.failure(1)
+    cw.failure(1)
+    cw.success(1)
+    assert cw.window(1) == cw.CW_MIN
+    assert cw.histogram[2] == 1
+
+
+def test_drop_after_retry_limit():
+    cw = ContentionWindow(retry_limit=2)
+    assert not cw.failure(1)
+    assert not cw.failure(1)
+    assert cw.failure(1)
+    assert cw.num_dropped == 1
+    assert cw.window(1) == cw.CW_MIN
+
+
+def test_draw_stays_in_window():
+    random.seed(1)
+    cw = ContentionWindow(cw_min=4)
+    assert all(0 <= cw.draw(3) < 4 for _ in range(100))
+    assert cw.current() == 4
@@ -0,0 +1,17 @@
+from lorasphere import blockack
+
+
+def test_encode_decode_round_trip():
+    body = blockack.encode(250, 0b1000000000000101)
+    assert len(body) == blockack.BLOCK_ACK_LEN
+    assert blockack.decode(body) == (250, 0b1000000000000101)
+
+
+def test_decode_ignores_trailing_bytes():
+    assert blockack.decode(blockack.encode(3, 0xFFFF) + b'\x00') == (3, 0xFFFF)
+
+
+def test_seq_offset_wraps():
+    assert blockack.seq_offset(2, 254) == 4
+    assert blockack.seq_offset(254, 2) == 252
+    assert blockack.seq_offset(9, 9) == 0
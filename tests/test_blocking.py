@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from lorasphere.blocking import Runtime
+
+
+class Radio:
+    # Records what the runtime asks of the driver
+    def __init__(self):
+        self.calls = []
+
+    def receive(self, **kwargs):
+        self.calls.append(("receive", kwargs))
+        return b'\x01\x02\x03\x04body'
+
+    def send(self, data, **kwargs):
+        self.calls.append(("send", data, kwargs))
+        return True
+
+
+def test_run_returns_what_the_coroutine_returns():
+    rt = Runtime(Radio())
+
+    async def mac():
+        await rt.sleep(0)
+        return await rt.receive(0.5)
+
+    assert rt.run(mac()) == b'\x01\x02\x03\x04body'
+    assert rt.radio.calls == [("receive", {"timeout": 0.5, "with_header": True})]
+
+
+def test_send_passes_the_header_fields_on():
+    rt = Runtime(Radio())
+    assert rt.run(rt.send(b'x', destination=3, flags=0x20))
+    assert rt.radio.calls == [("send", b'x', {"destination": 3, "flags": 0x20})]
+
+
+def test_run_refuses_coroutines_that_suspend():
+    async def suspends():
+        await asyncio.sleep(0)
+
+    with pytest.raises(RuntimeError):
+        Runtime(Radio()).run(suspends())
@@ -0,0 +1,52 @@
+from lorasphere.codec import FrameCodec, read_uint
+
+
+def test_build_writes_fields_in_order():
+    codec = FrameCodec()
+    frame = codec.begin(0x12).put_u8(0x1FF).put_uint(0x010203, 3).put(b'ab').frame()
+    assert bytes(frame) == b'\x12\xff\x01\x02\x03ab'
+
+
+def test_begin_reuses_the_buffer():
+    codec = FrameCodec()
+    codec.begin().put(b'long body')
+    buffer = codec.tx
+    assert bytes(codec.begin().put_u8(7).frame()) == b'\x07'
+    assert codec.tx is buffer
+
+
+def test_parse_reads_header_and_body():
+    codec = FrameCodec()
+    packet = bytearray(b'\x05\x02\x09\x20\x07\x01\x02ab')
+    assert codec.parse(packet)
+    assert (codec.dest(), codec.node(), codec.packet_id(), codec.flags()) == (5, 2, 9, 0x20)
+    assert codec.body_len() == 5
+    assert codec.get_u8(0) == 7 and codec.get_uint(1, 2) == 0x0102
+    assert codec.payload(3) == b'ab' and codec.payload(1, 3) == b'\x01\x02'
+
+
+def test_parse_copies_into_one_buffer():
+    codec = FrameCodec()
+    buffer = codec.rx
+    packet = bytearray(b'\x05\x02\x09\x00long body')
+    codec.parse(packet)
+    payload = codec.payload()
+
+    # Neither the packet nor the next frame changes what was copied out
+    packet[4] = ord('L')
+    codec.parse(b'\x05\x02\x0a\x00short')
+    assert payload == b'long body'
+    assert codec.payload() == b'short' and codec.payload(0, 20) == b'short'
+    assert codec.rx is buffer
+
+
+def test_parse_rejects_oversized_packet():
+    assert not FrameCodec().parse(bytes(300))
+
+
+def test_parse_header_only():
+    assert not FrameCodec().parse(b'\xff\x01\x00\x02')
+
+
+def test_read_uint():
+    assert read_uint(b'\x00\x01\x02\x03', 1, 3) == 0x010203
@@ -0,0 +1,64 @@
+import pytest
+
+from lorasphere.blocking import Runtime
+from lorasphere.csma import Csma
+
+
+class Radio:
+    # The modem settings slot_time() reads
+    preamble_length = 8
+    spreading_factor = 7
+    signal_bandwidth = 125000
+
+
+class SensingRuntime:
+    # Reports the channel busy for the first senses given, idle after that,
+    # and records the waits instead of sleeping
+    def __init__(self, *busy, power=-120):
+        self.senses = list(busy)
+        self.power = power
+        self.waits = []
+
+    async def sleep(self, seconds):
+        self.waits.append(seconds)
+
+    async def channel_activity(self):
+        return self.senses.pop(0) if self.senses else False
+
+    async def rssi(self):
+        return self.power
+
+
+def wait_clear(csma, rt):
+    return Runtime(None).run(csma.wait_clear(rt))
+
+
+def test_idle_channel_is_sensed_twice_an_ifs_apart():
+    csma, rt = Csma(Radio(), persistence=1), SensingRuntime()
+    assert wait_clear(csma, rt)
+    assert csma.num_checks == 2
+    assert rt.waits == [csma.IFS]
+
+
+def test_busy_sense_backs_off_within_the_window():
+    csma, rt = Csma(Radio(), persistence=1), SensingRuntime(True)
+    assert wait_clear(csma, rt)
+    assert csma.num_busy == 1
+    assert 1 <= rt.waits[0] / csma.slot_time() <= 4
+
+
+def test_gives_up_after_max_attempts():
+    csma, rt = Csma(Radio(), max_attempts=3), SensingRuntime(*[True] * 3)
+    assert not wait_clear(csma, rt)
+    assert csma.num_busy == 3 and csma.num_gave_up == 1
+
+
+def test_rssi_threshold():
+    csma = Csma(Radio(), method="rssi", rssi_threshold=-100)
+    assert Runtime(None).run(csma.busy(SensingRuntime(power=-90)))
+    assert not Runtime(None).run(csma.busy(SensingRuntime(power=-110)))
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        Csma(Radio(), method="energy")
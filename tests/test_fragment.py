@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from lorasphere.fragment import Fragmenter, Reassembler
+
+
+def test_short_message_travels_whole():
+    payloads = Fragmenter(max_payload=32).split(b'hello')
+    assert payloads == [b'\x00hello']
+    assert Reassembler().receive(1, payloads[0]) == b'hello'
+
+
+def test_split_and_reassemble_out_of_order():
+    message = bytes(range(256)) * 4
+    fragmenter = Fragmenter(max_payload=64)
+    payloads = fragmenter.split(message)
+    assert len(payloads) > 1
+    assert all(len(payload) <= 64 for payload in payloads)
+    assert fragmenter.num_fragmented == 1
+
+    reassembler = Reassembler()
+    random.Random(1).shuffle(payloads)
+    results = [reassembler.receive(7, payload) for payload in payloads]
+    assert results[:-1] == [None] * (len(payloads) - 1)
+    assert results[-1] == message
+    assert reassembler.num_reassembled == 1
+    assert reassembler.memory == 0
+
+
+def test_senders_reassemble_separately():
+    message = b'x' * 100
+    payloads = Fragmenter(max_payload=32).split(message)
+    reassembler = Reassembler()
+    for payload in payloads[:-1]:
+        assert reassembler.receive(1, payload) is None
+    assert reassembler.receive(2, payloads[-1]) is None
+    assert reassembler.receive(1, payloads[-1]) == message
+
+
+def test_message_over_the_limit_is_refused():
+    with pytest.raises(ValueError):
+        Fragmenter(max_payload=32, max_message=64).split(b'x' * 65)
+
+
+def test_truncated_fragment_is_bad():
+    payloads = Fragmenter(max_payload=32).split(b'x' * 100)
+    reassembler = Reassembler()
+    assert reassembler.receive(1, payloads[0][:-1]) is None
+    assert reassembler.num_bad == 1
+
+
+def test_partial_message_times_out(clock):
+    payloads = Fragmenter(max_payload=32).split(b'x' * 100)
+    reassembler = Reassembler(timeout=30)
+    reassembler.receive(1, payloads[0])
+    clock[0] += 31
+    reassembler.expire()
+    assert reassembler.num_timed_out == 1 and reassembler.memory == 0
+
+
+def test_memory_limit_evicts_the_oldest():
+    fragmenter = Fragmenter(max_payload=32)
+    reassembler = Reassembler(memory_limit=250)
+    for sender in (1, 2, 3):
+        reassembler.receive(sender, fragmenter.split(b'x' * 100)[0])
+    assert reassembler.num_evicted == 1 and reassembler.memory == 200
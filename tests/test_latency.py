@@ -0,0 +1,48 @@
+from lorasphere.blocking import Runtime
+from lorasphere.latency import Histogram, StateTimer, timed
+
+
+def test_histogram_buckets():
+    histogram = Histogram()
+    for seconds in (0.001, 0.003, 0.003, 10):
+        histogram.add(seconds)
+    assert histogram.counts[:2] == [1, 2] and histogram.counts[-1] == 1
+    assert histogram.num == 4 and histogram.max == 10
+    assert histogram.summary().startswith("4x2502/10000[")
+
+
+def test_occupancy(clock):
+    timer = StateTimer(("listen", "send_msg"))
+    start = clock[0]
+    clock[0] += 3
+    timer.done("listen", start)
+    clock[0] += 1
+    occupancy = timer.occupancy()
+    assert occupancy["listen"] == 0.75 and occupancy["send_msg"] == 0
+    assert occupancy["other"] == 0.25
+
+
+def test_exchange_latency(clock):
+    timer = StateTimer(("listen",))
+    timer.end_exchange()
+    timer.begin_exchange()
+    clock[0] += 0.5
+    timer.end_exchange()
+    assert timer.exchange.num == 1 and timer.exchange.total == 0.5
+
+
+class Node:
+    def __init__(self, clock):
+        self.clock = clock
+        self.timing = StateTimer(("listen",))
+
+    @timed("listen")
+    async def listen_for(self, seconds):
+        self.clock[0] += seconds
+        return "heard"
+
+
+def test_timed_records_each_call(clock):
+    node = Node(clock)
+    assert Runtime(None).run(node.listen_for(2)) == "heard"
+    assert node.timing.states["listen"].total == 2
@@ -0,0 +1,44 @@
+from lorasphere.linktable import LinkTable, bitrate
+
+
+def test_rates_fastest_first():
+    links = LinkTable()
+    rates = [bitrate(*rate) for rate in links.rates]
+    assert rates == sorted(rates, reverse=True)
+    assert links.rates[0] == (7, 5) and links.rates[-1] == (12, 8)
+
+
+def test_unheard_link_gets_default_rate():
+    links = LinkTable()
+    assert links.rate(1) == links.DEFAULT_RATE
+    assert links.rate(1, spreading_factor=9) == (9, links.DEFAULT_RATE[1])
+
+
+def test_strong_link_runs_fastest_and_weak_link_most_robust():
+    links = LinkTable()
+    links.update(1, 10.0, -60)
+    links.update(2, -30.0, -130)
+    assert links.rate(1) == (7, 5)
+    assert links.rate(2) == (12, 8)
+
+
+def test_fixed_spreading_factor_only_adapts_coding_rate():
+    links = LinkTable()
+    links.update(1, 10.0, -60)
+    assert links.rate(1, spreading_factor=9) == (9, 5)
+
+
+def test_smoothing_and_misses():
+    links = LinkTable(alpha=0.25, miss_penalty_db=2.0)
+    links.update(1, 0.0, -100)
+    links.update(1, 8.0, -80)
+    assert links.snr(1) == 2.0 and links.rssi(1) == -95.0
+    links.miss(1)
+    assert links.snr(1) == 0.0
+    assert links.snr(2) is None
+
+
+def test_summary():
+    links = LinkTable()
+    links.update(3, 10.0, -60)
+    assert links.summary() == "3:7/5"
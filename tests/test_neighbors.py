@@ -0,0 +1,30 @@
+from lorasphere.neighbors import NeighborTable
+
+
+def test_silent_neighbours_expire(clock):
+    table = NeighborTable(hello_interval=10, expiry_intervals=4)
+    table.heard(3, -80)
+    table.heard(1, -90)
+    assert table.alive() == [1, 3]
+
+    clock[0] += 30
+    table.heard(3, -70)
+    clock[0] += 15
+    assert table.alive() == [3]
+    assert table.num_expired == 1
+    assert table.is_alive(3) and not table.is_alive(1)
+    assert table.rssi(3) == -70 and table.rssi(1) is None
+
+
+def test_hello_schedule(clock):
+    table = NeighborTable(hello_interval=10)
+
+    # The first HELLO is due within a quarter interval of boot
+    clock[0] += 2.5
+    assert table.hello_due()
+
+    table.hello_sent()
+    assert not table.hello_due()
+    clock[0] += 12.5
+    assert table.hello_due()
+    assert table.num_hellos == 1
@@ -0,0 +1,63 @@
+from lorasphere import routing
+from lorasphere.routing import BROADCAST, DATA, RREP, RREQ, Router
+
+
+def kinds(frames):
+    return [(next_hop, routing.decode(frame)[0]) for next_hop, frame in frames]
+
+
+def test_neighbour_is_reached_directly():
+    router = Router(1)
+    assert router.send(2, b'hi', [2]) == [(2, routing.encode(DATA, 1, 2, 0, 0) + b'hi')]
+
+
+def test_route_discovery_over_two_hops():
+    # 1 - 2 - 3 in a line: 1 floods an RREQ for 3, which answers along the
+    # reverse path, and the data held meanwhile follows the route
+    a, b, c = Router(1), Router(2), Router(3)
+    frames = a.send(3, b'data', [2])
+    assert kinds(frames) == [(BROADCAST, RREQ)]
+
+    frames, mine = b.receive(1, frames[0][1], [1, 3])
+    assert kinds(frames) == [(BROADCAST, RREQ)] and mine is None
+    frames, mine = c.receive(2, frames[0][1], [2])
+    assert kinds(frames) == [(2, RREP)]
+    frames, mine = b.receive(3, frames[0][1], [1, 3])
+    assert kinds(frames) == [(1, RREP)]
+    frames, mine = a.receive(2, frames[0][1], [2])
+    assert kinds(frames) == [(2, DATA)]
+    frames, mine = b.receive(1, frames[0][1], [1, 3])
+    assert kinds(frames) == [(3, DATA)]
+    assert c.receive(2, frames[0][1], [2]) == ([], (1, b'data'))
+    assert b.num_forwarded == 2
+
+
+def test_rreq_is_flooded_once():
+    b = Router(2)
+    rreq = routing.encode(RREQ, 1, 3, 0, 7)
+    assert kinds(b.receive(1, rreq, [1, 4])[0]) == [(BROADCAST, RREQ)]
+    assert b.receive(4, rreq, [1, 4]) == ([], None)
+
+
+def test_discovery_gives_up_after_retries(clock):
+    router = Router(1, discovery_timeout=10, discovery_retries=2)
+    assert kinds(router.send(3, b'x', [2])) == [(BROADCAST, RREQ)]
+    assert router.poll([2]) == []
+    clock[0] += 10
+    assert kinds(router.poll([2])) == [(BROADCAST, RREQ)]
+    clock[0] += 10
+    assert router.poll([2]) == []
+    assert router.num_no_route == 1 and router.num_rreq == 2
+    assert 3 not in router.destinations([2])
+
+
+def test_route_cache_is_bounded_and_follows_live_neighbours():
+    router = Router(1, cache_size=2)
+    for dest in (5, 6, 7):
+        router.learn(dest, 2, 2)
+    assert router.num_evicted == 1
+    assert router.lookup(5, [2]) is None
+    assert router.lookup(7, [2]) == 2
+    assert router.lookup(7, [4]) is None
+    router.link_failed(2)
+    assert router.lookup(6, [2]) is None
@@ -0,0 +1,40 @@
+from lorasphere import telemetry
+
+
+def test_text_record_round_trip():
+    payload = telemetry.encode(7, 1.5, (255, 0, 10))
+    assert payload == b"7,1500,255,0,10"
+    assert telemetry.decode(payload) == (7, 1500, (255, 0, 10))
+
+
+def test_compact_record_round_trip():
+    payload = telemetry.encode(70000, 2.25, (1, 2, 3), compact=True)
+    assert len(payload) == telemetry.COMPACT_LEN == 10
+    assert telemetry.decode(payload) == (70000 & 0xFFFF, 2250, (1, 2, 3))
+
+
+def test_garbage_is_not_a_record():
+    assert telemetry.decode(b"\xff\xfe") is None
+    assert telemetry.decode(b"1,2,3") is None
+
+
+def test_dump_round_trip():
+    records = [(1, 1.0, (1, 1, 1)), (2, 2.0, (2, 2, 2))]
+    payload = telemetry.encode_dump(records)
+    assert len(payload) == 1 + 2 * telemetry.COMPACT_LEN
+    assert telemetry.decode_dump(payload) == [(1, 1000, (1, 1, 1)), (2, 2000, (2, 2, 2))]
+    assert telemetry.decode(payload) == (2, 2000, (2, 2, 2))
+    assert telemetry.decode_dump(payload[:-1]) is None
+
+
+def test_recorder_dumps_every_so_often():
+    recorder = telemetry.Recorder(compact=True, dump_records=3, dump_every=4)
+    messages = [recorder.next((0, 0, 0)) for _ in range(8)]
+    assert [len(message) for message in messages] == [10, 10, 10, 31, 10, 10, 10, 31]
+    assert [record[0] for record in telemetry.decode_dump(messages[7])] == [6, 7, 8]
+
+
+def test_recorder_caps_dumps_at_the_message_limit():
+    recorder = telemetry.Recorder(dump_records=1000, max_message=4096)
+    assert recorder.DUMP_RECORDS == 409
+    assert len(telemetry.encode_dump([(0, 0, (0, 0, 0))] * recorder.DUMP_RECORDS)) <= 4096
@@ -0,0 +1,37 @@
+from lorasphere.threshold import RtsThreshold
+
+
+def test_off_by_default():
+    threshold = RtsThreshold()
+    assert threshold.use_rts(1, 1)
+    assert threshold.num_direct == 0
+
+
+def test_short_frames_skip_the_handshake():
+    threshold = RtsThreshold(threshold=64)
+    assert not threshold.use_rts(1, 20)
+    assert threshold.use_rts(1, 64)
+    assert threshold.num_direct == 1
+
+
+def test_fixed_threshold_ignores_outcomes():
+    threshold = RtsThreshold(threshold=64)
+    threshold.update(1, True)
+    assert threshold.threshold(1) == 64
+    assert threshold.summary() == ""
+
+
+def test_adaptive_threshold_follows_collisions():
+    threshold = RtsThreshold(threshold=64, adaptive=True, max_threshold=96)
+
+    # Collisions halve the neighbour's threshold, down to MIN_THRESHOLD
+    for _ in range(3):
+        threshold.update(1, True)
+    assert threshold.threshold(1) < 64
+
+    # A quiet link grows it by STEP, up to MAX_THRESHOLD
+    for _ in range(30):
+        threshold.update(1, False)
+    assert threshold.threshold(1) == 96
+    assert threshold.threshold(2) == 64
+    assert threshold.summary() == "1:96"
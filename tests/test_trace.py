@@ -0,0 +1,43 @@
+from lorasphere import trace
+from lorasphere.trace import Tracer
+
+
+def test_flush_prints_lines_decode_line_reads_back(capsys, clock):
+    tracer = Tracer(5, capacity=8)
+    tracer.record(trace.SEND_RTS, peer=2, packet_id=7, rssi=-80, snr=6.25)
+    tracer.record(trace.WAIT_CTS, peer=2, result=1)
+    tracer.flush()
+    node, lost, events = trace.decode_line(capsys.readouterr().out)
+    t = int(clock[0] * 1000)
+    assert (node, lost) == (5, 0)
+    assert events == [(t, trace.SEND_RTS, 2, 7, -80, 6.25, 0),
+                      (t, trace.WAIT_CTS, 2, 0, 0, 0.0, 1)]
+    assert tracer.count == 0
+
+
+def test_full_ring_overwrites_the_oldest(capsys):
+    tracer = Tracer(1, capacity=2)
+    for packet_id in range(3):
+        tracer.record(trace.SEND_MSG, packet_id=packet_id)
+    assert tracer.due()
+    tracer.flush()
+
+    # The oldest event left sits at the end of the ring: one line per part
+    lines = [trace.decode_line(line) for line in capsys.readouterr().out.splitlines()]
+    assert [lost for node, lost, events in lines] == [1, 0]
+    assert [event[3] for node, lost, events in lines for event in events] == [1, 2]
+    assert tracer.summary() == "trace:3/trace_lost:1"
+
+
+def test_rssi_and_snr_are_clamped(capsys):
+    tracer = Tracer(1)
+    tracer.record(trace.RECV_MSG, rssi=-200, snr=100)
+    tracer.flush()
+    event = trace.decode_line(capsys.readouterr().out)[2][0]
+    assert event[4] == -128 and event[5] == 127 / 4
+
+
+def test_other_lines_are_not_traces():
+    assert trace.decode_line("[RX 1] Waiting") is None
+    assert trace.decode_line("TRACE 1 0 zz") is None
+    assert trace.decode_line("12:00:01 TRACE 1 0 ") is None
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from lorasphere.traffic import PeriodicSource, Traffic, TxQueues, make_source
+
+
+def test_queue_is_bounded():
+    queues = TxQueues(queue_limit=2)
+    assert queues.push(1, b'a') and queues.push(1, b'b')
+    assert not queues.push(1, b'c')
+    assert queues.depth(1) == 2 and queues.num_dropped == 1
+
+
+def test_round_robin_skips_destinations_not_ready():
+    queues = TxQueues()
+    for dest in (1, 2, 3):
+        queues.push(dest, b'x')
+    assert queues.next_dest() == 1
+    assert queues.next_dest(lambda dest: dest != 2) == 3
+    assert queues.next_dest(lambda dest: False) is None
+
+
+def test_pop_records_sojourn(clock):
+    queues = TxQueues()
+    queues.push(1, b'a')
+    queues.push(1, b'b')
+    clock[0] += 2
+    assert queues.pop(1, 5) == [b'a', b'b']
+    assert queues.sojourn[1] == [2, 4.0, 2.0]
+    assert queues.summary() == "queues:[1:0@2.00/2.00s]/offered:2/qdrop:0"
+
+
+def test_periodic_source(clock):
+    random.seed(1)
+    source = PeriodicSource(rate=2)
+    clock[0] += 10
+    assert len(source.arrivals()) == 20
+    assert 0 < source.until_next() <= 0.5
+
+
+def test_trace_source(clock, tmp_path):
+    trace = tmp_path / "traffic.csv"
+    trace.write_text("0.5,3\n# comment\n1.0,*\n2\n")
+    source = make_source("trace", 0, str(trace))
+    clock[0] += 1
+    assert source.arrivals() == [3, None]
+    assert source.until_next() == 1
+    clock[0] += 1
+    assert source.arrivals() == [None]
+    assert source.until_next() is None
+
+
+def test_unknown_source():
+    with pytest.raises(ValueError):
+        make_source("bursty", 1)
+
+
+def test_generate_drops_messages_for_gone_destinations(clock):
+    traffic = Traffic("periodic", 1)
+    clock[0] += 1
+    assert traffic.generate([2], lambda: b'x') == 1
+    assert traffic.pending() == 1
+    traffic.generate([], lambda: b'x')
+    assert traffic.pending() == 0
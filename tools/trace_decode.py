@@ -0,0 +1,97 @@
+"""
+Turns the TRACE lines a node prints with TRACE_EVENTS set back into a table
+of events per node. Feed it a capture of the serial console, or the output of
+the simulator with every board's prints shown:
+
+    python -m sim RTS_CTS -v --set TRACE_EVENTS=256 > run.txt
+    python tools/trace_decode.py run.txt
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+from lorasphere import trace
+
+# RTS_CTS_Error in RTS_CTS/rts_cts_node.py, which needs the board to import
+RESULTS = {
+    0: "SUCCESS",
+    1: "PACKAGE_CORRUPT",
+    2: "RTS_WRONG",
+    3: "RTS_TIMEOUT",
+    4: "CTS_WRONG",
+    5: "CTS_NOT_DEST",
+    6: "CTS_TIMEOUT",
+    7: "ACK_WRONG",
+    8: "ACK_TIMEOUT",
+    9: "CHANNEL_BUSY",
+    10: "DIRECT_MSG",
+    11: "MSG_TIMEOUT",
+}
+
+COLUMNS = ("time_ms", "event", "peer", "id", "rssi", "snr", "result")
+
+
+def read(lines) -> dict:
+    # node -> [events, events lost], in the order they were printed
+    nodes = {}
+    for line in lines:
+        decoded = trace.decode_line(line)
+        if decoded is None:
+            continue
+        node, lost, events = decoded
+        entry = nodes.setdefault(node, [[], 0])
+        entry[0] += events
+        entry[1] += lost
+    return nodes
+
+
+def row(event) -> tuple:
+    t, kind, peer, packet_id, rssi, snr, result = event
+    return (str(t), trace.EVENT_NAMES.get(kind, str(kind)), "-" if peer == trace.NO_PEER else str(peer),
+            str(packet_id), str(rssi), f"{snr:.2f}", RESULTS.get(result, str(result)))
+
+
+def print_table(node, events, lost, out) -> None:
+    rows = [COLUMNS] + [row(event) for event in events]
+    widths = [max(len(r[i]) for r in rows) for i in range(len(COLUMNS))]
+    out.write(f"node {node}: {len(events)} events" + (f", {lost} lost" if lost else "") + "\n")
+    for r in rows:
+        out.write("  " + "  ".join(field.rjust(width) for field, width in zip(r, widths)) + "\n")
+    out.write("\n")
+
+
+def print_csv(nodes, out) -> None:
+    out.write("node," + ",".join(COLUMNS) + "\n")
+    for node in sorted(nodes):
+        for event in nodes[node][0]:
+            out.write(f"{node}," + ",".join(row(event)) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("capture", nargs="?", help="console capture; standard input if left out")
+    parser.add_argument("--node", type=int, action="append", help="only this node (may be repeated)")
+    parser.add_argument("--csv", action="store_true", help="one CSV table for every node instead")
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture) as f:
+            nodes = read(f)
+    else:
+        nodes = read(sys.stdin)
+    if args.node:
+        nodes = {node: nodes[node] for node in args.node if node in nodes}
+
+    if args.csv:
+        print_csv(nodes, sys.stdout)
+        return
+    for node in sorted(nodes):
+        events, lost = nodes[node]
+        print_table(node, events, lost, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()